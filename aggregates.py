@@ -0,0 +1,238 @@
+"""Incrementally maintained aggregates behind the System Overview tiles
+
+The aggregates remember how many store rows they have already folded in (the
+watermark), so catching up after an append only touches the new rows. Each
+student's most recent assessment is tracked in small per-student arrays, which
+keeps the On Track / At Risk / Intervention counts per student rather than per
+assessment. A re-score bumps the store's ``risk_level`` generation; the
+aggregates then re-read one risk code per student instead of every row.
+
+Every partition view (see ``partitions.py``) keeps its own aggregates under
+its ``state_root``. An append to a partition before the view's last one
+moves later rows; the aggregates then shift the row numbers they hold and
+fold in only the new rows. Only a partition that disappears or shrinks
+starts them again, and even then the month-end snapshots are kept, because
+they cannot be rebuilt from rows.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import numpy as np
+
+from assessment_store import MISSING_SCORE, RISK_LEVELS, SUBJECTS, get_store
+from atomic_io import write_json_atomic
+from partitions import VIEW_STATE_CACHE_SIZE, segment_changes, shift_rows
+
+# Rows folded in per step while catching up, to bound temporary memory
+CATCH_UP_CHUNK_ROWS = 1 << 20
+
+# Month-end snapshots kept for month-over-month deltas
+MONTHS_KEPT = 24
+
+PER_STUDENT_ARRAYS = {
+    'latest_row': ('<i8', -1),
+    'latest_date': ('<i4', np.iinfo(np.int32).min),
+    'latest_risk': ('<i1', -1)
+}
+
+
+def _month_key(day_numbers):
+    """'YYYY-MM' for each day number"""
+    months = np.asarray(day_numbers, dtype='<i4').astype('datetime64[D]').astype('datetime64[M]')
+    return months.astype(str)
+
+
+class DashboardAggregates:
+    """Counts, percentages and deltas for the dashboard, updated incrementally"""
+
+    def __init__(self, root):
+        self.root = root
+        self.state_path = os.path.join(root, 'state.json')
+        self._lock = threading.Lock()
+        self._load()
+
+    def _empty_state(self):
+        return {
+            'watermark': 0,
+            'layout': None,
+            'segments': [],
+            'risk_generation': 0,
+            'total_students': 0,
+            'risk_counts': [0] * len(RISK_LEVELS),
+            'new_by_month': {},
+            'risk_counts_by_month': {},
+            'subject_sums': {subject: 0 for subject in SUBJECTS},
+            'subject_counts': {subject: 0 for subject in SUBJECTS}
+        }
+
+    def _load(self):
+        self.state = self._empty_state()
+        self.arrays = {name: np.empty(0, dtype=dtype) for name, (dtype, _) in PER_STUDENT_ARRAYS.items()}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            arrays = {name: np.load(os.path.join(self.root, f'{name}.npy')) for name in PER_STUDENT_ARRAYS}
+        except (OSError, ValueError):
+            # Missing or damaged aggregates are rebuilt from the store
+            return
+        self.state, self.arrays = state, arrays
+
+    def _save(self):
+        os.makedirs(self.root, exist_ok=True)
+        for name, values in self.arrays.items():
+            path = os.path.join(self.root, f'{name}.npy')
+            tmp_path = f'{path}.tmp.npy'
+            np.save(tmp_path, values)
+            os.replace(tmp_path, path)
+        # The state file is written last and references the arrays above
+        write_json_atomic(self.state_path, self.state)
+
+    def _grow(self, students):
+        for name, (dtype, fill) in PER_STUDENT_ARRAYS.items():
+            values = self.arrays[name]
+            if len(values) < students:
+                extra = np.full(students - len(values), fill, dtype=dtype)
+                self.arrays[name] = np.concatenate([values, extra])
+
+    def _fold_rows(self, store, start, stop):
+        """Fold rows ``[start, stop)`` into the aggregates"""
+        state = self.state
+        for subject in SUBJECTS:
+            scores = store.column(subject)[start:stop]
+            present = scores != MISSING_SCORE
+            state['subject_sums'][subject] += int(scores[present].sum(dtype=np.int64))
+            state['subject_counts'][subject] += int(np.count_nonzero(present))
+
+        ids = np.asarray(store.column('student_id')[start:stop])
+        dates = np.asarray(store.column('assessment_date')[start:stop])
+        risk = np.asarray(store.column('risk_level')[start:stop])
+        rows = np.arange(start, stop, dtype=np.int64)
+
+        # Latest assessment per student within this slice: sort by student,
+        # then date, then row, and keep the last entry of each student
+        order = np.lexsort((rows, dates, ids))
+        sorted_ids = ids[order]
+        last = np.append(sorted_ids[1:] != sorted_ids[:-1], True)
+        ids, rows, dates, risk = sorted_ids[last], rows[order][last], dates[order][last], risk[order][last]
+
+        latest_row = self.arrays['latest_row']
+        latest_date = self.arrays['latest_date']
+        latest_risk = self.arrays['latest_risk']
+        is_new = latest_row[ids] < 0
+        # Ties in date go to the later row, whatever order rows are folded in
+        newer = is_new | (dates > latest_date[ids]) | ((dates == latest_date[ids]) & (rows > latest_row[ids]))
+        ids, rows, dates, risk, is_new = ids[newer], rows[newer], dates[newer], risk[newer], is_new[newer]
+
+        counts = np.asarray(state['risk_counts'], dtype=np.int64)
+        old_risk = latest_risk[ids]
+        counts -= np.bincount(old_risk[old_risk >= 0], minlength=len(RISK_LEVELS))[:len(RISK_LEVELS)]
+        counts += np.bincount(risk[risk >= 0], minlength=len(RISK_LEVELS))[:len(RISK_LEVELS)]
+        state['risk_counts'] = [int(c) for c in counts]
+
+        latest_row[ids] = rows
+        latest_date[ids] = dates
+        latest_risk[ids] = risk
+
+        state['total_students'] += int(np.count_nonzero(is_new))
+        months, new_counts = np.unique(_month_key(dates[is_new]), return_counts=True)
+        for month, count in zip(months, new_counts):
+            state['new_by_month'][month] = state['new_by_month'].get(month, 0) + int(count)
+
+    def _reload_latest_risk(self, store):
+        """Re-read the risk of every student's latest row after a re-score"""
+        latest_row = self.arrays['latest_row']
+        known = latest_row >= 0
+        latest_risk = np.full(len(latest_row), -1, dtype='<i1')
+        latest_risk[known] = store.column('risk_level')[latest_row[known]]
+        self.arrays['latest_risk'] = latest_risk
+        counts = np.bincount(latest_risk[latest_risk >= 0], minlength=len(RISK_LEVELS))
+        self.state['risk_counts'] = [int(c) for c in counts[:len(RISK_LEVELS)]]
+
+    def _snapshot_month(self, today):
+        snapshots = self.state['risk_counts_by_month']
+        snapshots[today.strftime('%Y-%m')] = list(self.state['risk_counts'])
+        for month in sorted(snapshots)[:-MONTHS_KEPT]:
+            del snapshots[month]
+
+    def refresh(self, store=None, today=None):
+        """Fold in anything appended or re-scored since the last refresh"""
+        store = store or get_store()
+        segments = store.segments()
+        rows = sum(count for _, count in segments)
+        generation = store.generation('risk_level')
+        with self._lock:
+            state = self.state
+            if state.get('segments') == segments and state['risk_generation'] == generation:
+                return False
+            changes = segment_changes(state['segments'], segments) if 'segments' in state else None
+            if changes is None:
+                # A partition was replaced or shrank underneath us; start again,
+                # keeping the month-end snapshots the rows cannot give back
+                snapshots = state['risk_counts_by_month']
+                self.state = state = self._empty_state()
+                state['risk_counts_by_month'] = snapshots
+                self.arrays = {name: np.empty(0, dtype=dtype) for name, (dtype, _) in PER_STUDENT_ARRAYS.items()}
+                changes = segment_changes([], segments)
+            old_ends, shifts, ranges = changes
+            self._grow(store.students.count)
+            self.arrays['latest_row'] = shift_rows(self.arrays['latest_row'], old_ends, shifts)
+            if state['risk_generation'] != generation:
+                self._reload_latest_risk(store)
+                state['risk_generation'] = generation
+            for range_start, range_stop in ranges:
+                for start in range(range_start, range_stop, CATCH_UP_CHUNK_ROWS):
+                    self._fold_rows(store, start, min(start + CATCH_UP_CHUNK_ROWS, range_stop))
+            state['watermark'] = rows
+            state['segments'] = segments
+            state['layout'] = store.layout
+            self._snapshot_month(today or date.today())
+            self._save()
+            return True
+
+    def snapshot(self, today=None):
+        """Everything the metric tiles and overview charts need, in O(1)"""
+        today = today or date.today()
+        this_month = today.strftime('%Y-%m')
+        with self._lock:
+            state = self.state
+            counts = list(state['risk_counts'])
+            scored = sum(counts)
+            previous = [month for month in state['risk_counts_by_month'] if month < this_month]
+            previous_counts = state['risk_counts_by_month'][max(previous)] if previous else None
+            subject_means = {
+                subject: state['subject_sums'][subject] / state['subject_counts'][subject]
+                for subject in SUBJECTS if state['subject_counts'][subject]
+            }
+            return {
+                # Changes whenever anything behind these numbers changes
+                'version': (state['layout'], state['watermark'], state['risk_generation']),
+                'total_students': state['total_students'],
+                'new_this_month': state['new_by_month'].get(this_month, 0),
+                'risk_counts': counts,
+                'risk_percentages': [round(c * 100 / scored) if scored else 0 for c in counts],
+                'risk_changes': [c - p for c, p in zip(counts, previous_counts)] if previous_counts else None,
+                'subject_means': subject_means
+            }
+
+
+_aggregates = OrderedDict()
+_aggregates_lock = threading.Lock()
+
+
+def get_aggregates(store=None):
+    """Shared dashboard aggregates of a store or partition view, caught up with it"""
+    store = store or get_store()
+    with _aggregates_lock:
+        aggregates = _aggregates.get(store.state_root)
+        if aggregates is None:
+            aggregates = _aggregates[store.state_root] = DashboardAggregates(
+                os.path.join(store.state_root, 'aggregates')
+            )
+        _aggregates.move_to_end(store.state_root)
+        while len(_aggregates) > VIEW_STATE_CACHE_SIZE:
+            _aggregates.popitem(last=False)
+    aggregates.refresh(store)
+    return aggregates
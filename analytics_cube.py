@@ -0,0 +1,321 @@
+"""Precomputed aggregation cube behind the Analytics page
+
+For every partition (one region, school and term) the cube keeps, per grade
+and risk level (plus "not scored"):
+
+    counts   assessments                                  [grade, risk]
+    sums     sum of each subject's scores                 [grade, risk, subject]
+    hist     each subject's scores in bins of ten points  [grade, risk, subject, bin]
+
+Any combination of school, term, grade, subject and risk level filters is
+answered by indexing and summing these small arrays. The cost depends on the
+number of partitions, not rows, so it takes milliseconds at any data size.
+Each partition's arrays remember how many of its rows they hold (the
+watermark), so an append folds in only the new rows. A re-score changes the
+partition's ``risk_level`` generation, and that partition alone is rebuilt.
+The cube is saved under ``data/assessments/cube`` and re-checked only when
+the assessments' data version moves.
+
+Raw rows are read only by ``student_list``, for the drill-down a user asks for.
+"""
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from assessment_store import MAX_GRADE, MISSING_SCORE, NO_RISK, RISK_LEVELS, SUBJECTS, get_store
+from atomic_io import write_json_atomic
+from data_version import data_version
+from instrumentation import register_collector, timed
+
+CUBE_FORMAT = 1
+
+# Rows folded in per step while catching up, to bound temporary memory
+CATCH_UP_CHUNK_ROWS = 1 << 20
+
+# Score bins: 0-9, 10-19, ..., 90-100
+SCORE_BINS = 10
+BIN_LABELS = [f"{10 * i}–{10 * i + 9}" for i in range(SCORE_BINS - 1)] + [f"{10 * (SCORE_BINS - 1)}–100"]
+
+# The risk axis: one slot per risk level, then assessments without a risk level
+RISK_SLOTS = len(RISK_LEVELS) + 1
+UNSCORED = len(RISK_LEVELS)
+
+GROUP_BY = ['grade', 'subject', 'risk_level', 'school', 'term', 'region']
+
+ARRAYS = {
+    'counts': ('<i4', (MAX_GRADE, RISK_SLOTS)),
+    'sums': ('<i8', (MAX_GRADE, RISK_SLOTS, len(SUBJECTS))),
+    'hist': ('<i4', (MAX_GRADE, RISK_SLOTS, len(SUBJECTS), SCORE_BINS)),
+}
+
+# Students shown by the drill-down at most
+STUDENT_LIST_ROWS = 200
+
+
+def _risk_slots(codes):
+    codes = np.asarray(codes, dtype=np.int64)
+    return np.where(codes == NO_RISK, UNSCORED, codes)
+
+
+class AnalyticsCube:
+    """Per-partition counts, score sums and score histograms, updated incrementally"""
+
+    def __init__(self, root):
+        self.root = root
+        self.state_path = os.path.join(root, 'state.json')
+        self._lock = threading.Lock()
+        self._checked_version = None
+        self.stats = {'refreshes': 0, 'rows_folded': 0, 'partitions_rebuilt': 0, 'queries': 0}
+        self._load()
+
+    def _empty(self):
+        self.state = {'format': CUBE_FORMAT, 'paths': [], 'watermarks': [], 'generations': [], 'version': 0}
+        self.arrays = {name: np.zeros((0,) + shape, dtype=dtype) for name, (dtype, shape) in ARRAYS.items()}
+        self.labels = {'region': np.empty(0, dtype=object), 'school': np.empty(0, dtype=object),
+                       'term': np.empty(0, dtype=object)}
+
+    def _load(self):
+        self._empty()
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            arrays = {name: np.load(os.path.join(self.root, f'{name}.npy')) for name in ARRAYS}
+        except (OSError, ValueError):
+            # Missing or damaged cubes are rebuilt from the store
+            return
+        if state.get('format') != CUBE_FORMAT or any(len(a) != len(state['paths']) for a in arrays.values()):
+            return
+        self.state, self.arrays = state, arrays
+
+    def _save(self):
+        os.makedirs(self.root, exist_ok=True)
+        for name, values in self.arrays.items():
+            path = os.path.join(self.root, f'{name}.npy')
+            tmp_path = f'{path}.tmp.npy'
+            np.save(tmp_path, values)
+            os.replace(tmp_path, path)
+        # The state file is written last and references the arrays above
+        write_json_atomic(self.state_path, self.state)
+
+    def _add_partitions(self, count):
+        for name, (dtype, shape) in ARRAYS.items():
+            extra = np.zeros((count,) + shape, dtype=dtype)
+            self.arrays[name] = np.concatenate([self.arrays[name], extra])
+
+    def _clear_partition(self, index):
+        for values in self.arrays.values():
+            values[index] = 0
+        self.state['watermarks'][index] = 0
+
+    def _fold_rows(self, index, store, start, stop):
+        """Fold rows ``[start, stop)`` of one partition into its arrays"""
+        grades = np.asarray(store.column('grade')[start:stop], dtype=np.int64)
+        valid = (grades >= 1) & (grades <= MAX_GRADE)
+        cells = (grades - 1) * RISK_SLOTS + _risk_slots(store.column('risk_level')[start:stop])
+        cells = cells[valid]
+        cell_count = MAX_GRADE * RISK_SLOTS
+        counts = self.arrays['counts'][index].reshape(-1)
+        counts += np.bincount(cells, minlength=cell_count).astype(counts.dtype)
+        sums = self.arrays['sums'][index]
+        hist = self.arrays['hist'][index]
+        for s, subject in enumerate(SUBJECTS):
+            scores = np.asarray(store.column(subject)[start:stop])[valid]
+            present = scores != MISSING_SCORE
+            subject_cells, scores = cells[present], scores[present].astype(np.int64)
+            sums[..., s] += np.bincount(subject_cells, weights=scores, minlength=cell_count).astype(np.int64) \
+                .reshape(MAX_GRADE, RISK_SLOTS)
+            bins = np.minimum(scores // 10, SCORE_BINS - 1)
+            hist[..., s, :] += np.bincount(subject_cells * SCORE_BINS + bins, minlength=cell_count * SCORE_BINS) \
+                .astype(hist.dtype).reshape(MAX_GRADE, RISK_SLOTS, SCORE_BINS)
+        self.stats['rows_folded'] += stop - start
+
+    def refresh(self, store=None):
+        """Fold in what was appended or re-scored since the last refresh; True if anything changed"""
+        store = store or get_store()
+        version = data_version('assessments')
+        if version == self._checked_version:
+            return False
+        with self._lock:
+            if version == self._checked_version:
+                return False
+            state = self.state
+            entries = store.read_catalog()['partitions']
+            positions = {path: i for i, path in enumerate(state['paths'])}
+            new = [entry['path'] for entry in entries if entry['path'] not in positions]
+            if new:
+                self._add_partitions(len(new))
+                for path in new:
+                    positions[path] = len(state['paths'])
+                    state['paths'].append(path)
+                    state['watermarks'].append(0)
+                    state['generations'].append(0)
+            changed = bool(new)
+            for entry in entries:
+                index = positions[entry['path']]
+                partition = store.partition_store(entry)
+                rows, generation = partition.rows, partition.generation('risk_level')
+                if generation != state['generations'][index] or rows < state['watermarks'][index]:
+                    # Re-scored rows moved between risk levels; this partition starts again
+                    self._clear_partition(index)
+                    state['generations'][index] = generation
+                    self.stats['partitions_rebuilt'] += 1
+                for start in range(state['watermarks'][index], rows, CATCH_UP_CHUNK_ROWS):
+                    self._fold_rows(index, partition, start, min(start + CATCH_UP_CHUNK_ROWS, rows))
+                    changed = True
+                state['watermarks'][index] = rows
+            labels = {entry['path']: entry for entry in entries}
+            for column in self.labels:
+                self.labels[column] = np.array([labels.get(path, {}).get(column) for path in state['paths']],
+                                               dtype=object)
+            if changed:
+                state['version'] += 1
+                self._save()
+            self._checked_version = version
+            self.stats['refreshes'] += 1
+            return changed
+
+    @property
+    def version(self):
+        """Changes whenever anything in the cube changes"""
+        return self.state['version']
+
+    @timed('analytics_cube.query')
+    def query(self, regions=None, schools=None, terms=None, grades=None, subjects=None, risk_levels=None,
+              group_by=None):
+        """Totals of the selected cells, optionally split by one of ``GROUP_BY``
+
+        Empty filters select everything. ``risk_levels`` are risk codes, and
+        without them assessments that were never scored are included too.
+        Returns per-group assessment counts, counts per risk slot, subject
+        score sums and counts, the score histogram per risk slot and the
+        selection's totals. Grouped by subject, a group counts the scores of
+        that subject rather than assessments.
+        """
+        with self._lock:
+            self.stats['queries'] += 1
+            selected = np.ones(len(self.state['paths']), dtype=bool)
+            for column, wanted in (('region', regions), ('school', schools), ('term', terms)):
+                if wanted:
+                    selected &= np.isin(self.labels[column], list(wanted))
+            parts = np.flatnonzero(selected)
+            grade_axis = np.array(sorted(grades), dtype=np.int64) - 1 if grades else np.arange(MAX_GRADE)
+            risk_axis = np.array(sorted(risk_levels), dtype=np.int64) if risk_levels else np.arange(RISK_SLOTS)
+            subject_axis = np.array([SUBJECTS.index(s) for s in SUBJECTS if s in subjects]) if subjects \
+                else np.arange(len(SUBJECTS))
+            counts = self.arrays['counts'][np.ix_(parts, grade_axis, risk_axis)].astype(np.int64)
+            sums = self.arrays['sums'][np.ix_(parts, grade_axis, risk_axis, subject_axis)]
+            hist = self.arrays['hist'][np.ix_(parts, grade_axis, risk_axis, subject_axis,
+                                              np.arange(SCORE_BINS))].astype(np.int64)
+            part_labels = {column: values[parts] for column, values in self.labels.items()}
+            version = self.version
+
+        total_risk = np.zeros(RISK_SLOTS, dtype=np.int64)
+        total_risk[risk_axis] = counts.sum(axis=(0, 1))
+        if group_by in ('school', 'term', 'region'):
+            groups, codes = np.unique(part_labels[group_by].astype(str), return_inverse=True)
+            # One-hot partitions -> groups, so each array is summed per group in one product
+            onehot = np.zeros((len(groups), len(parts)))
+            onehot[codes, np.arange(len(parts))] = 1
+            counts, sums, hist = (np.tensordot(onehot, a, axes=1).astype(np.int64) for a in (counts, sums, hist))
+            groups = groups.tolist()
+        else:
+            counts, sums, hist = (a.sum(axis=0, keepdims=True) for a in (counts, sums, hist))
+            groups = ['all']
+
+        scored = hist.sum(axis=-1)  # [group, grade, risk, subject]
+        if group_by == 'grade':
+            groups = (grade_axis + 1).tolist()
+            rows, risk_rows = counts[0].sum(axis=1), counts[0]
+            score_sums, score_counts = sums[0].sum(axis=(1, 2)), scored[0].sum(axis=(1, 2))
+        elif group_by == 'risk_level':
+            groups = [NO_RISK if slot == UNSCORED else int(slot) for slot in risk_axis]
+            rows = counts[0].sum(axis=0)
+            risk_rows = np.diag(rows)
+            score_sums, score_counts = sums[0].sum(axis=(0, 2)), scored[0].sum(axis=(0, 2))
+        elif group_by == 'subject':
+            groups = [SUBJECTS[s] for s in subject_axis]
+            rows = scored[0].sum(axis=(0, 1))
+            risk_rows = scored[0].sum(axis=0).T
+            score_sums, score_counts = sums[0].sum(axis=(0, 1)), rows
+        else:
+            rows, risk_rows = counts.sum(axis=(1, 2)), counts.sum(axis=1)
+            score_sums, score_counts = sums.sum(axis=(1, 2, 3)), scored.sum(axis=(1, 2, 3))
+
+        # Risk columns always cover every slot, whatever the filter kept
+        full_risk = np.zeros((len(groups), RISK_SLOTS), dtype=np.int64)
+        full_risk[:, risk_axis] = risk_rows
+        histogram = np.zeros((RISK_SLOTS, SCORE_BINS), dtype=np.int64)
+        histogram[risk_axis] = hist.sum(axis=(0, 1, 3))
+        return {
+            'version': version,
+            'group_by': group_by,
+            'groups': groups,
+            'rows': np.asarray(rows, dtype=np.int64),
+            'risk_rows': full_risk,
+            'score_sums': np.asarray(score_sums, dtype=np.int64),
+            'score_counts': np.asarray(score_counts, dtype=np.int64),
+            'histogram': histogram,
+            'total_rows': int(total_risk.sum()),
+            'total_risk_rows': total_risk,
+        }
+
+    def stats_snapshot(self):
+        return dict(self.stats, partitions=len(self.state['paths']), version=self.version,
+                    bytes=int(sum(values.nbytes for values in self.arrays.values())))
+
+
+def student_list(view, grades=None, subjects=None, risk_levels=None, limit=STUDENT_LIST_ROWS):
+    """Students in a view with assessments matching the filters, weakest first
+
+    Each student is shown with their latest matching assessment.
+
+    Reads the raw columns of the view, so it is only run when a user asks
+    for the list. Returns the page as a compact frame with an ``average``
+    column (over ``subjects``) and the number of matching students.
+    """
+    import pandas as pd
+
+    matches = np.ones(view.rows, dtype=bool)
+    if grades:
+        matches &= np.isin(view.column('grade'), list(grades))
+    if risk_levels:
+        matches &= np.isin(view.column('risk_level'), list(risk_levels))
+    rows = np.flatnonzero(matches)
+    if not len(rows):
+        return pd.DataFrame(columns=['student_name', 'average']), 0
+    student_ids = np.asarray(view.column('student_id'))[rows]
+    dates = np.asarray(view.column('assessment_date'))[rows]
+    order = np.lexsort((rows, dates, student_ids))
+    sorted_ids = student_ids[order]
+    latest = rows[order][np.append(sorted_ids[1:] != sorted_ids[:-1], True)]
+
+    scores = np.column_stack([np.asarray(view.column(s))[latest] for s in (subjects or SUBJECTS)]).astype(np.float64)
+    scores[scores == MISSING_SCORE] = np.nan
+    present = ~np.isnan(scores)
+    averages = np.where(present.any(axis=1), np.nansum(scores, axis=1) / np.maximum(present.sum(axis=1), 1), np.nan)
+    # Students without any of the scores go last
+    ranked = np.argsort(np.where(np.isnan(averages), np.inf, averages), kind='stable')[:limit]
+    frame = view.take(latest[ranked])
+    frame['average'] = np.round(averages[ranked], 1)
+    return frame, len(latest)
+
+
+_cube = None
+_cube_lock = threading.Lock()
+
+
+def get_cube(store=None):
+    """Process-wide analytics cube, caught up with the store"""
+    global _cube
+    store = store or get_store()
+    with _cube_lock:
+        if _cube is None:
+            _cube = AnalyticsCube(os.path.join(store.root, 'cube'))
+            register_collector('analytics_cube', _cube.stats_snapshot)
+    started = time.perf_counter()
+    if _cube.refresh(store):
+        _cube.stats['last_refresh_seconds'] = round(time.perf_counter() - started, 4)
+    return _cube
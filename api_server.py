@@ -0,0 +1,463 @@
+"""Headless JSON API for other school systems, next to the Streamlit UI
+
+A plain ``ThreadingHTTPServer`` shares the data directory, the assessment
+store and the active risk model with the app, without a Streamlit script
+rerun per request. Connections are HTTP/1.1 keep-alive. Bodies are compact
+JSON, gzip-compressed when the client accepts it, and tables come back as
+one list per column rather than one object per row::
+
+    POST /v1/score         {"scores": [[85, 78, null, 82, 90], ...], "subjects": [...], "language": "Somali"}
+    POST /v1/assessments   {"records": [{"Student Name": ..., "Grade": 6, "Assessment Date": "2024-06-10", "Math": 85, ...}, ...]}
+    GET  /v1/risk          ?school=...&region=...&term=...&grade=6&risk=High&student_id=...&limit=&offset=
+    GET  /v1/students      ?q=maxamed&limit=20
+    GET  /v1/health
+
+``/v1/score`` scores thousands of rows with one ``predict`` call and sends
+each recommendation list once per risk level, not once per row.
+``/v1/assessments`` takes the importer's column names, validates the rows
+the same way a file import does, and returns each row's risk level or the
+reasons it was rejected. ``/v1/risk`` pages through every student's latest
+assessment in a scope. With ``EDUSCAN_API_TOKEN`` set, every request needs
+``Authorization: Bearer <token>``::
+
+    python api_server.py --port 8503
+"""
+import argparse
+import gzip
+import hmac
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from assessment_store import MISSING_SCORE, NO_RISK, RISK_LEVELS, SUBJECTS, get_store
+from dataset_cache import cached
+from instrumentation import count, observe, register_collector
+from translations import RISK_LEVEL_KEYS, TRANSLATIONS, get_text, translate_recommendation
+
+API_PORT = int(os.environ.get('EDUSCAN_API_PORT', '8503') or 8503)
+API_TOKEN = os.environ.get('EDUSCAN_API_TOKEN') or None
+
+# Largest accepted request body, and the largest page of ``/v1/risk``
+MAX_BODY_BYTES = 32 * 2**20
+DEFAULT_PAGE_ROWS = 1000
+MAX_PAGE_ROWS = 10000
+
+# Responses smaller than this are not worth compressing
+GZIP_MIN_BYTES = 1024
+
+_stats_lock = threading.Lock()
+_stats = {'requests': 0, 'errors': 0, 'rows_scored': 0, 'rows_imported': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+
+class ApiError(Exception):
+    """A request the API refuses; carries the HTTP status to answer with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _bump_stats(**amounts):
+    with _stats_lock:
+        for key, amount in amounts.items():
+            _stats[key] += amount
+
+
+def _language(value):
+    language = value or 'English'
+    if language not in TRANSLATIONS:
+        raise ApiError(400, f"unknown language '{language}', expected one of: {', '.join(TRANSLATIONS)}")
+    return language
+
+
+def _risk_legend(language):
+    """Risk level names, their labels in ``language`` and every level's recommendations"""
+    from risk_model import RECOMMENDATIONS
+
+    return {
+        'levels': RISK_LEVELS,
+        'labels': [get_text(key, language) for key in RISK_LEVEL_KEYS],
+        'recommendations': {
+            level: [translate_recommendation(text, language) for text in RECOMMENDATIONS[level]]
+            for level in RISK_LEVELS
+        }
+    }
+
+
+def _risk_codes(codes):
+    """Risk codes as JSON: an index into ``levels``, or null when unscored"""
+    codes = np.asarray(codes, dtype=np.int64)
+    return [None if code == NO_RISK else code for code in codes.tolist()]
+
+
+def score_matrix_payload(payload):
+    """Score matrix of a ``/v1/score`` body; missing and null scores become ``MISSING_SCORE``"""
+    subjects = payload.get('subjects') or SUBJECTS
+    unknown = [subject for subject in subjects if subject not in SUBJECTS]
+    if unknown:
+        raise ApiError(400, f"unknown subject(s): {', '.join(map(str, unknown))}")
+    if 'scores' in payload:
+        rows = payload['scores']
+        if not isinstance(rows, list) or any(not isinstance(row, list) or len(row) != len(subjects) for row in rows):
+            raise ApiError(400, f"'scores' must be a list of rows of {len(subjects)} scores")
+    elif 'records' in payload:
+        records = payload['records']
+        if not isinstance(records, list) or any(not isinstance(record, dict) for record in records):
+            raise ApiError(400, "'records' must be a list of objects")
+        rows = [[record.get(subject) for subject in subjects] for record in records]
+    else:
+        raise ApiError(400, "expected 'scores' or 'records'")
+    try:
+        values = np.array(rows, dtype=np.float64).reshape(len(rows), len(subjects))
+    except (TypeError, ValueError):
+        raise ApiError(400, "scores must be numbers or null") from None
+    present = ~np.isnan(values)
+    if ((values[present] < 0) | (values[present] > 100)).any():
+        raise ApiError(400, "scores must be from 0 to 100")
+    matrix = np.full((len(rows), len(SUBJECTS)), MISSING_SCORE, dtype=np.uint8)
+    for i, subject in enumerate(subjects):
+        column = SUBJECTS.index(subject)
+        matrix[present[:, i], column] = np.round(values[present[:, i], i]).astype(np.uint8)
+    return matrix
+
+
+def score(payload):
+    """``POST /v1/score``: risk levels of a batch of score rows"""
+    from risk_model import score_rows
+
+    matrix = score_matrix_payload(payload)
+    codes, version = score_rows(matrix)
+    _bump_stats(rows_scored=len(matrix))
+    return dict(_risk_legend(_language(payload.get('language'))), model_version=version, risk=_risk_codes(codes))
+
+
+def push_assessments(payload, store=None):
+    """``POST /v1/assessments``: validate and store rows given with the importer's column names"""
+    import pandas as pd
+
+    from importer import ImportFormatError, map_columns, validate_chunk
+    from risk_model import score_rows
+
+    records = payload.get('records')
+    if not isinstance(records, list) or any(not isinstance(record, dict) for record in records):
+        raise ApiError(400, "'records' must be a list of objects")
+    language = _language(payload.get('language'))
+    store = store or get_store()
+    result = {'rows_imported': 0, 'rows_rejected': 0, 'errors': [], 'risk': [None] * len(records)}
+    if not records:
+        return result
+    chunk = pd.DataFrame.from_records(records).astype(object)
+    try:
+        mapping = map_columns(chunk.columns)
+    except ImportFormatError as exc:
+        raise ApiError(400, str(exc)) from None
+    # Rows are numbered from 0, as in the request
+    valid, errors = validate_chunk(chunk.where(chunk.notna(), ''), mapping, first_row=0)
+    if len(valid):
+        store.append(valid, scorer=score_rows)
+        matrix = np.column_stack([
+            valid[subject].fillna(MISSING_SCORE).to_numpy(dtype=np.uint8) if subject in valid
+            else np.full(len(valid), MISSING_SCORE, dtype=np.uint8)
+            for subject in SUBJECTS
+        ])
+        codes, version = score_rows(matrix)
+        result['model_version'] = version
+        for row, code in zip(valid.index.tolist(), _risk_codes(codes)):
+            result['risk'][row] = code
+    result['rows_imported'] = len(valid)
+    result['rows_rejected'] = len(records) - len(valid)
+    result['errors'] = [list(error) for error in errors]
+    result.update(_risk_legend(language))
+    _bump_stats(rows_imported=len(valid))
+    return result
+
+
+def latest_rows(view):
+    """Row of every student's latest assessment in a view, ordered by student id"""
+    def build():
+        student_ids = np.asarray(view.column('student_id'))
+        dates = np.asarray(view.column('assessment_date'))
+        if not len(student_ids):
+            return np.empty(0, dtype=np.int64)
+        order = np.lexsort((np.arange(len(student_ids)), dates, student_ids))
+        sorted_ids = student_ids[order]
+        last = np.append(sorted_ids[1:] != sorted_ids[:-1], True)
+        return order[last]
+
+    return cached(('api_latest', view.state_root), (view.layout, view.rows), build)
+
+
+def rows_payload(store, rows, language):
+    """Columns of the given rows as JSON lists, with risk levels as codes
+
+    Built from the column arrays directly; a page is small, and a DataFrame
+    would cost more than the lists it is turned into.
+    """
+    from frame_schema import date_strings
+
+    rows = np.asarray(rows, dtype=np.int64)
+    values = {name: np.asarray(store.column(name)[rows]) for name in
+              ['student_id', 'grade'] + SUBJECTS + ['risk_level', 'model_version', 'assessment_date']}
+    payload = {
+        'student_id': values['student_id'].tolist(),
+        'student_name': store.students.names(values['student_id']),
+        'grade': values['grade'].tolist(),
+    }
+    for subject in SUBJECTS:
+        payload[subject] = [None if score == MISSING_SCORE else score for score in values[subject].tolist()]
+    payload['risk'] = _risk_codes(values['risk_level'])
+    payload['model_version'] = values['model_version'].tolist()
+    payload['assessment_date'] = date_strings(values['assessment_date']).tolist()
+    for column, groups in store._row_groups(rows).items():
+        payload[column] = groups.astype(object).tolist()
+    return dict(_risk_legend(language), rows=payload)
+
+
+def _int_params(query, name):
+    try:
+        return [int(value) for value in query.get(name, [])]
+    except ValueError:
+        raise ApiError(400, f"'{name}' must be an integer") from None
+
+
+def _page(query):
+    limit, offset = (_int_params(query, name) for name in ('limit', 'offset'))
+    limit = min(limit[0] if limit else DEFAULT_PAGE_ROWS, MAX_PAGE_ROWS)
+    offset = offset[0] if offset else 0
+    if limit < 0 or offset < 0:
+        raise ApiError(400, "'limit' and 'offset' must not be negative")
+    return limit, offset
+
+
+def risk(query):
+    """``GET /v1/risk``: latest assessment of every student in a scope, a page at a time"""
+    store = get_store()
+    view = store.view(regions=query.get('region'), schools=query.get('school'), terms=query.get('term'))
+    rows = latest_rows(view)
+    grades, student_ids = _int_params(query, 'grade'), _int_params(query, 'student_id')
+    if grades:
+        rows = rows[np.isin(view.column('grade')[rows], grades)]
+    if query.get('risk'):
+        unknown = [level for level in query['risk'] if level not in RISK_LEVELS]
+        if unknown:
+            raise ApiError(400, f"unknown risk level(s): {', '.join(unknown)}")
+        codes = [RISK_LEVELS.index(level) for level in query['risk']]
+        rows = rows[np.isin(view.column('risk_level')[rows], codes)]
+    if student_ids:
+        rows = rows[np.isin(view.column('student_id')[rows], student_ids)]
+    limit, offset = _page(query)
+    page = rows[offset:offset + limit]
+    payload = rows_payload(view, page, _language((query.get('language') or [None])[0]))
+    return dict(payload, total=len(rows), offset=offset, limit=limit)
+
+
+def students(query):
+    """``GET /v1/students``: students matching a name in any spelling, with their latest assessment"""
+    from name_search import search_students
+
+    text = (query.get('q') or [''])[0]
+    if not text.strip():
+        raise ApiError(400, "'q' is required")
+    limit, _ = _page(query)
+    matches = search_students(text, min(limit, 100))
+    view = get_store().all
+    rows = latest_rows(view)
+    latest_ids = np.asarray(view.column('student_id')[rows])
+    # ``rows`` is ordered by student id, so each match is one binary search away
+    ids = np.array([student_id for student_id, _, _ in matches], dtype=np.int64)
+    positions = np.searchsorted(latest_ids, ids)
+    found = (positions < len(latest_ids)) & (latest_ids[np.minimum(positions, len(latest_ids) - 1)] == ids)
+    payload = rows_payload(view, rows[positions[found]], _language((query.get('language') or [None])[0]))
+    payload['match_score'] = [score for (_, _, score), hit in zip(matches, found) if hit]
+    return payload
+
+
+def health(query):
+    """``GET /v1/health``: store size and the active model version"""
+    from data_version import data_version
+    from risk_model import get_model
+
+    store = get_store()
+    return {'rows': store.rows, 'students': store.students.count, 'model_version': get_model().version,
+            'data_version': data_version()}
+
+
+ROUTES = {
+    ('POST', '/v1/score'): score,
+    ('POST', '/v1/assessments'): push_assessments,
+    ('GET', '/v1/risk'): risk,
+    ('GET', '/v1/students'): students,
+    ('GET', '/v1/health'): health,
+}
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """Dispatches ``ROUTES``; one instance per connection, kept alive between requests"""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; with Nagle's algorithm on, a
+    # keep-alive client's delayed ACK would stall every response by ~40 ms
+    disable_nagle_algorithm = True
+    token = API_TOKEN
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method):
+        started = time.perf_counter()
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/')
+        route = ROUTES.get((method, path))
+        bytes_in = 0
+        # A body left unread would be parsed as the next request on this connection
+        self._body_pending = method == 'POST'
+        try:
+            if self.token is not None and not hmac.compare_digest(
+                    self.headers.get('Authorization', ''), f'Bearer {self.token}'):
+                raise ApiError(401, "missing or wrong API token")
+            if route is None:
+                known = any(route_path == path for _, route_path in ROUTES)
+                raise ApiError(405 if known else 404, "method not allowed" if known else "not found")
+            if method == 'POST':
+                body = self._read_body()
+                bytes_in = len(body)
+                try:
+                    argument = json.loads(body)
+                except ValueError:
+                    raise ApiError(400, "body is not valid JSON") from None
+                if not isinstance(argument, dict):
+                    raise ApiError(400, "body must be a JSON object")
+            else:
+                argument = parse_qs(url.query)
+            status, payload = 200, route(argument)
+        except ApiError as exc:
+            status, payload = exc.status, {'error': str(exc)}
+        except Exception as exc:  # keep serving; the client gets the reason
+            status, payload = 500, {'error': f"{type(exc).__name__}: {exc}"}
+        if self._body_pending:
+            self._discard_body()
+        bytes_out = self._reply(status, payload)
+        _bump_stats(requests=1, errors=int(status >= 400), bytes_in=bytes_in, bytes_out=bytes_out)
+        count(f'api.status.{status}')
+        observe(f'api{path.replace("/", ".")}' if route is not None else 'api.unrouted', time.perf_counter() - started)
+
+    def _content_length(self):
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # Where the body ends is unknown, so the connection cannot be reused
+            self._body_pending = False
+            self.close_connection = True
+            raise ApiError(400, "invalid Content-Length")
+        return length
+
+    def _read_body(self):
+        length = self._content_length()
+        self._body_pending = False
+        if length > MAX_BODY_BYTES:
+            # The unread body would corrupt the next request on this connection
+            self.close_connection = True
+            raise ApiError(413, f"request body over {MAX_BODY_BYTES // 2**20} MB")
+        body = self.rfile.read(length)
+        if self.headers.get('Content-Encoding') == 'gzip':
+            # Inflated under the same cap, so a small compressed body cannot expand without bound
+            inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                inflated = inflater.decompress(body, MAX_BODY_BYTES + 1)
+            except zlib.error:
+                raise ApiError(400, "body is not valid gzip") from None
+            if len(inflated) > MAX_BODY_BYTES or inflater.unconsumed_tail:
+                raise ApiError(413, f"decompressed request body over {MAX_BODY_BYTES // 2**20} MB")
+            if not inflater.eof:
+                raise ApiError(400, "body is not valid gzip")
+            body = inflated
+        return body
+
+    def _discard_body(self):
+        """Skip the body of a request rejected before it was read"""
+        try:
+            length = self._content_length()
+        except ApiError:
+            return
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+        else:
+            self.rfile.read(length)
+        self._body_pending = False
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        compress = len(body) >= GZIP_MIN_BYTES and 'gzip' in self.headers.get('Accept-Encoding', '')
+        if compress:
+            body = gzip.compress(body, compresslevel=5)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ApiServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Benchmarks open many keep-alive connections at once
+    request_queue_size = 128
+
+
+def make_server(host='127.0.0.1', port=API_PORT, token=API_TOKEN):
+    """An API server bound to ``host:port``; call ``serve_forever`` to run it"""
+    handler = type('ConfiguredApiRequestHandler', (ApiRequestHandler,), {'token': token})
+    return ApiServer((host, port), handler)
+
+
+def stats_snapshot():
+    with _stats_lock:
+        return dict(_stats)
+
+
+register_collector('api', stats_snapshot)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the EduScan JSON API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=API_PORT)
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port)
+    # Load the store and the model now rather than on the first request
+    get_store()
+    from risk_model import get_model
+
+    get_model()
+    print(f"EduScan API listening on http://{args.host}:{server.server_address[1]}/v1", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,333 +1,63 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-import json
 import os
-from datetime import datetime, timedelta
-
-# Language translations
-TRANSLATIONS = {
-    'English': {
-        'app_title': 'EduScan Somalia',
-        'app_subtitle': 'Professional Learning Risk Assessment System',
-        'dashboard': 'Dashboard',
-        'settings': 'Settings',
-        'system_overview': 'System Overview',
-        'total_students': 'Total Students',
-        'on_track': 'On Track',
-        'at_risk': 'At Risk',
-        'intervention': 'Intervention Required',
-        'academic_performance_by_subject': 'Academic Performance by Subject',
-        'student_risk_distribution': 'Student Risk Distribution',
-        'recent_assessment_results': 'Recent Assessment Results',
-        'student_name': 'Student Name',
-        'grade': 'Grade',
-        'math_score': 'Math Score',
-        'reading_score': 'Reading Score',
-        'science_score': 'Science Score',
-        'risk_level': 'Risk Level',
-        'assessment_date': 'Assessment Date',
-        'language': 'Language',
-        'theme': 'Theme',
-        'offline_mode': 'Offline Mode',
-        'save_settings': 'Save Settings',
-        'reset_app': 'Reset Application',
-        'subjects': 'Subjects',
-        'average_score': 'Average Score',
-        'student_risk_overview': 'Student Risk Overview',
-        'average_subject_scores': 'Average Subject Scores',
-        'analytics': 'Analytics'
-    },
-    'Somali': {
-        'app_title': 'EduScan Somalia',
-        'app_subtitle': 'Nidaamka Qiimaynta Khatarta Barashada ee Xirfadda leh',
-        'dashboard': 'Shabakada',
-        'settings': 'Dejinta',
-        'system_overview': 'Guud ahaan Nidaamka',
-        'total_students': 'Wadarta Ardayda',
-        'on_track': 'Jidka Saxda ah',
-        'at_risk': 'Halis ku jira',
-        'intervention': 'Waxaa loo baahan yahay faragelin',
-        'academic_performance_by_subject': 'Waxqabadka Waxbarasho ee Maaddada',
-        'student_risk_distribution': 'Qaybinta Halista Ardayda',
-        'recent_assessment_results': 'Natiijooyinka Qiimaynta ee dhawaan',
-        'student_name': 'Magaca Ardayga',
-        'grade': 'Fasalka',
-        'math_score': 'Dhibcaha Xisaabta',
-        'reading_score': 'Dhibcaha Akhriska',
-        'science_score': 'Dhibcaha Sayniska',
-        'risk_level': 'Heerka Halista',
-        'assessment_date': 'Taariikhda Qiimaynta',
-        'language': 'Luuqada',
-        'theme': 'Qaabka',
-        'offline_mode': 'Qaabka aan internetka lahayn',
-        'save_settings': 'Kaydi Dejinta',
-        'reset_app': 'Dib u deji Codsiga',
-        'subjects': 'Maaddooyinka',
-        'average_score': 'Celceliska Dhibcaha',
-        'student_risk_overview': 'Guud ahaan Halista Ardayda',
-        'average_subject_scores': 'Celceliska Dhibcaha Maaddada',
-        'analytics': 'Falanqaynta'
-    },
-    'Arabic': {
-        'app_title': 'EduScan Somalia',
-        'app_subtitle': 'نظام تقييم مخاطر التعلم المهني',
-        'dashboard': 'لوحة التحكم',
-        'settings': 'الإعدادات',
-        'system_overview': 'نظرة عامة على النظام',
-        'total_students': 'إجمالي الطلاب',
-        'on_track': 'على المسار الصحيح',
-        'at_risk': 'في خطر',
-        'intervention': 'يتطلب تدخلاً',
-        'academic_performance_by_subject': 'الأداء الأكاديمي حسب المادة',
-        'student_risk_distribution': 'توزيع مخاطر الطلاب',
-        'recent_assessment_results': 'نتائج التقييم الأخيرة',
-        'student_name': 'اسم الطالب',
-        'grade': 'الصف',
-        'math_score': 'درجة الرياضيات',
-        'reading_score': 'درجة القراءة',
-        'science_score': 'درجة العلوم',
-        'risk_level': 'مستوى الخطر',
-        'assessment_date': 'تاريخ التقييم',
-        'language': 'اللغة',
-        'theme': 'المظهر',
-        'offline_mode': 'الوضع غير المتصل',
-        'save_settings': 'حفظ الإعدادات',
-        'reset_app': 'إعادة تعيين التطبيق',
-        'subjects': 'المواد',
-        'average_score': 'متوسط الدرجة',
-        'student_risk_overview': 'نظرة عامة على مخاطر الطلاب',
-        'average_subject_scores': 'متوسط درجات المواد',
-        'analytics': 'التحليلات'
-    }
-}
+import shutil
+import tempfile
+import uuid
+
+# Only lightweight modules are imported up front. pandas, numpy, plotly and
+# the data modules built on them are loaded with lazy_import by the pages
+# that use them, so a cold start on the Settings page never pays for them.
+from data_version import data_version
+from instrumentation import metrics_text, record_session, snapshot, start_metrics_server, timed
+from settings_store import load_settings, save_settings
+from startup_profile import PROFILE_ENABLED, format_report, lazy_import, mark_first_render, startup_phase
+from themes import stylesheet_tag
+import translations
+
+# Page sizes offered for the "Recent Assessment Results" table
+TABLE_PAGE_SIZES = [25, 50, 100]
+
+# Best name search matches whose assessments the table shows
+SEARCH_RESULTS = 50
+
+# Rejected rows shown on the import page; the download has all of them
+IMPORT_ERROR_PREVIEW_ROWS = 200
+
+# Seconds between progress updates while this session has background jobs
+JOB_POLL_S = 1.0
+
+# Seconds between checks for data changed by other sessions, jobs or processes
+DATA_POLL_S = 2.0
 
 def get_text(key, language=None):
     """Get localized text based on language setting"""
     if language is None:
         language = st.session_state.get('app_language', 'English')
-    return TRANSLATIONS.get(language, TRANSLATIONS['English']).get(key, key)
+    return translations.get_text(key, language)
 
 def get_recommendations(risk_level):
     """Get recommendations based on risk level"""
-    recommendations = {
-        'Low': [
-            "Continue current learning approach",
-            "Provide enrichment activities",
-            "Monitor progress regularly",
-            "Encourage independent learning",
-            "Maintain engagement"
-        ],
-        'Medium': [
-            "Additional support recommended",
-            "Small group instruction",
-            "Regular progress monitoring",
-            "Parent-teacher collaboration",
-            "Targeted skill building",
-            "Use visual learning aids"
-        ],
-        'High': [
-            "Immediate intervention required",
-            "One-on-one tutoring recommended", 
-            "Consult with learning specialist",
-            "Implement individualized learning plan",
-            "Regular progress monitoring",
-            "Family support engagement"
-        ]
-    }
-    return recommendations.get(risk_level, [])
+    return lazy_import('risk_model').RECOMMENDATIONS.get(risk_level, [])
 
 def load_app_settings():
-    """Load application settings from file"""
-    settings_file = 'data/app_settings.json'
-    default_settings = {
-        'language': 'English',
-        'theme': 'Modern',
-        'offline_mode': False
-    }
-    
-    try:
-        if os.path.exists(settings_file):
-            with open(settings_file, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
-                # Validate theme setting
-                valid_themes = ['Modern', 'Classic', 'Dark']
-                if settings.get('theme') not in valid_themes:
-                    settings['theme'] = 'Modern'
-                return settings
-    except:
-        pass
-    
-    return default_settings
+    """Load application settings from the process-wide settings cache"""
+    return load_settings()
 
 def save_app_settings(settings):
-    """Save application settings to file"""
-    settings_file = 'data/app_settings.json'
-    os.makedirs('data', exist_ok=True)
-    
-    try:
-        with open(settings_file, 'w', encoding='utf-8') as f:
-            json.dump(settings, f, indent=2, ensure_ascii=False)
-        return True
-    except:
-        return False
+    """Atomically save application settings to file"""
+    return save_settings(settings)
 
 def apply_theme(theme):
     """Apply the selected theme to the application"""
-    if theme == 'Modern':
-        st.markdown("""
-        <style>
-        .stApp {
-            background: linear-gradient(135deg, #ff7b00 0%, #ff5722 25%, #ff9800 50%, #ffab00 75%, #ffc107 100%);
-            background-attachment: fixed;
-            background-size: cover;
-            background-repeat: no-repeat;
-            font-family: 'Poppins', sans-serif;
-            min-height: 100vh;
-        }
-        
-        .main-header {
-            background: linear-gradient(135deg, rgba(255,255,255,0.1) 0%, rgba(255,255,255,0.05) 100%);
-            backdrop-filter: blur(20px);
-            border: 1px solid rgba(255,255,255,0.2);
-            border-radius: 20px;
-            padding: 2rem;
-            margin-bottom: 2rem;
-            color: white;
-            text-align: center;
-            box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-        }
-        
-        .main-header h1 {
-            font-size: 3rem;
-            font-weight: 700;
-            margin-bottom: 0.5rem;
-            color: #000000;
-            text-shadow: 2px 2px 4px rgba(255,255,255,0.3);
-        }
-        
-        .main-header p {
-            font-size: 1.2rem;
-            opacity: 0.9;
-            margin-bottom: 0;
-        }
-        
-        .nav-button {
-            background: linear-gradient(135deg, #3b82f6 0%, #2563eb 100%);
-            backdrop-filter: blur(10px);
-            border: 1px solid rgba(255,255,255,0.2);
-            border-radius: 15px;
-            padding: 1rem 2rem;
-            margin: 0.5rem;
-            color: white;
-            text-decoration: none;
-            font-weight: 600;
-            font-size: 1.1rem;
-            transition: all 0.3s ease;
-            display: inline-block;
-            min-width: 150px;
-            text-align: center;
-            cursor: pointer;
-            box-shadow: 0 4px 15px rgba(0,0,0,0.1);
-        }
-        
-        .nav-button:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 8px 25px rgba(0,0,0,0.2);
-            background: linear-gradient(135deg, #2563eb 0%, #1d4ed8 100%);
-        }
-        
-        .nav-button.active {
-            background: linear-gradient(135deg, #3b82f6 0%, #2563eb 100%);
-            color: white;
-            transform: translateY(-2px);
-        }
-        
-        /* Force all Streamlit buttons to be blue */
-        div[data-testid="stButton"] > button {
-            background: linear-gradient(135deg, #3b82f6 0%, #2563eb 100%) !important;
-            color: white !important;
-            border: none !important;
-            border-radius: 8px !important;
-            font-weight: 600 !important;
-            transition: all 0.3s ease !important;
-        }
-        
-        div[data-testid="stButton"] > button:hover {
-            background: linear-gradient(135deg, #2563eb 0%, #1d4ed8 100%) !important;
-            transform: translateY(-2px) !important;
-            box-shadow: 0 4px 15px rgba(59, 130, 246, 0.3) !important;
-        }
-        
-        .metric-card {
-            background: linear-gradient(135deg, rgba(255,255,255,0.1) 0%, rgba(255,255,255,0.05) 100%);
-            backdrop-filter: blur(15px);
-            border: 1px solid rgba(255,255,255,0.2);
-            border-radius: 15px;
-            padding: 1.5rem;
-            margin: 1rem 0;
-            color: white;
-            box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-            transition: all 0.3s ease;
-        }
-        
-        .metric-card:hover {
-            transform: translateY(-5px);
-            box-shadow: 0 15px 40px rgba(0,0,0,0.2);
-        }
-        
-        .metric-value {
-            font-size: 2.5rem;
-            font-weight: 700;
-            color: #2c3e50;
-        }
-        
-        .metric-title {
-            font-size: 1.1rem;
-            opacity: 0.9;
-            margin-bottom: 0.5rem;
-        }
-        
-        .metric-desc {
-            font-size: 0.9rem;
-            opacity: 0.7;
-        }
-        
-        .content-card {
-            background: linear-gradient(135deg, rgba(255,255,255,0.95) 0%, rgba(255,255,255,0.9) 100%);
-            backdrop-filter: blur(20px);
-            border: 1px solid rgba(255,255,255,0.3);
-            border-radius: 20px;
-            padding: 2rem;
-            margin: 1rem 0;
-            box-shadow: 0 8px 32px rgba(0,0,0,0.1);
-            color: #2c3e50;
-        }
-        
-        .stSelectbox > div > div {
-            background-color: rgba(255,255,255,0.9) !important;
-            border-radius: 10px !important;
-        }
-        
-        .stTextInput > div > div > input {
-            background-color: rgba(255,255,255,0.9) !important;
-            border-radius: 10px !important;
-        }
-        
-        .stNumberInput > div > div > input {
-            background-color: rgba(255,255,255,0.9) !important;
-            border-radius: 10px !important;
-        }
-        </style>
-        """, unsafe_allow_html=True)
+    # Minified once per process; only the <style> element is sent per rerun
+    st.markdown(stylesheet_tag(theme), unsafe_allow_html=True)
 
 def check_offline_mode():
     """Check if application can work offline"""
     settings = load_app_settings()
     return settings.get('offline_mode', False)
 
+@timed()
 def render_app_header():
     """Render professional desktop application header"""
     language = st.session_state.get('app_language', 'English')
@@ -347,6 +77,24 @@ def get_settings_icon():
     """Get settings icon"""
     return "⚙️"
 
+def get_import_icon():
+    """Get import icon"""
+    return "📥"
+
+def record_execution(scope):
+    """Count script and fragment executions for the current session"""
+    counts = st.session_state.setdefault('execution_counts', {})
+    counts[scope] = counts.get(scope, 0) + 1
+    session_id = st.session_state.setdefault('session_id', uuid.uuid4().hex[:8])
+    record_session(session_id, scope)
+
+def set_current_page(page):
+    """Navigation button callback"""
+    # Leaving a page opened by URL (``?page=diagnostics``)
+    st.query_params.pop('page', None)
+    st.session_state.current_page = page
+
+@timed()
 def render_navigation(language=None):
     """Render desktop-style navigation tabs"""
     if language is None:
@@ -356,24 +104,33 @@ def render_navigation(language=None):
     if 'current_page' not in st.session_state:
         st.session_state.current_page = 'dashboard'
     
-    # Simplified navigation - only Dashboard and Settings
+    # Simplified navigation - Dashboard, Import, Analytics and Settings
     col1, col2, col3, col4, col5, col6 = st.columns([2, 2, 2, 2, 2, 2])
     
     nav_options = [
         ('dashboard', get_dashboard_icon(), get_text('dashboard', language)),
+        ('import', get_import_icon(), get_text('import_data', language)),
+        ('analytics', get_dashboard_icon(), get_text('analytics', language)),
         ('settings', get_settings_icon(), get_text('settings', language))
     ]
     
-    # Center the navigation buttons
+    # Center the navigation buttons. The page switch happens in a callback,
+    # before the script runs, so a click costs one run instead of two.
     with col2:
-        if st.button(get_text('dashboard', language), key="nav_dashboard", type="primary"):
-            st.session_state.current_page = 'dashboard'
-            st.rerun()
+        st.button(get_text('dashboard', language), key="nav_dashboard", type="primary",
+                  on_click=set_current_page, args=('dashboard',))
+    
+    with col3:
+        st.button(get_text('import_data', language), key="nav_import", type="primary",
+                  on_click=set_current_page, args=('import',))
+    
+    with col4:
+        st.button(get_text('analytics', language), key="nav_analytics", type="primary",
+                  on_click=set_current_page, args=('analytics',))
     
     with col5:
-        if st.button(get_text('settings', language), key="nav_settings", type="primary"):
-            st.session_state.current_page = 'settings'
-            st.rerun()
+        st.button(get_text('settings', language), key="nav_settings", type="primary",
+                  on_click=set_current_page, args=('settings',))
 
 def create_metric_card(title, value, description, color="#3b82f6"):
     """Create a professional metric card"""
@@ -385,6 +142,157 @@ def create_metric_card(title, value, description, color="#3b82f6"):
     </div>
     """
 
+def format_risk_delta(text, overview, risk_index):
+    """Append the month-over-month change to a metric tile delta"""
+    changes = overview['risk_changes']
+    if not changes:
+        return text
+    return f"{text} ({changes[risk_index]:+,} vs last month)"
+
+@timed()
+def build_subject_chart(subject_means, language):
+    """Build the average-score-per-subject bar chart"""
+    px = lazy_import('plotly.express')
+    subject_labels = lazy_import('assessment_store').SUBJECT_LABELS
+    subjects = [subject_labels[subject] for subject in subject_means]
+    scores = [round(mean, 1) for mean in subject_means.values()]
+    
+    fig = px.bar(
+        x=subjects, 
+        y=scores,
+        title=get_text('average_subject_scores', language),
+        color=scores,
+        color_continuous_scale='Blues'
+    )
+    fig.update_layout(
+        xaxis_title=get_text('subjects', language),
+        yaxis_title=get_text('average_score', language),
+        showlegend=False,
+        height=400
+    )
+    return fig
+
+@timed()
+def build_risk_chart(risk_counts, language):
+    """Build the student risk distribution pie chart"""
+    go = lazy_import('plotly.graph_objects')
+    risk_labels = [get_text('on_track', language), get_text('at_risk', language), get_text('intervention', language)]
+    risk_colors = ['#10b981', '#f8f9fa', '#ef4444']
+    
+    fig = go.Figure(data=[go.Pie(
+        labels=risk_labels, 
+        values=risk_counts,
+        hole=0.4,
+        marker_colors=risk_colors,
+        marker_line=dict(color='#000000', width=2)
+    )])
+    fig.update_layout(
+        title=get_text('student_risk_overview', language),
+        height=400
+    )
+    return fig
+
+@timed()
+def build_cohort_trend_chart(series, language):
+    """Build the cohort moving-average line chart from ``{label: (days, values)}``"""
+    go = lazy_import('plotly.graph_objects')
+    np = lazy_import('numpy')
+    trends = lazy_import('trends')
+    
+    fig = go.Figure()
+    for label, (days, values) in series.items():
+        # Downsampled on the server so long histories stay light in the browser
+        keep = trends.lttb(days, values)
+        fig.add_trace(go.Scatter(
+            x=days[keep].astype('datetime64[D]'), y=np.round(values[keep], 1), mode='lines', name=label
+        ))
+    fig.update_layout(
+        title=get_text('moving_average', language),
+        xaxis_title=get_text('assessment_date', language),
+        yaxis_title=get_text('average_score', language),
+        height=400
+    )
+    return fig
+
+@timed()
+def build_student_trend_chart(days, scores, ema, language):
+    """Build one student's score history with its moving average"""
+    go = lazy_import('plotly.graph_objects')
+    trends = lazy_import('trends')
+    
+    keep = trends.lttb(days, scores)
+    dates = days.astype('datetime64[D]')
+    fig = go.Figure([
+        go.Scatter(x=dates[keep], y=scores[keep].round(1), mode='markers+lines', name=get_text('average_score', language)),
+        go.Scatter(x=dates[keep], y=ema[keep].round(1), mode='lines', name=get_text('moving_average', language))
+    ])
+    fig.update_layout(
+        xaxis_title=get_text('assessment_date', language),
+        yaxis_title=get_text('average_score', language),
+        height=350
+    )
+    return fig
+
+@timed()
+def build_score_histogram_chart(histogram, language):
+    """Build the score distribution chart, stacked by risk level, from the cube's ``[risk, bin]`` counts"""
+    go = lazy_import('plotly.graph_objects')
+    analytics_cube = lazy_import('analytics_cube')
+    
+    names = [get_text(key, language) for key in translations.RISK_LEVEL_KEYS] + [get_text('not_scored', language)]
+    colors = ['#10b981', '#f59e0b', '#ef4444', '#94a3b8']
+    fig = go.Figure([
+        go.Bar(x=analytics_cube.BIN_LABELS, y=counts, name=name, marker_color=color)
+        for name, counts, color in zip(names, histogram, colors) if counts.any()
+    ])
+    fig.update_layout(
+        barmode='stack',
+        title=get_text('score_distribution', language),
+        yaxis_title=get_text('assessments', language),
+        height=400
+    )
+    return fig
+
+def render_scope_selector(store, language):
+    """Region, school and term pickers; returns the partition view to show"""
+    all_label = get_text('all', language)
+    
+    def show(value):
+        return all_label if value is None else value
+    
+    regions = [None] + store.regions()
+    # Links such as ``?region=Awdal&school=...`` open a headteacher's own scope
+    requested = st.query_params.get('region')
+    if 'scope_region' not in st.session_state and requested is not None and requested in regions:
+        st.session_state['scope_region'] = requested
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        region = st.selectbox(get_text('region', language), regions, format_func=show, key='scope_region')
+    
+    schools = [None] + store.schools(region)
+    requested = st.query_params.get('school')
+    if 'scope_school' not in st.session_state and requested is not None and requested in schools:
+        st.session_state['scope_school'] = requested
+    if st.session_state.get('scope_school') not in schools:
+        st.session_state['scope_school'] = None
+    
+    with col2:
+        school = st.selectbox(get_text('school', language), schools, format_func=show, key='scope_school')
+    
+    with col3:
+        term = st.selectbox(
+            get_text('term', language), [None] + store.terms()[::-1], format_func=show, key='scope_term'
+        )
+    
+    return store.view(
+        regions=[region] if region else None,
+        schools=[school] if school else None,
+        terms=[term] if term else None
+    )
+
+@timed()
 def render_dashboard():
     """Render the main dashboard"""
     # Get language from session state first, then settings
@@ -400,177 +308,609 @@ def render_dashboard():
     </div>
     """, unsafe_allow_html=True)
     
+    # Heavy modules are first imported here, not when the app starts
+    lazy_import('numpy')
+    lazy_import('pandas')
+    store_module = lazy_import('assessment_store')
+    aggregates = lazy_import('aggregates')
+    cached_figure = lazy_import('chart_cache').cached_figure
+    
+    with startup_phase('assessment store'):
+        store = store_module.get_store()
+    # Only the partitions in scope are opened
+    view = render_scope_selector(store, language)
+    with startup_phase('dashboard aggregates'):
+        overview = aggregates.get_aggregates(view).snapshot()
+    risk_counts = overview['risk_counts']
+    on_track, at_risk, intervention = risk_counts
+    on_track_pct, at_risk_pct, intervention_pct = overview['risk_percentages']
+    
     # Metrics row
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         st.metric(
             label=get_text('total_students', language),
-            value="342",
-            delta="12 new this month"
+            value=f"{overview['total_students']:,}",
+            delta=f"{overview['new_this_month']:,} new this month"
         )
     
     with col2:
         st.metric(
             label=get_text('on_track', language), 
-            value="267",
-            delta="78% performing well"
+            value=f"{on_track:,}",
+            delta=format_risk_delta(f"{on_track_pct}% performing well", overview, 0)
         )
     
     with col3:
         st.metric(
             label=get_text('at_risk', language),
-            value="52", 
-            delta="15% need support"
+            value=f"{at_risk:,}", 
+            delta=format_risk_delta(f"{at_risk_pct}% need support", overview, 1)
         )
     
     with col4:
         st.metric(
             label=get_text('intervention', language),
-            value="23",
-            delta="7% urgent attention"
+            value=f"{intervention:,}",
+            delta=format_risk_delta(f"{intervention_pct}% urgent attention", overview, 2)
         )
     
     st.markdown("<br>", unsafe_allow_html=True)
     
     # Performance Charts
+    theme = load_app_settings().get('theme', 'Modern')
+    data_version = overview['version']
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader(f"📊 {get_text('academic_performance_by_subject', language)}")
-        # Create subject performance chart
-        subjects = ['Mathematics', 'Reading', 'Writing', 'Science', 'Social Studies']
-        scores = [78, 82, 75, 80, 77]
-        
-        fig = px.bar(
-            x=subjects, 
-            y=scores,
-            title=get_text('average_subject_scores', language),
-            color=scores,
-            color_continuous_scale='Blues'
-        )
-        fig.update_layout(
-            xaxis_title=get_text('subjects', language),
-            yaxis_title=get_text('average_score', language),
-            showlegend=False,
-            height=400
+        fig = cached_figure(
+            f'subject_scores:{view.view_id}', language, theme, data_version,
+            lambda: build_subject_chart(overview['subject_means'], language)
         )
         st.plotly_chart(fig, use_container_width=True)
     
     with col2:
         st.subheader(f"📈 {get_text('student_risk_distribution', language)}")
-        # Create risk level pie chart
-        risk_labels = [get_text('on_track', language), get_text('at_risk', language), get_text('intervention', language)]
-        risk_values = [267, 52, 23]
-        risk_colors = ['#10b981', '#f8f9fa', '#ef4444']
-        
-        fig = go.Figure(data=[go.Pie(
-            labels=risk_labels, 
-            values=risk_values,
-            hole=0.4,
-            marker_colors=risk_colors,
-            marker_line=dict(color='#000000', width=2)
-        )])
-        fig.update_layout(
-            title=get_text('student_risk_overview', language),
-            height=400
+        fig = cached_figure(
+            f'risk_distribution:{view.view_id}', language, theme, data_version,
+            lambda: build_risk_chart(risk_counts, language)
         )
         st.plotly_chart(fig, use_container_width=True)
     
+    # Trends
+    st.subheader(f"📉 {get_text('performance_trends', language)}")
+    render_trends(language, view)
+    
     # Recent Assessment Data
     st.subheader(f"📋 {get_text('recent_assessment_results', language)}")
+    render_assessment_table(language, view)
     
-    # Create sample assessment data with translated headers
-    assessment_data = pd.DataFrame({
-        get_text('student_name', language): ['Ahmed Hassan', 'Fatima Ali', 'Omar Mohamed', 'Sahra Abdi', 'Yusuf Ibrahim'],
-        get_text('grade', language): ['Grade 6', 'Grade 5', 'Grade 7', 'Grade 6', 'Grade 5'],
-        get_text('math_score', language): [85, 92, 78, 88, 75],
-        get_text('reading_score', language): [78, 89, 82, 91, 73],
-        get_text('science_score', language): [82, 94, 76, 89, 78],
-        get_text('risk_level', language): ['Low', 'Low', 'Medium', 'Low', 'Medium'],
-        get_text('assessment_date', language): ['2024-06-15', '2024-06-14', '2024-06-13', '2024-06-12', '2024-06-11']
-    })
+    # Printable reports of the selected scope
+    st.subheader(f"📄 {get_text('reports', language)}")
+    render_reports(language, view)
+
+@st.fragment
+@timed()
+def render_trends(language, view):
+    """Render cohort and per-student score trends of the selected scope"""
+    # A fragment: picking grades or a student re-runs only this section
+    record_execution('fragment:trends')
+    store_module = lazy_import('assessment_store')
+    trends = lazy_import('trends')
+    cached_figure = lazy_import('chart_cache').cached_figure
+    
+    with startup_phase('trends'):
+        trend_state = trends.get_trends(view)
+    theme = load_app_settings().get('theme', 'Modern')
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        grades = st.multiselect(
+            get_text('grade', language), list(range(1, store_module.MAX_GRADE + 1)),
+            format_func=store_module.grade_label, key='trend_grades'
+        )
+        
+        def build():
+            if grades:
+                series = {store_module.grade_label(g): trend_state.cohort_series([g]) for g in grades}
+            else:
+                series = {get_text('total_students', language): trend_state.cohort_series()}
+            return build_cohort_trend_chart(series, language)
+        
+        fig = cached_figure(
+            f"cohort_trend:{view.view_id}:{tuple(grades)}", language, theme, trend_state.version, build
+        )
+        st.plotly_chart(fig, use_container_width=True)
     
-    st.dataframe(assessment_data, use_container_width=True)
+    with col2:
+        declining = trend_state.declining_students(limit=10, store=view)
+        st.markdown(f"**{get_text('declining_students', language)}**")
+        st.dataframe(lazy_import('frame_schema').display_frame(declining, language, {
+            'student_name': 'student_name',
+            'grade': 'grade',
+            'ema': 'average_score',
+            'slope': 'trend_per_month',
+            'risk_level': 'risk_level'
+        }), use_container_width=True, hide_index=True)
+        
+        if len(declining):
+            names = {int(student_id): name for student_id, name in zip(declining['student_id'], declining['student_name'])}
+            student_id = st.selectbox(
+                get_text('student_name', language), list(names), format_func=names.get, key='trend_student'
+            )
+            days, scores, ema = trends.student_series(student_id, store=view)
+            st.plotly_chart(build_student_trend_chart(days, scores, ema, language), use_container_width=True)
 
-def render_settings():
-    """Render the settings page"""
-    # Get language from session state first, then settings
-    language = st.session_state.get('app_language')
-    if language is None:
-        settings = load_app_settings()
-        language = settings.get('language', 'English')
-        st.session_state['app_language'] = language
-    else:
-        settings = load_app_settings()
+def reset_table_page():
+    """Go back to the first page when the table filters or sort change"""
+    st.session_state['table_page'] = 1
+
+@st.fragment
+@timed()
+def render_assessment_table(language, view):
+    """Render the server-side filtered, sorted and paginated assessment table of the selected scope"""
+    # A fragment: filtering and paging re-run only the table, not the charts
+    record_execution('fragment:assessment_table')
+    store_module = lazy_import('assessment_store')
+    query_page = lazy_import('assessment_index').query_page
+    RISK_LEVELS = store_module.RISK_LEVELS
+    risk_labels = dict(zip(RISK_LEVELS, (get_text(key, language) for key in translations.RISK_LEVEL_KEYS)))
     
-    # Add CSS to fix text color for selectboxes
-    st.markdown("""
-    <style>
-    /* Fix selectbox text color */
-    .stSelectbox > div > div > div {
-        color: #000000 !important;
-        background-color: #ffffff !important;
+    sort_labels = {
+        'assessment_date': get_text('assessment_date', language),
+        'grade': get_text('grade', language),
+        'math': get_text('math_score', language),
+        'reading': get_text('reading_score', language),
+        'science': get_text('science_score', language),
+        'risk_level': get_text('risk_level', language)
     }
     
-    /* Fix selectbox dropdown text */
-    .stSelectbox > div > div > div > div {
-        color: #000000 !important;
-    }
+    # Matches any spelling or script of the name, e.g. Maxamed/Mohamed/محمد.
+    # Not stripped: a trailing space ends the last word instead of matching it as a prefix
+    search = st.text_input(
+        f"🔍 {get_text('search_student', language)}", key='table_search', on_change=reset_table_page
+    )
     
-    /* Fix selectbox options */
-    [data-baseweb="select"] > div {
-        color: #000000 !important;
-        background-color: #ffffff !important;
-    }
+    col1, col2, col3, col4 = st.columns(4)
     
-    /* Fix all text in settings to be black */
-    .stMarkdown h3 {
-        color: #000000 !important;
-    }
+    with col1:
+        grades = st.multiselect(
+            get_text('grade', language), list(range(1, store_module.MAX_GRADE + 1)),
+            format_func=store_module.grade_label, key='table_grades', on_change=reset_table_page
+        )
     
-    /* Fix checkbox text */
-    .stCheckbox > label {
-        color: #000000 !important;
-    }
+    with col2:
+        risk_levels = st.multiselect(
+            get_text('risk_level', language), RISK_LEVELS, format_func=risk_labels.get,
+            key='table_risk_levels', on_change=reset_table_page
+        )
     
-    /* Fix all text labels */
-    .stSelectbox label {
-        color: #000000 !important;
-    }
+    with col3:
+        date_range = st.date_input(
+            get_text('assessment_date', language), value=[],
+            key='table_dates', on_change=reset_table_page
+        )
     
-    /* Make sure preview text is visible */
-    .stMarkdown p {
-        color: #000000 !important;
-    }
+    with col4:
+        sort_column = st.selectbox(
+            "Sort by", list(sort_labels), format_func=sort_labels.get,
+            key='table_sort', on_change=reset_table_page
+        )
+        descending = st.checkbox("Descending", value=True, key='table_descending', on_change=reset_table_page)
     
-    /* Style navigation buttons to be blue */
-    div[data-testid="stButton"] > button {
-        background: linear-gradient(135deg, #3b82f6 0%, #2563eb 100%) !important;
-        color: white !important;
-        border: none !important;
-        border-radius: 8px !important;
-        font-weight: 600 !important;
-        transition: all 0.3s ease !important;
+    filters = {
+        'grades': grades,
+        'risk_levels': [RISK_LEVELS.index(level) for level in risk_levels]
     }
+    if search.strip():
+        with startup_phase('name search'):
+            matches = lazy_import('name_search').search_students(search, limit=SEARCH_RESULTS, store=view)
+        filters['student_ids'] = [student_id for student_id, _, _ in matches]
+    if len(date_range) > 0:
+        filters['date_from'] = store_module.date_to_days(date_range[0])
+        filters['date_to'] = store_module.date_to_days(date_range[-1])
+    
+    page_size = st.session_state.get('table_page_size', TABLE_PAGE_SIZES[0])
+    page = st.session_state.get('table_page', 1)
+    
+    # Only the requested page is materialized and sent to the browser
+    with startup_phase('sort index'):
+        page_data, total = query_page(filters, sort_column, descending, page, page_size, store=view)
+    total_pages = max((total + page_size - 1) // page_size, 1)
+    if page > total_pages:
+        page = total_pages
+        page_data, total = query_page(filters, sort_column, descending, page, page_size, store=view)
+    st.session_state['table_page'] = page
+    
+    # Pages come back in the compact schema; labels are translated only here
+    assessment_data = lazy_import('frame_schema').display_frame(page_data, language, {
+        'student_name': 'student_name',
+        'grade': 'grade',
+        'math': 'math_score',
+        'reading': 'reading_score',
+        'science': 'science_score',
+        'risk_level': 'risk_level',
+        'assessment_date': 'assessment_date'
+    })
+    
+    st.dataframe(assessment_data, use_container_width=True, hide_index=True)
+    
+    col1, col2, col3 = st.columns([2, 1, 1])
     
-    div[data-testid="stButton"] > button:hover {
-        background: linear-gradient(135deg, #2563eb 0%, #1d4ed8 100%) !important;
-        transform: translateY(-2px) !important;
-        box-shadow: 0 4px 15px rgba(59, 130, 246, 0.3) !important;
+    with col1:
+        first_row = (page - 1) * page_size + 1 if total else 0
+        st.markdown(f"Showing {first_row:,}–{min(page * page_size, total):,} of {total:,}")
+    
+    with col2:
+        st.number_input("Page", min_value=1, max_value=total_pages, step=1, key='table_page')
+    
+    with col3:
+        st.selectbox("Rows per page", TABLE_PAGE_SIZES, key='table_page_size', on_change=reset_table_page)
+
+def dismiss_reports():
+    """Report download dismiss callback: forget the job and delete its zip"""
+    job_id = st.session_state.pop('report_job', None)
+    if job_id is not None:
+        lazy_import('jobs').forget_job(job_id)
+
+def start_reports(view, language):
+    """Generate reports button callback: render the scope's reports in the background"""
+    dismiss_reports()
+    jobs = lazy_import('jobs')
+    job = start_job('reports', jobs.report_job, view, st.session_state['report_formats'], language,
+                    label=get_text('reports', language))
+    if job is not None:
+        st.session_state['report_job'] = job.id
+
+@st.fragment
+@timed()
+def render_reports(language, view):
+    """Render bulk student and class report generation for the selected scope"""
+    # A fragment: picking formats re-runs only this section
+    record_execution('fragment:reports')
+    jobs = lazy_import('jobs')
+    reports = lazy_import('reports')
+    
+    job = jobs.get_job(st.session_state['report_job']) if 'report_job' in st.session_state else None
+    running = job is not None and not job.done
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        # PDF is not offered in Arabic; drop it if it was picked in another language
+        options = reports.report_formats(language)
+        if 'report_formats' not in st.session_state:
+            st.session_state['report_formats'] = ['html']
+        st.session_state['report_formats'] = [fmt for fmt in st.session_state['report_formats'] if fmt in options]
+        formats = st.multiselect(
+            get_text('report_format', language), options, format_func=str.upper, key='report_formats'
+        )
+    with col2:
+        st.button(get_text('generate_reports', language), key='generate_reports', disabled=running or not formats,
+                  on_click=start_reports, args=(view, language))
+    if job is None or running:
+        return
+    
+    if job.state == jobs.FAILED:
+        st.error(f"Report generation failed: {job.error}")
+    elif job.state == jobs.CANCELLED:
+        st.info("Report generation was cancelled.")
+    else:
+        summary = job.result
+        st.caption(
+            f"{summary['students']:,} {get_text('students', language).lower()} · {summary['classes']:,} classes · "
+            f"{summary['files']:,} files in {summary['seconds']:.1f}s"
+        )
+        with open(summary['path'], 'rb') as f:
+            st.download_button(get_text('download_reports', language), f, file_name="eduscan_reports.zip",
+                               mime="application/zip", key='download_reports')
+    st.button("Dismiss", key="dismiss_reports", on_click=dismiss_reports)
+
+@timed()
+def render_analytics():
+    """Render the analytics page, answered from the precomputed aggregation cube"""
+    language = st.session_state.get('app_language', 'English')
+    
+    st.markdown(f"""
+    <div class="content-card">
+        <h2 style="margin-top: 0; color: #1e293b; text-align: center;">{get_text('analytics', language)}</h2>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    lazy_import('numpy')
+    lazy_import('pandas')
+    store = lazy_import('assessment_store').get_store()
+    with startup_phase('analytics cube'):
+        cube = lazy_import('analytics_cube').get_cube(store)
+    render_analytics_explorer(language, store, cube)
+
+def format_analytics_group(group_by, group, language):
+    """Display label of one group of an analytics cube query"""
+    if group_by == 'grade':
+        return f"{get_text('grade', language)} {group}"
+    if group_by == 'subject':
+        return get_text(f'{group}_score', language)
+    if group_by == 'risk_level':
+        if group < 0:
+            return get_text('not_scored', language)
+        return get_text(translations.RISK_LEVEL_KEYS[group], language)
+    return group
+
+@st.fragment
+@timed()
+def render_analytics_explorer(language, store, cube):
+    """Render the analytics filters, totals, group table, score distribution and drill-down"""
+    # A fragment: every filter change is one cube query and re-runs only this section
+    record_execution('fragment:analytics')
+    np = lazy_import('numpy')
+    pd = lazy_import('pandas')
+    store_module = lazy_import('assessment_store')
+    analytics_cube = lazy_import('analytics_cube')
+    cached_figure = lazy_import('chart_cache').cached_figure
+    risk_keys = translations.RISK_LEVEL_KEYS
+    
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        schools = st.multiselect(get_text('school', language), store.schools(), key='analytics_schools')
+    with col2:
+        terms = st.multiselect(get_text('term', language), store.terms()[::-1], key='analytics_terms')
+    with col3:
+        grades = st.multiselect(
+            get_text('grade', language), list(range(1, store_module.MAX_GRADE + 1)),
+            format_func=store_module.grade_label, key='analytics_grades'
+        )
+    with col4:
+        subjects = st.multiselect(
+            get_text('subjects', language), store_module.SUBJECTS,
+            format_func=lambda subject: get_text(f'{subject}_score', language), key='analytics_subjects'
+        )
+    with col5:
+        risk_levels = st.multiselect(
+            get_text('risk_level', language), list(range(len(risk_keys))),
+            format_func=lambda code: get_text(risk_keys[code], language), key='analytics_risk_levels'
+        )
+    group_labels = {
+        'grade': 'grade', 'subject': 'subjects', 'risk_level': 'risk_level',
+        'school': 'school', 'term': 'term', 'region': 'region'
     }
+    group_by = st.selectbox(
+        get_text('group_by', language), analytics_cube.GROUP_BY,
+        format_func=lambda column: get_text(group_labels[column], language), key='analytics_group_by'
+    )
+    
+    result = cube.query(schools=schools, terms=terms, grades=grades, subjects=subjects,
+                        risk_levels=risk_levels, group_by=group_by)
+    total_risk = result['total_risk_rows']
+    scored = max(int(total_risk[:len(risk_keys)].sum()), 1)
+    score_count = int(result['score_counts'].sum())
+    
+    # Totals of the selection
+    col1, col2, col3, col4, col5 = st.columns(5)
+    with col1:
+        st.metric(label=get_text('assessments', language), value=f"{result['total_rows']:,}")
+    with col2:
+        average = result['score_sums'].sum() / score_count if score_count else None
+        st.metric(label=get_text('average_score', language), value='–' if average is None else f"{average:.1f}")
+    for column, code in zip((col3, col4, col5), range(len(risk_keys))):
+        with column:
+            st.metric(label=get_text(risk_keys[code], language), value=f"{total_risk[code] / scored:.1%}")
+    
+    # One row per group
+    risk_rows = result['risk_rows']
+    group_scored = np.maximum(risk_rows[:, :len(risk_keys)].sum(axis=1), 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = np.round(result['score_sums'] / result['score_counts'], 1)
+    table = pd.DataFrame({
+        get_text(group_labels[group_by], language): [
+            format_analytics_group(group_by, group, language) for group in result['groups']
+        ],
+        get_text('assessments', language): result['rows'],
+        get_text('average_score', language): averages,
+        **{
+            f"{get_text(key, language)} %": np.round(100 * risk_rows[:, code] / group_scored, 1)
+            for code, key in enumerate(risk_keys)
+        }
+    })
+    st.dataframe(table, use_container_width=True, hide_index=True)
+    
+    theme = load_app_settings().get('theme', 'Modern')
+    filters = (tuple(schools), tuple(terms), tuple(grades), tuple(subjects), tuple(risk_levels))
+    fig = cached_figure(
+        f'score_histogram:{filters}', language, theme, result['version'],
+        lambda: build_score_histogram_chart(result['histogram'], language)
+    )
+    st.plotly_chart(fig, use_container_width=True)
     
-    /* Style primary buttons specifically */
-    button[kind="primary"] {
-        background: linear-gradient(135deg, #3b82f6 0%, #2563eb 100%) !important;
-        color: white !important;
+    # Drill-down: the only part of the page that reads raw rows
+    if st.toggle(get_text('show_students', language), key='analytics_show_students'):
+        view = store.view(schools=schools or None, terms=terms or None)
+        with startup_phase('analytics students'):
+            students, total = analytics_cube.student_list(view, grades=grades, subjects=subjects,
+                                                          risk_levels=risk_levels)
+        st.caption(f"{get_text('matching_students', language)}: {total:,}")
+        if len(students):
+            st.dataframe(lazy_import('frame_schema').display_frame(students, language, {
+                'student_name': 'student_name',
+                'grade': 'grade',
+                'school': 'school',
+                'average': 'average_score',
+                'risk_level': 'risk_level',
+                'assessment_date': 'assessment_date'
+            }), use_container_width=True, hide_index=True)
+
+@timed()
+def render_import():
+    """Render the bulk roster/assessment import page"""
+    language = st.session_state.get('app_language', 'English')
+    
+    st.markdown(f"""
+    <div class="main-header">
+        <h1 class="page-title">{get_text('import_data', language)}</h1>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.markdown(
+        "Upload a CSV or Excel (.xlsx) file with the columns **Student Name**, **Grade**, "
+        "**Assessment Date** and at least one subject score (Math, Reading, Writing, Science, "
+        "Social Studies). Rows are validated and stored in batches."
+    )
+    render_import_form(language)
+
+def start_job(kind, func, *args, label=None, key=None, **kwargs):
+    """Queue a background job and have this session poll it; None when the queue is full"""
+    jobs = lazy_import('jobs')
+    try:
+        job = jobs.submit(kind, func, *args, label=label, key=key, **kwargs)
+    except jobs.JobQueueFull:
+        st.session_state['jobs_flash'] = 'full'
+        return None
+    session_jobs = st.session_state.setdefault('jobs', [])
+    if job.id not in session_jobs:
+        session_jobs.append(job.id)
+    return job
+
+def session_active_jobs():
+    """Jobs started by this session that are still queued or running"""
+    jobs = lazy_import('jobs')
+    active = [job for job in map(jobs.get_job, st.session_state.get('jobs', [])) if job is not None and not job.done]
+    st.session_state['jobs'] = [job.id for job in active]
+    return active
+
+@st.fragment(run_every=JOB_POLL_S)
+@timed()
+def render_jobs(language):
+    """Progress of this session's background jobs, polled while any is running"""
+    # A fragment on a timer: only this panel re-runs while jobs are in flight
+    record_execution('fragment:jobs')
+    jobs = lazy_import('jobs')
+    active = session_active_jobs()
+    if not active:
+        # Re-run the page once so it shows the jobs' results, and stop polling
+        st.rerun()
+    
+    st.markdown(f"**{get_text('background_jobs', language)}**")
+    for job in active:
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            status = job.message or job.state.capitalize()
+            st.progress(job.progress, text=f"{job.label} · {status}")
+        with col2:
+            st.button(get_text('cancel', language), key=f"cancel_job_{job.id}", disabled=job.cancel_requested,
+                      on_click=jobs.cancel_job, args=(job.id,))
+
+@st.fragment(run_every=DATA_POLL_S)
+def render_data_watch():
+    """Re-run the page when data changed after it was rendered"""
+    # Renders nothing; comparing two integers is all an idle session costs
+    if data_version() != st.session_state.get('data_version'):
+        record_execution('fragment:data_watch')
+        st.rerun()
+
+def dismiss_import():
+    """Import result dismiss callback: forget the job and delete its error report"""
+    job_id = st.session_state.pop('import_job', None)
+    if job_id is not None:
+        lazy_import('jobs').forget_job(job_id)
+
+def start_import(uploaded):
+    """Import button callback: save the upload and import it in the background"""
+    dismiss_import()
+    jobs = lazy_import('jobs')
+    # The job reads from a copy, as the upload's buffer belongs to this session
+    suffix = os.path.splitext(uploaded.name)[1]
+    with tempfile.NamedTemporaryFile('wb', suffix=suffix, delete=False) as f:
+        uploaded.seek(0)
+        shutil.copyfileobj(uploaded, f)
+    # Offline, validated rows are captured in the local queue and synced on reconnect
+    job = start_job('import', jobs.import_job, f.name, uploaded.name, offline=check_offline_mode(), label=uploaded.name)
+    if job is None:
+        os.unlink(f.name)
+    else:
+        st.session_state['import_job'] = job.id
+
+@st.fragment
+@timed()
+def render_import_form(language):
+    """Render the upload widget and the result of the last import"""
+    # A fragment: choosing a file re-runs only this section
+    record_execution('fragment:import')
+    jobs = lazy_import('jobs')
+    
+    uploaded = st.file_uploader("Assessment file", type=['csv', 'xlsx'], label_visibility="collapsed")
+    
+    job = jobs.get_job(st.session_state['import_job']) if 'import_job' in st.session_state else None
+    running = job is not None and not job.done
+    if uploaded is not None:
+        st.button(get_text('import_data', language), type="primary", key="run_import", disabled=running,
+                  on_click=start_import, args=(uploaded,))
+    if job is None or running:
+        return
+    
+    if job.state == jobs.FAILED:
+        st.error(f"Could not import {job.label}: {job.error}")
+    elif job.state == jobs.CANCELLED:
+        st.info(f"Import of {job.label} was cancelled; rows stored before that were kept.")
+    else:
+        summary = job.result
+        verb = "Queued" if summary['offline'] else "Imported"
+        if summary['offline']:
+            st.info("Offline mode: the rows are stored on this device and sync when you go back online.")
+        if summary['rows_rejected']:
+            # The full error report is a file on disk; only a preview is loaded
+            pd = lazy_import('pandas')
+            st.warning(f"{verb} {summary['rows_imported']:,} rows; {summary['rows_rejected']:,} rows were rejected.")
+            errors = pd.read_csv(summary['error_report'], nrows=IMPORT_ERROR_PREVIEW_ROWS)
+            st.dataframe(errors, use_container_width=True)
+            with open(summary['error_report'], 'rb') as f:
+                st.download_button("Download error report", f.read(), file_name="import_errors.csv", mime="text/csv")
+        else:
+            st.success(f"{verb} {summary['rows_imported']:,} rows.")
+    st.button("Dismiss", key="dismiss_import", on_click=dismiss_import)
+
+def save_settings_form():
+    """Settings form submit callback"""
+    new_settings = {
+        'language': st.session_state['settings_language'],
+        'theme': st.session_state['settings_theme'],
+        'offline_mode': st.session_state['settings_offline_mode']
     }
     
-    button[kind="primary"]:hover {
-        background: linear-gradient(135deg, #2563eb 0%, #1d4ed8 100%) !important;
+    if save_app_settings(new_settings):
+        # Update session state to immediately apply language change
+        st.session_state['app_language'] = new_settings['language']
+        st.session_state['settings_flash'] = 'saved'
+    else:
+        st.session_state['settings_flash'] = 'failed'
+
+def reset_application():
+    """Reset button callback: clear the session and restore default settings"""
+    # Reset session state
+    for key in list(st.session_state.keys()):
+        del st.session_state[key]
+    
+    # Reset to default settings
+    default_settings = {
+        'language': 'English',
+        'theme': 'Modern', 
+        'offline_mode': False
     }
-    </style>
-    """, unsafe_allow_html=True)
+    save_app_settings(default_settings)
+
+@timed()
+def render_settings():
+    """Render the settings page"""
+    # Get language from session state first, then settings
+    language = st.session_state.get('app_language')
+    if language is None:
+        settings = load_app_settings()
+        language = settings.get('language', 'English')
+        st.session_state['app_language'] = language
+    else:
+        settings = load_app_settings()
+    
+    # Higher-contrast form styling, linked only on this page
+    st.markdown(stylesheet_tag(settings.get('theme', 'Modern'), 'settings'), unsafe_allow_html=True)
     
     st.markdown(f"""
     <div class="main-header">
@@ -585,7 +925,8 @@ def render_settings():
             get_text('language', language),
             ['English', 'Somali', 'Arabic'],
             index=['English', 'Somali', 'Arabic'].index(language),
-            label_visibility="collapsed"
+            label_visibility="collapsed",
+            key="settings_language"
         )
         
         st.markdown(f"### {get_text('theme', language)}")
@@ -593,13 +934,15 @@ def render_settings():
             get_text('theme', language),
             ['Modern', 'Classic', 'Dark'],
             index=['Modern', 'Classic', 'Dark'].index(settings.get('theme', 'Modern')),
-            label_visibility="collapsed"
+            label_visibility="collapsed",
+            key="settings_theme"
         )
         
         st.markdown(f"### {get_text('offline_mode', language)}")
-        offline_mode = st.checkbox(
+        st.checkbox(
             get_text('offline_mode', language),
-            value=settings.get('offline_mode', False)
+            value=settings.get('offline_mode', False),
+            key="settings_offline_mode"
         )
         
         # Show current settings preview
@@ -616,45 +959,219 @@ def render_settings():
             else:
                 st.info("Language: English - This application works for student learning assessment")
     
+        
+        # Widget changes inside the form do not rerun the script; saving runs
+        # in a callback so the page re-renders once, already in the new language
+        st.form_submit_button(get_text('save_settings', language), type="primary", on_click=save_settings_form)
+    
+    flash = st.session_state.pop('settings_flash', None)
+    if flash == 'saved':
+        st.success("Settings saved successfully!")
+    elif flash == 'failed':
+        st.error("Failed to save settings.")
+    
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        if st.button(get_text('save_settings', language), type="primary"):
-            new_settings = {
-                'language': new_language,
-                'theme': new_theme,
-                'offline_mode': offline_mode
-            }
-            
-            if save_app_settings(new_settings):
-                # Update session state to immediately apply language change
-                st.session_state['app_language'] = new_language
-                st.success("Settings saved successfully!")
-                st.rerun()
-            else:
-                st.error("Failed to save settings.")
+        st.button(get_text('reset_app', language), type="secondary", on_click=reset_application)
     
     with col2:
-        if st.button(get_text('reset_app', language), type="secondary"):
-            # Reset session state
-            for key in list(st.session_state.keys()):
-                del st.session_state[key]
-            
-            # Reset to default settings
-            default_settings = {
-                'language': 'English',
-                'theme': 'Modern', 
-                'offline_mode': False
-            }
-            save_app_settings(default_settings)
-            
-            st.success("Application reset successfully!")
-            st.rerun()
+        st.button(get_text('rescore_all', language), key="rescore_all", on_click=rescore_all, args=(language,))
+    
+    render_model_versions(language)
+
+@st.fragment
+@timed()
+def render_model_versions(language):
+    """Risk model versions with promote, roll back and retrain controls"""
+    # A fragment that loads on demand: the registry and its table need numpy
+    # and pandas, which a plain visit to Settings should not import
+    record_execution('fragment:model_versions')
+    st.markdown(f"### {get_text('risk_model', language)}")
+    if not st.toggle(get_text('show_model_versions', language), key='settings_show_models'):
+        return
+    
+    pd = lazy_import('pandas')
+    registry = lazy_import('model_registry').get_registry()
+    registry.ensure()
+    active = registry.active_version
+    versions = registry.versions()
+    
+    table = pd.DataFrame([
+        {
+            get_text('model_version', language): meta['version'],
+            'Kind': meta['kind'],
+            'Parent': meta['parent'] or '',
+            'Trained labels': meta['trained_labels'],
+            'Held-out accuracy': '' if meta.get('accuracy') is None else f"{meta['accuracy']:.1%}",
+            'Previous accuracy': '' if meta.get('parent_accuracy') is None else f"{meta['parent_accuracy']:.1%}",
+            get_text('active_model', language): '✓' if meta['version'] == active else ''
+        }
+        for meta in reversed(versions)
+    ])
+    st.dataframe(table, use_container_width=True, hide_index=True)
+    pending = registry.pending_labels(lazy_import('assessment_store').get_store())
+    st.caption(f"{get_text('new_labels', language)}: {pending:,}")
+    
+    flash = st.session_state.pop('model_flash', None)
+    if flash == 'no_rollback':
+        st.warning("There is no earlier model version to roll back to.")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        numbers = [meta['version'] for meta in reversed(versions)]
+        st.selectbox(get_text('model_version', language), numbers, index=numbers.index(active), key="promote_version")
+        st.button(get_text('promote_model', language), key="promote_model", on_click=promote_model, args=(language,))
+    with col2:
+        st.button(get_text('rollback_model', language), key="rollback_model", on_click=rollback_model,
+                  args=(language,), disabled=len(registry.read()['history']) < 2)
+    with col3:
+        st.button(get_text('retrain_model', language), key="retrain_model", on_click=retrain_model,
+                  args=(language,), disabled=pending == 0)
 
+def render_diagnostics():
+    """Hidden diagnostics page (``?page=diagnostics``): latencies, reruns, caches, memory"""
+    pd = lazy_import('pandas')
+    data = snapshot()
+    
+    st.markdown("""
+    <div class="main-header">
+        <h1 class="page-title">Diagnostics</h1>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    st.markdown("### Latency by function")
+    timings = pd.DataFrame([
+        {
+            'Function': name,
+            'Calls': timing['count'],
+            'p50 (ms)': timing['p50_s'] * 1000,
+            'p95 (ms)': timing['p95_s'] * 1000,
+            'p99 (ms)': timing['p99_s'] * 1000,
+            'Max (ms)': timing['max_s'] * 1000,
+            'Total (s)': timing['total_s']
+        }
+        for name, timing in data['timings'].items()
+    ])
+    st.dataframe(timings.round(2), use_container_width=True, hide_index=True)
+    
+    st.markdown("### Caches and memory")
+    gauges = data['gauges']
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Settings cache hit rate", f"{gauges['settings_cache']['hit_rate']:.0%}")
+    with col2:
+        figure_stats = gauges.get('figure_cache')
+        st.metric("Chart cache hit rate", f"{figure_stats['hit_rate']:.0%}" if figure_stats else "–")
+    with col3:
+        st.metric("Memory (RSS)", f"{gauges['memory']['rss_bytes'] / 2**20:,.0f} MB")
+    with col4:
+        st.metric("Peak memory", f"{gauges['memory']['peak_rss_bytes'] / 2**20:,.0f} MB")
+    
+    dataset_stats = gauges.get('dataset_cache')
+    if dataset_stats:
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Dataset cache hit rate", f"{dataset_stats['hit_rate']:.0%}")
+        with col2:
+            st.metric(
+                "Dataset cache",
+                f"{dataset_stats['bytes'] / 2**20:,.1f} MB",
+                delta=f"of {dataset_stats['budget_bytes'] / 2**20:,.0f} MB budget",
+                delta_color="off"
+            )
+        with col3:
+            st.metric(
+                "Cached datasets", f"{dataset_stats['entries']:,}",
+                delta=f"+ {dataset_stats['pinned_bytes'] / 2**20:,.1f} MB of scope columns", delta_color="off"
+            )
+        with col4:
+            st.metric("Evictions", f"{dataset_stats['evictions'] + dataset_stats['stale']:,}")
+    
+    version_stats = gauges.get('data_version')
+    if version_stats:
+        st.caption(
+            f"Data version {version_stats['version']:,} · {version_stats['bumps']:,} changes written here · "
+            f"{version_stats['changes']:,} picked up from other processes in {version_stats['polls']:,} polls"
+        )
+    
+    st.markdown("### Reruns per session")
+    st.caption(f"This session: {st.session_state.get('session_id')}")
+    sessions = pd.DataFrame.from_dict(data['sessions'], orient='index').fillna(0).astype(int)
+    st.dataframe(sessions, use_container_width=True)
+    
+    with st.expander("Startup profile"):
+        st.code(format_report())
+    
+    with st.expander("Metrics export"):
+        text = metrics_text()
+        st.download_button("Download metrics", text, file_name="eduscan_metrics.txt", mime="text/plain")
+        st.code(text, language=None)
+
+def toggle_offline_mode():
+    """Footer button callback: flip and persist the offline flag, syncing on reconnect"""
+    settings = load_app_settings()
+    settings['offline_mode'] = not settings.get('offline_mode', False)
+    save_app_settings(settings)
+    if not settings['offline_mode']:
+        sync_offline_queue()
+
+def sync_offline_queue():
+    """Push assessments captured while offline to the central store, in the background"""
+    if lazy_import('offline_queue').queue_depth():
+        start_job('sync', lazy_import('jobs').sync_job, label="Offline sync", key='offline_sync')
+
+def rescore_all(language):
+    """Settings button callback: re-score every assessment in the background"""
+    start_job('rescore', lazy_import('jobs').rescore_job, label=get_text('rescore_all', language), key='rescore')
+
+def rescore_stale(language):
+    """Re-score, in the background, the assessments scored by another model version"""
+    start_job('rescore', lazy_import('jobs').rescore_job, stale_only=True,
+              label=get_text('rescore_all', language), key='rescore_stale')
+
+def promote_model(language):
+    """Promote button callback: activate the selected model version everywhere"""
+    lazy_import('model_registry').get_registry().promote(st.session_state['promote_version'])
+    rescore_stale(language)
+
+def rollback_model(language):
+    """Roll back button callback: re-activate the previously active model version"""
+    try:
+        lazy_import('model_registry').get_registry().rollback()
+    except ValueError:
+        st.session_state['model_flash'] = 'no_rollback'
+        return
+    rescore_stale(language)
+
+def retrain_model(language):
+    """Retrain button callback: train on every new teacher label, however few"""
+    start_job('retrain', lazy_import('jobs').retrain_job, min_labels=1,
+              label=get_text('retrain_model', language), key='retrain')
+
+def format_sync_status(depth, last):
+    """Queue depth and the last sync's throughput for the footer"""
+    text = f"Queued: {depth:,}"
+    if last is not None:
+        if last['error']:
+            text += " · last sync failed"
+        else:
+            text += (
+                f" · last sync {last['records']:,} rows in {last['seconds']:.1f}s "
+                f"({last['records_per_second']:,.0f} rows/s)"
+            )
+    return text
+
+@st.fragment
+@timed()
 def render_bottom_navigation():
     """Render bottom navigation with offline toggle and reset"""
+    # A fragment: the toggle below only re-runs this footer, not the page
+    record_execution('fragment:footer')
     settings = load_app_settings()
     offline_mode = settings.get('offline_mode', False)
+    offline_queue = lazy_import('offline_queue')
+    queue_depth = offline_queue.queue_depth()
     
     st.markdown("---")
     col1, col2, col3, col4 = st.columns(4)
@@ -665,16 +1182,21 @@ def render_bottom_navigation():
     with col2:
         status = "🟢 Online" if not offline_mode else "🟡 Offline"
         st.markdown(f"Status: {status}")
+        st.caption(format_sync_status(queue_depth, offline_queue.last_sync()))
     
     with col3:
-        if st.button("Toggle Offline Mode", type="primary"):
-            new_settings = settings.copy()
-            new_settings['offline_mode'] = not offline_mode
-            save_app_settings(new_settings)
-            st.rerun()
+        st.button("Toggle Offline Mode", type="primary", key="toggle_offline", on_click=toggle_offline_mode)
+    
+    with col4:
+        if not offline_mode and queue_depth:
+            st.button("Sync now", key="sync_offline_queue", on_click=sync_offline_queue)
 
+@timed()
 def main():
     """Main application function"""
+    record_execution('script')
+    start_metrics_server()
+    
     # Page configuration
     st.set_page_config(
         page_title="EduScan Somalia",
@@ -683,6 +1205,9 @@ def main():
         initial_sidebar_state="collapsed"
     )
     
+    # The data this run renders, read before anything is loaded
+    st.session_state['data_version'] = data_version()
+    
     # Initialize language in session state
     if 'app_language' not in st.session_state:
         settings = load_app_settings()
@@ -692,16 +1217,6 @@ def main():
     settings = load_app_settings()
     apply_theme(settings.get('theme', 'Modern'))
     
-    # Clean background without image
-    st.markdown("""
-    <style>
-    .stApp {
-        background: #f8fafc !important;
-        min-height: 100vh !important;
-    }
-    </style>
-    """, unsafe_allow_html=True)
-    
     # Render header
     render_app_header()
     
@@ -711,16 +1226,38 @@ def main():
     # Get current language
     language = st.session_state.get('app_language', 'English')
     
-    # Render current page content
+    # Re-runs the page once other sessions, jobs or processes change the data
+    render_data_watch()
+    
+    # Jobs started by this session are polled here while they run, whatever the page
+    if st.session_state.pop('jobs_flash', None) == 'full':
+        st.warning("Too many background jobs are waiting. Try again when one has finished.")
+    if session_active_jobs():
+        render_jobs(language)
+    
+    # Render current page content; diagnostics has no tab and is opened by URL
     current_page = st.session_state.get('current_page', 'dashboard')
+    if st.query_params.get('page') == 'diagnostics':
+        current_page = 'diagnostics'
     
     if current_page == 'dashboard':
         render_dashboard()
+    elif current_page == 'import':
+        render_import()
+    elif current_page == 'analytics':
+        render_analytics()
     elif current_page == 'settings':
         render_settings()
+    elif current_page == 'diagnostics':
+        render_diagnostics()
     
     # Render bottom navigation
     render_bottom_navigation()
+    
+    # Time to first render is recorded once per process
+    if mark_first_render() and PROFILE_ENABLED:
+        with st.expander("Startup profile", expanded=True):
+            st.code(format_report())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,181 @@
+"""Sort indexes and paginated queries over the assessment store
+
+For every sortable column a permutation of row numbers, plus the matching
+sorted keys, is kept in the ``index`` directory of each partition view's
+``state_root`` (see ``partitions.py``). New rows are merged into it with
+``searchsorted``/``insert`` instead of re-sorting the table, and rows that an
+append moved further down the view are renumbered in place, so jumping to
+page N is a slice of a memory-mapped array. Filtering is a single vectorized
+mask over the memory-mapped columns, and only the rows of the requested page
+are ever materialized.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from assessment_store import get_store
+from atomic_io import write_json_atomic
+from dataset_cache import cached
+from partitions import VIEW_STATE_CACHE_SIZE, segment_changes, shift_rows
+
+SORT_COLUMNS = ['assessment_date', 'grade', 'math', 'reading', 'science', 'risk_level']
+
+
+class SortIndex:
+    """Per-column row permutations kept sorted as the store grows"""
+
+    def __init__(self, root):
+        self.root = root
+        self.state_path = os.path.join(root, 'index.json')
+        self._lock = threading.Lock()
+        self._arrays = {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        except (OSError, ValueError):
+            self.state = {'columns': {}}
+
+    def _path(self, column, kind):
+        return os.path.join(self.root, f'{column}.{kind}.npy')
+
+    def _load(self, column):
+        arrays = self._arrays.get(column)
+        if arrays is None:
+            try:
+                arrays = (np.load(self._path(column, 'order'), mmap_mode='r'),
+                          np.load(self._path(column, 'keys'), mmap_mode='r'))
+            except (OSError, ValueError):
+                arrays = None
+            self._arrays[column] = arrays
+        return arrays
+
+    def _save(self, column, order, keys, segments, generation):
+        os.makedirs(self.root, exist_ok=True)
+        for kind, values in (('order', order), ('keys', keys)):
+            path = self._path(column, kind)
+            tmp_path = f'{path}.tmp.npy'
+            np.save(tmp_path, values)
+            os.replace(tmp_path, path)
+        self.state['columns'][column] = {
+            'watermark': sum(rows for _, rows in segments), 'generation': generation, 'segments': segments
+        }
+        write_json_atomic(self.state_path, self.state)
+        self._arrays[column] = (np.load(self._path(column, 'order'), mmap_mode='r'),
+                                np.load(self._path(column, 'keys'), mmap_mode='r'))
+
+    def order(self, column, store=None):
+        """Row numbers sorted ascending by ``column`` (ties in row order)"""
+        store = store or get_store()
+        with self._lock:
+            # Read under the lock and bounded by ``rows``: rows appended meanwhile
+            # must not be saved below the watermark and inserted again next time
+            segments = store.segments()
+            rows = sum(count for _, count in segments)
+            generation = store.generation(column)
+            info = self.state['columns'].get(column)
+            arrays = self._load(column) if info else None
+            changes = None
+            if arrays is not None and info['generation'] == generation and 'segments' in info:
+                if info['segments'] == segments:
+                    return arrays[0]
+                changes = segment_changes(info['segments'], segments)
+
+            values = store.column(column)[:rows]
+            if changes is None:
+                # First build, committed values were rewritten (re-score) or a partition was replaced
+                order = np.argsort(values, kind='stable').astype(np.int32)
+                keys = np.asarray(values)[order]
+            else:
+                old_ends, shifts, ranges = changes
+                order = shift_rows(arrays[0], old_ends, shifts)
+                new_rows = np.concatenate(
+                    [np.arange(start, stop, dtype=np.int32) for start, stop in ranges] or [np.empty(0, dtype=np.int32)]
+                )
+                new_keys = np.asarray(values)[new_rows]
+                # New rows may land before old ones, so ties are kept in row order
+                # by comparing (key, row) pairs rather than keys alone
+                packed = (np.asarray(arrays[1]).astype(np.int64) << 32) + order
+                new_packed = (new_keys.astype(np.int64) << 32) + new_rows
+                new_order = np.argsort(new_packed)
+                positions = np.searchsorted(packed, new_packed[new_order])
+                order = np.insert(order, positions, new_rows[new_order])
+                keys = np.insert(arrays[1], positions, new_keys[new_order])
+            self._save(column, order, keys, segments, generation)
+            return self._arrays[column][0]
+
+
+def _filter_mask(store, filters):
+    """Boolean row mask for the active filters, or None when nothing is filtered"""
+    mask = None
+
+    def narrow(condition):
+        nonlocal mask
+        mask = condition if mask is None else mask & condition
+
+    if filters.get('student_ids') is not None:
+        narrow(np.isin(store.column('student_id'), list(filters['student_ids'])))
+    if filters.get('grades'):
+        narrow(np.isin(store.column('grade'), list(filters['grades'])))
+    if filters.get('risk_levels'):
+        narrow(np.isin(store.column('risk_level'), list(filters['risk_levels'])))
+    if filters.get('date_from') is not None:
+        narrow(store.column('assessment_date') >= filters['date_from'])
+    if filters.get('date_to') is not None:
+        narrow(store.column('assessment_date') <= filters['date_to'])
+    return mask
+
+
+_indexes = OrderedDict()
+_view_lock = threading.Lock()
+
+
+def get_sort_index(store=None):
+    """Shared sort index of a store or partition view"""
+    store = store or get_store()
+    with _view_lock:
+        index = _indexes.get(store.state_root)
+        if index is None:
+            index = _indexes[store.state_root] = SortIndex(os.path.join(store.state_root, 'index'))
+        _indexes.move_to_end(store.state_root)
+        while len(_indexes) > VIEW_STATE_CACHE_SIZE:
+            _indexes.popitem(last=False)
+        return index
+
+
+def _filtered_order(store, filters, sort_column):
+    """Sorted row numbers that pass the filters, shared across sessions for quick page flips"""
+    key = (
+        'filtered_order', store.state_root, sort_column,
+        tuple(sorted((name, tuple(value) if isinstance(value, (list, tuple, set)) else value)
+                     for name, value in filters.items()))
+    )
+    version = (store.layout, store.rows, store.generation(sort_column), store.generation('risk_level'))
+
+    def build():
+        order = get_sort_index(store).order(sort_column, store)
+        mask = _filter_mask(store, filters)
+        return order if mask is None else order[mask[order]]
+
+    return cached(key, version, build)
+
+
+def query_page(filters=None, sort_column='assessment_date', descending=True, page=1, page_size=25, store=None):
+    """One page of assessments plus the total number of matching rows
+
+    ``filters`` may contain ``student_ids`` (e.g. name search results; an
+    empty list matches nothing), ``grades`` (integers), ``risk_levels`` (risk
+    codes) and ``date_from``/``date_to`` (day numbers, inclusive).
+    """
+    store = store or get_store()
+    order = _filtered_order(store, filters or {}, sort_column)
+    total = len(order)
+    start = (page - 1) * page_size
+    if descending:
+        stop = total - start
+        rows = order[max(stop - page_size, 0):max(stop, 0)][::-1]
+    else:
+        rows = order[start:start + page_size]
+    return store.take(rows), total
@@ -0,0 +1,647 @@
+"""Columnar, memory-mapped, append-only assessment store
+
+Every column lives in its own raw little-endian file under
+``data/assessments`` and is opened with ``numpy.memmap``, so sessions share
+the operating system page cache instead of each holding a copy of the data.
+Appends only ever write to the end of the column files; ``manifest.json`` is
+replaced atomically afterwards and is the single source of truth for how many
+rows are committed, so readers never observe a half-written append.
+
+The app itself keeps one such store per region, school and term; see
+``partitions.py``.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+
+import numpy as np
+
+from atomic_io import write_json_atomic
+from data_version import bump, data_version
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+DATA_DIR = os.environ.get('EDUSCAN_DATA_DIR', 'data')
+STORE_DIR = os.path.join(DATA_DIR, 'assessments')
+
+FORMAT_VERSION = 1
+
+SUBJECTS = ['math', 'reading', 'writing', 'science', 'social_studies']
+SUBJECT_LABELS = {
+    'math': 'Mathematics',
+    'reading': 'Reading',
+    'writing': 'Writing',
+    'science': 'Science',
+    'social_studies': 'Social Studies'
+}
+RISK_LEVELS = ['Low', 'Medium', 'High']
+MAX_GRADE = 12
+
+MISSING_SCORE = 255
+
+# Joins a name to its school in a student identity key, and starts the key
+# of a student known by the school's own student id
+KEY_SEPARATOR = '\x1f'
+NO_RISK = -1
+EPOCH = date(1970, 1, 1)
+
+COLUMNS = {
+    'student_id': '<i4',
+    'grade': '<i1',
+    'math': '<u1',
+    'reading': '<u1',
+    'writing': '<u1',
+    'science': '<u1',
+    'social_studies': '<u1',
+    'risk_level': '<i1',
+    'risk_label': '<i1',
+    'assessment_date': '<i4',
+    'model_version': '<i2'
+}
+
+# Fill values used when a column is added to a store that already has rows
+COLUMN_DEFAULTS = {
+    'risk_level': NO_RISK,
+    'risk_label': NO_RISK,
+    # Scored before model versions were recorded; stale for every version
+    'model_version': 0
+}
+
+# Receipts of recent appends kept per manifest (see ``AssessmentStore.append``)
+RECEIPTS_KEPT = 32
+
+SAMPLE_ASSESSMENTS = [
+    {'student_name': 'Ahmed Hassan', 'grade': 6, 'math': 85, 'reading': 78, 'science': 82,
+     'risk_level': 'Low', 'assessment_date': '2024-06-15'},
+    {'student_name': 'Fatima Ali', 'grade': 5, 'math': 92, 'reading': 89, 'science': 94,
+     'risk_level': 'Low', 'assessment_date': '2024-06-14'},
+    {'student_name': 'Omar Mohamed', 'grade': 7, 'math': 78, 'reading': 82, 'science': 76,
+     'risk_level': 'Medium', 'assessment_date': '2024-06-13'},
+    {'student_name': 'Sahra Abdi', 'grade': 6, 'math': 88, 'reading': 91, 'science': 89,
+     'risk_level': 'Low', 'assessment_date': '2024-06-12'},
+    {'student_name': 'Yusuf Ibrahim', 'grade': 5, 'math': 75, 'reading': 73, 'science': 78,
+     'risk_level': 'Medium', 'assessment_date': '2024-06-11'}
+]
+
+
+@contextmanager
+def _file_lock(path, thread_lock):
+    """Serialize writers within this process and, where supported, across processes"""
+    with thread_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'a+b') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def _open_column(path, dtype, length):
+    """Memory-map the first ``length`` values of a column file read-only"""
+    if length == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(length,))
+
+
+def _append_bytes(path, committed_bytes, data):
+    """Append ``data`` after discarding anything past the committed length"""
+    with open(path, 'ab') as f:
+        # A crashed append can leave an uncommitted tail behind; drop it first
+        f.truncate(committed_bytes)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def parse_grade(value):
+    """Turn 'Grade 6', '6' or 6 into the integer grade"""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    text = str(value).strip().lower()
+    if text.startswith('grade'):
+        text = text[len('grade'):].strip()
+    return int(float(text))
+
+
+def grade_label(grade):
+    """Display label for an integer grade"""
+    return f"Grade {int(grade)}"
+
+
+def date_to_days(value):
+    """Encode a date-like value (or an already encoded day number) as days since 1970-01-01"""
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, datetime):
+        value = value.date()
+    elif not isinstance(value, date):
+        value = date.fromisoformat(str(value)[:10])
+    return (value - EPOCH).days
+
+
+def encode_dates(values):
+    """Day numbers of a column of dates, ISO strings or day numbers"""
+    values = np.asarray(values)
+    if values.dtype.kind in 'iu':
+        return values.astype('<i4')
+    if values.dtype.kind == 'M':
+        return (values.astype('datetime64[D]') - np.datetime64(EPOCH, 'D')).astype('<i4')
+    return np.fromiter((date_to_days(d) for d in values), dtype='<i4', count=len(values))
+
+
+def encode_grades(values):
+    """Integer grades of a column of grade numbers or labels like 'Grade 6'"""
+    import pandas as pd
+
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(values.dtype.categories.dtype)
+    if values.dtype.kind in 'iu':
+        return values.to_numpy(dtype='<i1')
+    return np.fromiter((parse_grade(g) for g in values), dtype='<i1', count=len(values))
+
+
+def days_to_dates(days):
+    """Decode an array of day numbers to ``datetime64[D]``"""
+    return np.asarray(days, dtype='<i4').astype('datetime64[D]')
+
+
+def month_start_days(today=None):
+    """Day number of the first day of the month containing ``today``"""
+    today = today or date.today()
+    return date_to_days(today.replace(day=1))
+
+
+def student_keys(names, schools=None, refs=None):
+    """Registry identity of each student: the school's own student id when one
+    is given, otherwise the name within its school
+
+    Without schools or ids the name alone is the identity, as it was before
+    identities included the school.
+    """
+    schools = None if schools is None else list(schools)
+    refs = None if refs is None else list(refs)
+    keys = []
+    for i, name in enumerate(names):
+        ref = refs[i] if refs is not None else None
+        if ref is not None and ref == ref and str(ref).strip():
+            keys.append(KEY_SEPARATOR + str(ref).strip().casefold())
+        elif schools is not None:
+            keys.append(f'{name.casefold()}{KEY_SEPARATOR}{str(schools[i]).casefold()}')
+        else:
+            keys.append(name.casefold())
+    return keys
+
+
+class StudentRegistry:
+    """Append-only student name table with dense integer ids
+
+    Each student also has an identity key (see ``student_keys``) that decides
+    whether an imported row is a student already registered. Students
+    registered before keys were kept are known by their name alone.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, 'students.json')
+        self.names_path = os.path.join(root, 'student_names.bytes')
+        self.offsets_path = os.path.join(root, 'student_names.offsets')
+        self.keys_path = os.path.join(root, 'student_keys.bytes')
+        self.key_offsets_path = os.path.join(root, 'student_keys.offsets')
+        self.lock_path = os.path.join(root, '.students.lock')
+        self._write_lock = threading.Lock()
+        self._manifest_stat = None
+        self._manifest_version = None
+        self._manifest = {'count': 0, 'bytes': 0}
+        self._lookup = None
+        self._lookup_count = 0
+
+    def _read_manifest(self):
+        # Nothing was written anywhere since the last check
+        version = data_version('assessments')
+        if self._manifest_stat is not None and version == self._manifest_version:
+            return self._manifest
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return self._manifest
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key != self._manifest_stat:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self._manifest = json.load(f)
+            self._manifest_stat = key
+        self._manifest_version = version
+        return self._manifest
+
+    @property
+    def count(self):
+        return self._read_manifest()['count']
+
+    def _offsets(self, count):
+        return _open_column(self.offsets_path, '<i8', count + 1 if count else 0)
+
+    def names(self, student_ids):
+        """Decode the names of the given student ids"""
+        count = self.count
+        if count == 0:
+            return [''] * len(student_ids)
+        offsets = self._offsets(count)
+        blob = _open_column(self.names_path, 'u1', int(offsets[-1]))
+        names = []
+        for student_id in np.asarray(student_ids, dtype=np.int64):
+            start, stop = offsets[student_id], offsets[student_id + 1]
+            names.append(bytes(blob[start:stop]).decode('utf-8'))
+        return names
+
+    def _keys(self, manifest):
+        """Identity key of every student, '' for those known by name alone"""
+        first = manifest.get('keys_from', manifest['count'])
+        keyed = manifest['count'] - first
+        keys = [''] * first
+        if keyed:
+            offsets = _open_column(self.key_offsets_path, '<i8', keyed + 1)
+            blob = bytes(_open_column(self.keys_path, 'u1', int(offsets[-1])))
+            keys.extend(blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(keyed))
+        return keys
+
+    def _ensure_lookup(self):
+        manifest = self._read_manifest()
+        count = manifest['count']
+        if self._lookup is None or self._lookup_count != count:
+            names = self.names(np.arange(count))
+            keys = self._keys(manifest)
+            self._lookup = {key or name.casefold(): i for i, (name, key) in enumerate(zip(names, keys))}
+            self._lookup_count = count
+
+    def resolve(self, names, keys=None):
+        """Return ids for ``names``, registering any that are new
+
+        ``keys`` are the students' identities from ``student_keys``; by
+        default the name alone. A student registered before identities
+        included the school still matches by name, unless the row carries a
+        student id. Takes the registry's own lock, so stores that share one
+        registry can append concurrently.
+        """
+        with _file_lock(self.lock_path, self._write_lock):
+            self._manifest_stat = None
+            return self._resolve(names, keys if keys is not None else student_keys(names))
+
+    def _resolve(self, names, keys):
+        self._ensure_lookup()
+        manifest = dict(self._read_manifest())
+        ids = np.empty(len(names), dtype='<i4')
+        new_names, new_keys = [], []
+        for i, (name, key) in enumerate(zip(names, keys)):
+            student_id = self._lookup.get(key)
+            if student_id is None and not key.startswith(KEY_SEPARATOR):
+                student_id = self._lookup.get(name.casefold())
+            if student_id is None:
+                student_id = manifest['count'] + len(new_names)
+                self._lookup[key] = student_id
+                new_names.append(name)
+                new_keys.append(key)
+            ids[i] = student_id
+        if new_names:
+            manifest = self._append_names(manifest, new_names, new_keys)
+            self._lookup_count = manifest['count']
+        return ids
+
+    def register(self, names):
+        """Append names that are known to be new and return their ids
+
+        Skips the case-insensitive lookup ``resolve`` keeps in memory, so bulk
+        loaders of unique names (e.g. ``synthetic_data``) need not hold one
+        entry per student. Registering a name twice gives it two ids.
+        """
+        with _file_lock(self.lock_path, self._write_lock):
+            self._manifest_stat = None
+            manifest = dict(self._read_manifest())
+            first = manifest['count']
+            if names:
+                self._append_names(manifest, names, [''] * len(names))
+            return np.arange(first, first + len(names), dtype='<i4')
+
+    def _append_names(self, manifest, new_names, new_keys):
+        if 'keys_from' not in manifest:
+            # Students registered so far are known by name alone
+            manifest['keys_from'], manifest['key_bytes'] = manifest['count'], 0
+        manifest['bytes'] = _append_strings(
+            self.names_path, self.offsets_path, manifest['count'], manifest['bytes'], new_names
+        )
+        manifest['key_bytes'] = _append_strings(
+            self.keys_path, self.key_offsets_path, manifest['count'] - manifest['keys_from'],
+            manifest['key_bytes'], new_keys
+        )
+        manifest['count'] += len(new_names)
+        write_json_atomic(self.manifest_path, manifest)
+        bump('assessments')
+        return manifest
+
+
+def _append_strings(path, offsets_path, count, committed_bytes, strings):
+    """Append strings to a bytes file and its offsets file; returns the new byte length"""
+    encoded = [string.encode('utf-8') for string in strings]
+    lengths = np.fromiter((len(b) for b in encoded), dtype='<i8', count=len(encoded))
+    offsets = committed_bytes + np.cumsum(lengths)
+    if count == 0:
+        offsets = np.concatenate([np.zeros(1, dtype='<i8'), offsets])
+        committed_offsets = 0
+    else:
+        committed_offsets = (count + 1) * 8
+    _append_bytes(path, committed_bytes, b''.join(encoded))
+    _append_bytes(offsets_path, committed_offsets, offsets.astype('<i8').tobytes())
+    return int(offsets[-1])
+
+
+class ColumnReader:
+    """Row-level reads shared by stores and partition views
+
+    Subclasses provide ``rows``, ``column(name)`` and ``students``.
+    """
+
+    # Changes when previously committed rows move to other row numbers, which
+    # incremental consumers must treat as a rebuild. A single store never
+    # moves rows.
+    layout = None
+
+    def take(self, row_indices):
+        """Materialize the given rows as a DataFrame in the compact schema of ``frame_schema``"""
+        import pandas as pd
+
+        import frame_schema
+
+        rows = np.asarray(row_indices, dtype=np.int64)
+        data = {
+            'student_name': frame_schema.name_column(self.column('student_id')[rows], self.students),
+            'grade': frame_schema.grade_column(self.column('grade')[rows])
+        }
+        for subject in SUBJECTS:
+            data[subject] = frame_schema.score_column(self.column(subject)[rows])
+        data['risk_level'] = frame_schema.risk_column(self.column('risk_level')[rows])
+        data['assessment_date'] = np.asarray(self.column('assessment_date')[rows], dtype=frame_schema.DATE_DTYPE)
+        data.update(self._row_groups(rows))
+        return pd.DataFrame(data)
+
+    def _row_groups(self, rows):
+        """Extra per-row columns a subclass knows, e.g. each row's school"""
+        return {}
+
+    def tail(self, limit):
+        """Most recently appended rows, newest first"""
+        rows = self.rows
+        return self.take(np.arange(rows - 1, max(rows - limit, 0) - 1, -1))
+
+    def risk_counts(self):
+        """Number of rows at each risk level, in ``RISK_LEVELS`` order"""
+        risk = self.column('risk_level')
+        counts = np.bincount(risk[risk >= 0], minlength=len(RISK_LEVELS))
+        return [int(c) for c in counts[:len(RISK_LEVELS)]]
+
+    def subject_means(self):
+        """Mean score per subject, skipping subjects nobody has been assessed in"""
+        means = {}
+        for subject in SUBJECTS:
+            scores = self.column(subject)
+            present = scores != MISSING_SCORE
+            total = int(np.count_nonzero(present))
+            if total:
+                means[subject] = float(scores[present].sum(dtype=np.int64)) / total
+        return means
+
+    def rows_since(self, day):
+        """Number of assessments dated on or after ``day``"""
+        return int(np.count_nonzero(self.column('assessment_date') >= day))
+
+
+class AssessmentStore(ColumnReader):
+    """Append-only columnar assessment table backed by memory-mapped files"""
+
+    def __init__(self, root=STORE_DIR, students=None):
+        self.root = root
+        # Aggregates, sort indexes and trends of this store live below here
+        self.state_root = root
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self.lock_path = os.path.join(root, '.lock')
+        self.students = students or StudentRegistry(root)
+        self._write_lock = threading.Lock()
+        self._manifest_stat = None
+        self._manifest_version = None
+        self._manifest = {'format': FORMAT_VERSION, 'rows': 0, 'columns': dict(COLUMNS)}
+        self._columns = {}
+
+    def _column_path(self, name):
+        return os.path.join(self.root, f'{name}.col')
+
+    def _read_manifest(self):
+        # Nothing was written anywhere since the last check
+        version = data_version('assessments')
+        if self._manifest_stat is not None and version == self._manifest_version:
+            return self._manifest
+        try:
+            stat = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            return self._manifest
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key != self._manifest_stat:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self._manifest = json.load(f)
+            self._manifest_stat = key
+            self._columns = {}
+        self._manifest_version = version
+        return self._manifest
+
+    @property
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    @property
+    def rows(self):
+        return self._read_manifest()['rows']
+
+    def generation(self, name):
+        """How many times committed values of ``name`` have been rewritten"""
+        return self._read_manifest().get('generations', {}).get(name, 0)
+
+    def column(self, name):
+        """Read-only memory map of a committed column"""
+        manifest = self._read_manifest()
+        cached = self._columns.get(name)
+        if cached is None:
+            cached = _open_column(self._column_path(name), manifest['columns'][name], manifest['rows'])
+            self._columns[name] = cached
+        return cached
+
+    def _encode(self, records, scorer):
+        """Convert incoming records to one contiguous array per column"""
+        import pandas as pd
+
+        frame = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+        count = len(frame)
+        encoded = {}
+        if 'student_id' in frame:
+            encoded['student_id'] = frame['student_id'].to_numpy(dtype='<i4')
+        else:
+            names = [str(name).strip() for name in frame['student_name']]
+            keys = student_keys(
+                names, frame['school'] if 'school' in frame else None,
+                frame['student_ref'] if 'student_ref' in frame else None
+            )
+            encoded['student_id'] = self.students.resolve(names, keys)
+        encoded['grade'] = encode_grades(frame['grade'])
+        for subject in SUBJECTS:
+            if subject in frame:
+                scores = pd.to_numeric(frame[subject], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+                scores = np.where(np.isnan(scores), MISSING_SCORE, np.clip(np.round(scores), 0, 100))
+                encoded[subject] = scores.astype('<u1')
+            else:
+                encoded[subject] = np.full(count, MISSING_SCORE, dtype='<u1')
+        # A risk level supplied with the data is a teacher's label; the
+        # displayed risk level always comes from the scoring model
+        if 'risk_level' in frame and isinstance(frame['risk_level'].dtype, pd.CategoricalDtype) \
+                and list(frame['risk_level'].cat.categories) == RISK_LEVELS:
+            encoded['risk_label'] = frame['risk_level'].cat.codes.to_numpy(dtype='<i1')
+        elif 'risk_level' in frame:
+            codes = {level: i for i, level in enumerate(RISK_LEVELS)}
+            encoded['risk_label'] = np.fromiter(
+                (codes.get(level, NO_RISK) for level in frame['risk_level']), dtype='<i1', count=count
+            )
+        else:
+            encoded['risk_label'] = np.full(count, NO_RISK, dtype='<i1')
+        encoded['risk_level'] = np.full(count, NO_RISK, dtype='<i1')
+        encoded['model_version'] = np.zeros(count, dtype='<i2')
+        if scorer is not None:
+            scored = scorer(np.column_stack([encoded[subject] for subject in SUBJECTS]))
+            if isinstance(scored, tuple):
+                encoded['risk_level'], encoded['model_version'][:] = scored
+            else:
+                encoded['risk_level'] = scored
+        encoded['assessment_date'] = encode_dates(frame['assessment_date'])
+        return encoded, count
+
+    def _add_missing_columns(self, manifest):
+        """Backfill columns introduced after this store was created"""
+        missing = [name for name in COLUMNS if name not in manifest['columns']]
+        if not missing:
+            return manifest
+        manifest = dict(manifest, columns=dict(manifest['columns']))
+        for name in missing:
+            dtype = COLUMNS[name]
+            fill = np.full(manifest['rows'], COLUMN_DEFAULTS.get(name, 0), dtype=dtype)
+            _append_bytes(self._column_path(name), 0, fill.tobytes())
+            manifest['columns'][name] = dtype
+        write_json_atomic(self.manifest_path, manifest)
+        bump('assessments')
+        return manifest
+
+    def upgrade(self):
+        """Bring an older store up to the current column set"""
+        with _file_lock(self.lock_path, self._write_lock):
+            self._manifest_stat = None
+            self._add_missing_columns(self._read_manifest())
+
+    def append(self, records, scorer=None, receipt=None):
+        """Append assessments and return the ``(start, stop)`` row range they occupy
+
+        ``scorer`` maps the ``(n, len(SUBJECTS))`` score matrix to risk codes,
+        or to ``(codes, model_version)`` to record which model scored them.
+        A ``receipt`` is committed with the rows. An append with a receipt
+        this store already holds does nothing, so a caller that crashed
+        before recording its own commit can safely repeat it.
+        """
+        with _file_lock(self.lock_path, self._write_lock):
+            self._manifest_stat = None
+            manifest = self._add_missing_columns(self._read_manifest())
+            if receipt is not None and receipt in manifest.get('receipts', []):
+                return manifest['rows'], manifest['rows']
+            encoded, count = self._encode(records, scorer)
+            return self._append_encoded(manifest, encoded, count, receipt)
+
+    def append_columns(self, columns):
+        """Append already-encoded column arrays (one per ``COLUMNS`` entry) as-is"""
+        count = len(columns['student_id'])
+        with _file_lock(self.lock_path, self._write_lock):
+            self._manifest_stat = None
+            manifest = self._add_missing_columns(self._read_manifest())
+            return self._append_encoded(manifest, columns, count)
+
+    def _append_encoded(self, manifest, encoded, count, receipt=None):
+        start = manifest['rows']
+        if count == 0:
+            return start, start
+        for name, dtype in manifest['columns'].items():
+            itemsize = np.dtype(dtype).itemsize
+            _append_bytes(self._column_path(name), start * itemsize, encoded[name].astype(dtype).tobytes())
+        manifest['rows'] = start + count
+        if receipt is not None:
+            manifest['receipts'] = (manifest.get('receipts', []) + [receipt])[-RECEIPTS_KEPT:]
+        write_json_atomic(self.manifest_path, manifest)
+        bump('assessments')
+        return start, start + count
+
+    def write_column(self, name, start, values):
+        """Overwrite committed values of a derived column in place"""
+        values = np.asarray(values)
+        with _file_lock(self.lock_path, self._write_lock):
+            self._manifest_stat = None
+            manifest = self._read_manifest()
+            if start + len(values) > manifest['rows']:
+                raise IndexError(f"rows {start}-{start + len(values)} are not committed")
+            if len(values) == 0:
+                return
+            target = np.memmap(
+                self._column_path(name), dtype=manifest['columns'][name], mode='r+',
+                offset=start * np.dtype(manifest['columns'][name]).itemsize, shape=(len(values),)
+            )
+            target[:] = values
+            target.flush()
+            del target
+            # Let incremental consumers know that committed values changed
+            manifest = dict(manifest, generations=dict(manifest.get('generations', {})))
+            manifest['generations'][name] = manifest['generations'].get(name, 0) + 1
+            write_json_atomic(self.manifest_path, manifest)
+            bump('assessments')
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def seed_sample_data(store):
+    """Populate a brand-new store with the demo students"""
+    from risk_model import score_rows
+
+    # Oldest first, so the newest sample is the most recently appended row
+    store.append(SAMPLE_ASSESSMENTS[::-1], scorer=score_rows)
+
+
+def get_store():
+    """Process-wide partitioned assessment data, created and seeded on first use
+
+    A store in the older single-directory layout is moved into partitions
+    the first time it is opened.
+    """
+    from partitions import PartitionedStore, migrate_flat_store
+
+    global _store
+    with _store_lock:
+        if _store is None:
+            store = PartitionedStore(STORE_DIR)
+            flat = AssessmentStore(STORE_DIR, students=store.students)
+            if flat.exists:
+                flat.upgrade()
+                migrate_flat_store(flat, store)
+            elif not store.exists:
+                store.create()
+                seed_sample_data(store)
+            else:
+                store.upgrade()
+            _store = store
+        return _store
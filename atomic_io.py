@@ -0,0 +1,26 @@
+"""Crash-safe file replacement helpers shared by the data modules"""
+import json
+import os
+import tempfile
+
+
+def write_json_atomic(path, payload):
+    """Write JSON to a temp file and rename it over ``path``
+
+    Readers either see the previous file or the complete new one, never a
+    partially written file.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(payload, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,182 @@
+"""Throughput of the JSON API (``api_server.py``) against a local client
+
+Starts the API server in its own process on a synthetic dataset, then drives
+it from ``--clients`` threads for ``--seconds`` per case:
+
+* ``score``: ``POST /v1/score`` with ``batch`` random score rows per request
+* ``risk``: ``GET /v1/risk`` pages of ``batch`` students' latest assessments
+
+Every case runs over keep-alive connections and again with a new connection
+per request. Each case reports requests and rows per second, p50/p95 latency
+and mean response bytes, as JSON. Datasets are built once under
+``--data-root`` and shared with ``rerun_latency.py``::
+
+    python benchmarks/api_throughput.py --rows 1000000 --batches 1 100 1000 5000 --output api.json
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_FILE = os.path.join(REPO_DIR, 'api_server.py')
+
+DEFAULT_BATCHES = [1, 100, 1000, 5000]
+SCENARIOS = ['score', 'risk']
+SUBJECT_COUNT = 5
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/v1/health')
+            response = connection.getresponse()
+            health = json.loads(response.read())
+            connection.close()
+            if response.status == 200:
+                return health
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"API server did not start on port {port}")
+
+
+def _score_body(batch, seed):
+    rng = random.Random(seed)
+    rows = [[None if rng.random() < 0.05 else round(rng.gauss(72, 12)) for _ in range(SUBJECT_COUNT)]
+            for _ in range(batch)]
+    rows = [[None if v is None else min(max(v, 0), 100) for v in row] for row in rows]
+    return json.dumps({'scores': rows}, separators=(',', ':')).encode('utf-8')
+
+
+def _client(port, scenario, batch, keepalive, stop_at, results, seed):
+    """One client thread: send requests until ``stop_at``, recording latencies"""
+    body = _score_body(batch, seed) if scenario == 'score' else None
+    headers = {'Content-Type': 'application/json', 'Accept-Encoding': 'gzip'}
+    timings, sizes, offset = [], [], 0
+    connection = None
+    while time.perf_counter() < stop_at:
+        if connection is None:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        started = time.perf_counter()
+        if scenario == 'score':
+            connection.request('POST', '/v1/score', body=body, headers=headers)
+        else:
+            connection.request('GET', f'/v1/risk?limit={batch}&offset={offset}', headers=headers)
+            offset += batch
+        response = connection.getresponse()
+        data = response.read()
+        if response.status != 200:
+            raise RuntimeError(f"{scenario} returned {response.status}: {data[:200]!r}")
+        if scenario == 'risk' and len(data) < 200:
+            offset = 0
+        timings.append(time.perf_counter() - started)
+        sizes.append(len(data))
+        if not keepalive:
+            connection.close()
+            connection = None
+    if connection is not None:
+        connection.close()
+    results.append((timings, sizes))
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def run_case(port, scenario, batch, keepalive, clients, seconds):
+    results = []
+    started = time.perf_counter()
+    stop_at = started + seconds
+    threads = [threading.Thread(target=_client, args=(port, scenario, batch, keepalive, stop_at, results, i))
+               for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    timings = [t for timing, _ in results for t in timing]
+    sizes = [s for _, size in results for s in size]
+    return {
+        'scenario': scenario,
+        'batch': batch,
+        'keepalive': keepalive,
+        'clients': clients,
+        'requests': len(timings),
+        'requests_per_second': round(len(timings) / elapsed, 1),
+        'rows_per_second': round(len(timings) * batch / elapsed, 1),
+        'p50_ms': round(_percentile(timings, 0.50) * 1000, 2),
+        'p95_ms': round(_percentile(timings, 0.95) * 1000, 2),
+        'mean_response_bytes': int(statistics.fmean(sizes))
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the EduScan JSON API")
+    parser.add_argument('--rows', type=int, default=100000, help="assessments in the dataset the server reads")
+    parser.add_argument('--batches', type=int, nargs='+', default=DEFAULT_BATCHES, help="rows per request")
+    parser.add_argument('--scenarios', nargs='+', default=SCENARIOS, choices=SCENARIOS)
+    parser.add_argument('--clients', type=int, default=4, help="concurrent client threads")
+    parser.add_argument('--seconds', type=float, default=5, help="duration of each case")
+    parser.add_argument('--data-root', default=os.path.join(tempfile.gettempdir(), 'eduscan-bench'),
+                        help="where synthetic datasets are built and kept")
+    parser.add_argument('--output', help="write the JSON results to this file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    data_dir = os.path.join(args.data_root, str(args.rows))
+    env = dict(os.environ, EDUSCAN_DATA_DIR=data_dir)
+    subprocess.run([sys.executable, '-c', f'from rerun_latency import build_dataset; build_dataset({args.rows})'],
+                   cwd=os.path.dirname(os.path.abspath(__file__)), check=True,
+                   env=dict(env, PYTHONPATH=os.pathsep.join([REPO_DIR, env.get('PYTHONPATH', '')])))
+    port = _free_port()
+    server = subprocess.Popen([sys.executable, API_FILE, '--port', str(port)], cwd=REPO_DIR, env=env)
+    try:
+        health = _wait_ready(port, timeout=120)
+        results = []
+        for scenario in args.scenarios:
+            for batch in args.batches:
+                for keepalive in (True, False):
+                    result = run_case(port, scenario, batch, keepalive, args.clients, args.seconds)
+                    print(f"{scenario:<6} batch={batch:<5} keepalive={keepalive!s:<5} "
+                          f"{result['requests_per_second']:>9,.1f} req/s {result['rows_per_second']:>12,.0f} rows/s "
+                          f"p95={result['p95_ms']}ms", file=sys.stderr)
+                    results.append(result)
+    finally:
+        server.terminate()
+        server.wait()
+
+    report = {
+        'rows': health['rows'],
+        'students': health['students'],
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'cpus': os.cpu_count(),
+        'results': results
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
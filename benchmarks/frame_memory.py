@@ -0,0 +1,49 @@
+"""Memory footprint of materialized assessment rows, compact schema against the old layout
+
+Materializes every row of a synthetic store the way the table and reports
+do (``take``) and prints ``frame_schema.memory_report`` as JSON: per-column
+and total deep bytes of the compact frame, and of the same rows as label
+strings, Python ints and ISO dates. Datasets are built once under
+``--data-root`` and shared with ``rerun_latency.py``::
+
+    python benchmarks/frame_memory.py --rows 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare in-memory footprints of assessment frames")
+    parser.add_argument('--rows', type=int, default=1000000, help="assessments to materialize")
+    parser.add_argument('--data-root', default=os.path.join(tempfile.gettempdir(), 'eduscan-bench'),
+                        help="where synthetic datasets are built and kept")
+    args = parser.parse_args(argv)
+
+    # The data directory is read when the store module is imported
+    os.environ['EDUSCAN_DATA_DIR'] = os.path.join(args.data_root, str(args.rows))
+    sys.path.insert(0, REPO_DIR)
+    import numpy as np
+
+    from assessment_store import get_store
+    from frame_schema import memory_report
+    from rerun_latency import build_dataset
+
+    build_dataset(args.rows)
+    store = get_store()
+    started = time.perf_counter()
+    frame = store.take(np.arange(min(args.rows, store.rows)))
+    take_seconds = time.perf_counter() - started
+    report = dict(memory_report(frame), take_seconds=take_seconds)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
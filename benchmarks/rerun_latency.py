@@ -0,0 +1,244 @@
+"""Rerun-latency benchmarks for the EduScan app
+
+Drives ``app.py`` through Streamlit's headless ``AppTest`` harness and times
+the interactions users actually perform:
+
+* ``rerun``: a full ``main()`` rerun of the dashboard
+* ``switch_page``: alternating Dashboard/Settings clicks in ``render_navigation``
+* ``save_settings``: submitting the settings form
+* ``toggle_offline``: the footer's offline toggle
+
+Each scenario runs for every dataset size and every ``TRANSLATIONS`` language.
+It reports p50/p95 latency, peak RSS and the bytes of ForwardMsgs emitted per
+rerun. AppTest re-executes the whole script even for clicks inside a
+fragment, so ``toggle_offline`` is an upper bound on the footer's real cost.
+Every dataset size runs in its own process, because the data directory
+is read at import time. Synthetic datasets are generated by ``synthetic_data``
+once under ``--data-root`` and reused on later runs::
+
+    python benchmarks/rerun_latency.py --sizes 1000 100000 1000000 --output bench.json
+    python benchmarks/rerun_latency.py --sizes 1000 --compare bench.json
+
+``--compare`` exits non-zero when any p95 regressed by more than
+``--tolerance`` against an earlier result file.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_FILE = os.path.join(REPO_DIR, 'app.py')
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+LANGUAGES = ['English', 'Somali', 'Arabic']
+SCENARIOS = ['rerun', 'switch_page', 'save_settings', 'toggle_offline']
+
+STUDENTS_PER_ASSESSMENT = 0.05
+ROWS_PER_SCHOOL = 10000
+
+
+def build_dataset(rows, seed=0):
+    """Fill this process's data directory with ``rows`` synthetic assessments, unless it already has data"""
+    from assessment_store import STORE_DIR, get_store
+    from partitions import PartitionedStore
+    from synthetic_data import generate
+
+    if not PartitionedStore(STORE_DIR).exists:
+        generate(rows, students=max(int(rows * STUDENTS_PER_ASSESSMENT), 50), seed=seed,
+                 schools=min(max(rows // ROWS_PER_SCHOOL, 1), 100))
+    return get_store().rows
+
+
+def _install_byte_counter():
+    """Count the bytes of every ForwardMsg the script runner emits"""
+    from streamlit.runtime.scriptrunner import script_runner
+
+    counter = {'bytes': 0}
+    original = script_runner.ScriptRunner._enqueue_forward_msg
+
+    def counting_enqueue(self, msg):
+        counter['bytes'] += msg.ByteSize()
+        return original(self, msg)
+
+    script_runner.ScriptRunner._enqueue_forward_msg = counting_enqueue
+    return counter
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def _summarize(rows, language, scenario, timings, emitted):
+    return {
+        'rows': rows,
+        'language': language,
+        'scenario': scenario,
+        'runs': len(timings),
+        'p50_ms': round(_percentile(timings, 0.50) * 1000, 2),
+        'p95_ms': round(_percentile(timings, 0.95) * 1000, 2),
+        'mean_ms': round(statistics.fmean(timings) * 1000, 2),
+        'bytes_per_rerun': int(statistics.fmean(emitted)),
+        'peak_rss_mb': round(_peak_rss_mb(), 1)
+    }
+
+
+def run_scenarios(rows, repeat, warmup, timeout):
+    """Time every scenario in every language against the current data directory"""
+    from streamlit.testing.v1 import AppTest
+    from translations import get_text
+
+    counter = _install_byte_counter()
+    results = []
+
+    def timed(action):
+        counter['bytes'] = 0
+        started = time.perf_counter()
+        app = action()
+        elapsed = time.perf_counter() - started
+        if app.exception:
+            raise RuntimeError(f"app raised during benchmark: {app.exception[0].message}")
+        return elapsed, counter['bytes']
+
+    def save_button(app, language):
+        # Form submit buttons take no key in the pinned Streamlit; found by label
+        label = get_text('save_settings', language)
+        return next(button for button in app.button if button.label == label)
+
+    for language in LANGUAGES:
+        app = AppTest.from_file(APP_FILE, default_timeout=timeout)
+        app.session_state['app_language'] = language
+        first_s, first_bytes = timed(app.run)
+        results.append(_summarize(rows, language, 'first_run', [first_s], [first_bytes]))
+
+        pages = ['nav_settings', 'nav_dashboard']
+        actions = {
+            'rerun': lambda i: app.run(),
+            'switch_page': lambda i: app.button(key=pages[i % 2]).click().run(),
+            'save_settings': lambda i: save_button(app, language).click().run(),
+            'toggle_offline': lambda i: app.button(key='toggle_offline').click().run()
+        }
+        for scenario in SCENARIOS:
+            if scenario == 'save_settings':
+                app.button(key='nav_settings').click().run()
+            elif scenario != 'switch_page':
+                app.button(key='nav_dashboard').click().run()
+            timings, emitted = [], []
+            for i in range(warmup + repeat):
+                elapsed, sent = timed(lambda: actions[scenario](i))
+                if i >= warmup:
+                    timings.append(elapsed)
+                    emitted.append(sent)
+            results.append(_summarize(rows, language, scenario, timings, emitted))
+            # Leave the toggle where it started
+            if scenario == 'toggle_offline' and (warmup + repeat) % 2:
+                actions['toggle_offline'](0)
+    return results
+
+
+def worker(args):
+    """Benchmark one dataset size; runs with EDUSCAN_DATA_DIR already set"""
+    sys.path.insert(0, REPO_DIR)
+    started = time.perf_counter()
+    rows = build_dataset(args.rows)
+    build_s = time.perf_counter() - started
+    print(f"  dataset ready: {rows:,} rows ({build_s:.1f}s)", file=sys.stderr)
+    json.dump(run_scenarios(rows, args.repeat, args.warmup, args.timeout), sys.stdout)
+    return 0
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, tolerance):
+    """Print p95 changes against an earlier run; True when nothing regressed"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {
+            (r['rows'], r['language'], r['scenario']): r for r in json.load(f)['results']
+        }
+    ok = True
+    for result in results:
+        before = baseline.get((result['rows'], result['language'], result['scenario']))
+        if before is None or not before['p95_ms']:
+            continue
+        change = result['p95_ms'] / before['p95_ms'] - 1
+        flag = ''
+        if change > tolerance:
+            flag = '  REGRESSION'
+            ok = False
+        print(
+            f"{result['rows']:>9,} {result['language']:<8} {result['scenario']:<15} "
+            f"p95 {before['p95_ms']:8.1f} -> {result['p95_ms']:8.1f} ms ({change:+.0%}){flag}"
+        )
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark EduScan rerun latency with AppTest")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="assessment counts to test")
+    parser.add_argument('--repeat', type=int, default=20, help="timed runs per scenario")
+    parser.add_argument('--warmup', type=int, default=2, help="untimed runs per scenario")
+    parser.add_argument('--timeout', type=float, default=300, help="AppTest timeout per run, in seconds")
+    parser.add_argument('--data-root', default=os.path.join(tempfile.gettempdir(), 'eduscan-bench'),
+                        help="where synthetic datasets are built and kept")
+    parser.add_argument('--output', help="write the JSON results to this file (default: stdout)")
+    parser.add_argument('--compare', help="earlier JSON results to check for p95 regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed p95 slowdown for --compare")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--rows', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return worker(args)
+
+    results = []
+    for rows in args.sizes:
+        print(f"Benchmarking {rows:,} assessments", file=sys.stderr)
+        env = dict(os.environ, EDUSCAN_DATA_DIR=os.path.join(args.data_root, str(rows)))
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--worker', '--rows', str(rows),
+             '--repeat', str(args.repeat), '--warmup', str(args.warmup), '--timeout', str(args.timeout)],
+            cwd=REPO_DIR, env=env, stdout=subprocess.PIPE, check=True
+        ).stdout
+        results.extend(json.loads(output))
+
+    report = {
+        'commit': _git_commit(),
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'streamlit': __import__('streamlit').__version__,
+        'repeat': args.repeat,
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        return 0 if compare(results, args.compare, args.tolerance) else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
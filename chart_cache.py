@@ -0,0 +1,68 @@
+"""Process-wide LRU cache of built Plotly figures
+
+Streamlit re-runs the whole script on every click, so without this cache the
+dashboard charts (and every label translation inside them) would be rebuilt
+even when nothing they show has changed. Figures are keyed by chart name,
+language, theme and data version, shared by every session, and bounded by
+``EDUSCAN_CHART_CACHE_SIZE`` entries with least-recently-used eviction.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from instrumentation import register_collector
+
+DEFAULT_MAX_ENTRIES = 64
+
+
+class FigureCache:
+    """Thread-safe, size-bounded LRU mapping of cache keys to figures"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get_or_build(self, key, build):
+        """Return the cached figure for ``key`` or build, store and return it"""
+        with self._lock:
+            figure = self._figures.get(key)
+            if figure is not None:
+                self._figures.move_to_end(key)
+                self.stats['hits'] += 1
+                return figure
+            self.stats['misses'] += 1
+        # Build outside the lock so one slow chart does not block the others
+        figure = build()
+        with self._lock:
+            self._figures[key] = figure
+            self._figures.move_to_end(key)
+            while len(self._figures) > self.max_entries:
+                self._figures.popitem(last=False)
+                self.stats['evictions'] += 1
+        return figure
+
+    def clear(self):
+        with self._lock:
+            self._figures.clear()
+
+    def __len__(self):
+        return len(self._figures)
+
+    def stats_snapshot(self):
+        """Counters plus the current size and hit rate"""
+        with self._lock:
+            stats = dict(self.stats, entries=len(self._figures), max_entries=self.max_entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+figure_cache = FigureCache(int(os.environ.get('EDUSCAN_CHART_CACHE_SIZE', DEFAULT_MAX_ENTRIES)))
+register_collector('figure_cache', figure_cache.stats_snapshot)
+
+
+def cached_figure(chart, language, theme, data_version, build):
+    """Shared figure for ``chart`` in the given language/theme/data version"""
+    return figure_cache.get_or_build((chart, language, theme, data_version), build)
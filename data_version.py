@@ -0,0 +1,150 @@
+"""Process-wide data versions, moved forward whenever data on disk changes
+
+Readers used to revalidate every cached file on every rerun: one ``os.stat``
+per partition manifest, the catalog and the settings file, for every click
+of every session. Now every writer stamps the kind of data it changed
+(``settings``, ``assessments``, ``models`` or ``offline``) by replacing a
+small file under ``data/.versions``. One watcher thread per process polls those stamps every
+``EDUSCAN_WATCH_INTERVAL_S`` seconds. When a stamp changes, that kind's
+version moves forward. Writes made in this process move it forward at once.
+
+Readers remember the version they last validated against and skip the
+filesystem while it is unchanged. Derived state keyed on row counts and
+generations is rebuilt only after a version move. Open sessions compare the
+version with the one they last rendered and re-run when it moves (see
+``render_data_watch`` in ``app.py``). Changes made by another process, such
+as the importer CLI or the sync server, therefore show up within one interval.
+"""
+import os
+import threading
+import time
+
+from instrumentation import register_collector
+
+DATA_DIR = os.environ.get('EDUSCAN_DATA_DIR', 'data')
+STAMP_DIR = os.path.join(DATA_DIR, '.versions')
+
+KINDS = ('settings', 'assessments', 'models', 'offline')
+
+WATCH_INTERVAL_S = float(os.environ.get('EDUSCAN_WATCH_INTERVAL_S', '1.0') or 1.0)
+
+
+class DataWatcher:
+    """Per-kind version counters driven by stamp files"""
+
+    def __init__(self, root=STAMP_DIR, interval=WATCH_INTERVAL_S):
+        self.root = root
+        self.interval = interval
+        self.versions = dict.fromkeys(KINDS, 0)
+        self._signatures = {}
+        self._watched = {kind: [self._stamp_path(kind)] for kind in KINDS}
+        self._changed = threading.Condition()
+        self._thread = None
+        self._bump_count = 0
+        self.stats = {'polls': 0, 'changes': 0, 'bumps': 0}
+
+    def _stamp_path(self, kind):
+        return os.path.join(self.root, kind)
+
+    def watch(self, kind, path):
+        """Also treat changes to ``path`` as changes to ``kind``, e.g. a hand-edited settings file"""
+        with self._changed:
+            if path not in self._watched[kind]:
+                self._watched[kind].append(path)
+                self._signatures[path] = _signature(path)
+
+    def _start(self):
+        with self._changed:
+            if self._thread is not None:
+                return
+            for paths in self._watched.values():
+                for path in paths:
+                    self._signatures[path] = _signature(path)
+            self._thread = threading.Thread(target=self._run, name='data-watcher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.poll()
+
+    def poll(self):
+        """Check every stamp once; returns the kinds that changed"""
+        changed = []
+        for kind, paths in list(self._watched.items()):
+            for path in list(paths):
+                signature = _signature(path)
+                if signature != self._signatures.get(path):
+                    self._signatures[path] = signature
+                    changed.append(kind)
+        self.stats['polls'] += 1
+        if changed:
+            self._advance(set(changed))
+            self.stats['changes'] += 1
+        return changed
+
+    def _advance(self, kinds):
+        with self._changed:
+            for kind in kinds:
+                self.versions[kind] += 1
+            self._changed.notify_all()
+
+    def bump(self, kind):
+        """Record a change of ``kind`` made by this process, for this and every other process"""
+        os.makedirs(self.root, exist_ok=True)
+        path = self._stamp_path(kind)
+        with self._changed:
+            self._bump_count += 1
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w', encoding='ascii') as f:
+                f.write(f'{time.time_ns()} {os.getpid()} {self._bump_count}\n')
+            # A new inode every time, so the change shows even within one mtime tick
+            os.replace(tmp_path, path)
+            # This process already knows; the watcher should not count it again
+            self._signatures[path] = _signature(path)
+            self.stats['bumps'] += 1
+        self._advance({kind})
+
+    def version(self, kind=None):
+        """Current version of one kind of data, or of all of it"""
+        if self._thread is None:
+            self._start()
+        if kind is None:
+            return sum(self.versions.values())
+        return self.versions[kind]
+
+    def wait(self, since, timeout=None):
+        """Block until the overall version differs from ``since``; returns the current version"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while self.version() == since:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+            return self.version()
+
+    def stats_snapshot(self):
+        return dict(self.stats, version=self.version(), **{f'{kind}_version': v for kind, v in self.versions.items()})
+
+
+def _signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+
+watcher = DataWatcher()
+register_collector('data_version', watcher.stats_snapshot)
+
+
+def data_version(kind=None):
+    """Process-wide version of ``kind`` (or all) data; moves forward whenever it changes"""
+    return watcher.version(kind)
+
+
+def bump(kind):
+    """Tell every process that ``kind`` data changed"""
+    watcher.bump(kind)
@@ -0,0 +1,191 @@
+"""Process-wide cache of derived datasets with a memory budget
+
+The assessment columns themselves are memory-mapped and already shared by
+every session through the page cache. What costs memory is what is derived
+from them: columns concatenated across the partitions of a view, filtered
+and sorted row orders, per-student trend tables, name search results. These
+are kept here once per process, whichever session asked first, instead of
+once per session.
+
+Every entry is stored with the data version it was built from (row counts,
+generations, layout), and a lookup with a different version rebuilds it.
+Entries are sized when they are stored. Once the total passes
+``EDUSCAN_DATASET_CACHE_MB`` the least recently used entries are evicted.
+Arrays that are views of memory-mapped files count as free, because the page
+cache holds them.
+
+A view's concatenated columns are the base every derived entry is built from,
+and one view's columns alone can be larger than the budget (about 150 MB at
+ten million rows). Evicting them would make every lookup a miss. They are
+pinned instead: kept outside the budget, per view, for the
+``EDUSCAN_DATASET_CACHE_VIEWS`` most recently used views.
+
+Concurrent requests for the same missing entry build it once; the others
+wait for that result.
+"""
+import mmap
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from instrumentation import register_collector
+
+DATASET_CACHE_MB = float(os.environ.get('EDUSCAN_DATASET_CACHE_MB', '128') or 128)
+DATASET_CACHE_VIEWS = int(os.environ.get('EDUSCAN_DATASET_CACHE_VIEWS', '4') or 4)
+
+_MISSING = object()
+
+
+def _array_bytes(values):
+    """Heap bytes an array holds; zero when it is a view of a memory-mapped file"""
+    base = values
+    while isinstance(base, np.ndarray):
+        if isinstance(base, np.memmap):
+            return 0
+        if base.base is None:
+            return values.nbytes
+        base = base.base
+    return 0 if isinstance(base, mmap.mmap) else values.nbytes
+
+
+def estimate_bytes(value):
+    """Approximate memory held by a cached value"""
+    if isinstance(value, np.ndarray):
+        return _array_bytes(value)
+    if hasattr(value, 'memory_usage'):
+        # pandas DataFrame or Series
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(k) + estimate_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_bytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class DatasetCache:
+    """Thread-safe, byte-budgeted LRU mapping of keys to versioned values
+
+    Entries stored with a ``pin`` group are kept outside the budget, for the
+    ``pinned_groups`` most recently used groups.
+    """
+
+    def __init__(self, budget_bytes, pinned_groups=DATASET_CACHE_VIEWS):
+        self.budget_bytes = int(budget_bytes)
+        self.bytes = 0
+        self.pinned_groups = max(int(pinned_groups), 1)
+        self.pinned_bytes = 0
+        self._entries = OrderedDict()
+        self._pinned = OrderedDict()
+        self._building = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'stale': 0, 'oversize': 0, 'pinned_evictions': 0}
+
+    def _lookup(self, key, version, pin=None):
+        entries = self._entries if pin is None else self._pinned.get(pin, {})
+        entry = entries.get(key)
+        if entry is None:
+            return _MISSING
+        if entry[0] != version:
+            # Built from older data; free it now rather than waiting for eviction
+            del entries[key]
+            if pin is None:
+                self.bytes -= entry[2]
+            else:
+                self.pinned_bytes -= entry[2]
+            self.stats['stale'] += 1
+            return _MISSING
+        if pin is None:
+            self._entries.move_to_end(key)
+        else:
+            self._pinned.move_to_end(pin)
+        return entry[1]
+
+    def _store_pinned(self, pin, key, version, value, size):
+        group = self._pinned.setdefault(pin, {})
+        old = group.pop(key, None)
+        if old is not None:
+            self.pinned_bytes -= old[2]
+        group[key] = (version, value, size)
+        self.pinned_bytes += size
+        self._pinned.move_to_end(pin)
+        while len(self._pinned) > self.pinned_groups:
+            _, evicted = self._pinned.popitem(last=False)
+            self.pinned_bytes -= sum(entry[2] for entry in evicted.values())
+            self.stats['pinned_evictions'] += 1
+
+    def _store(self, key, version, value, size):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.bytes -= old[2]
+        if size > self.budget_bytes:
+            self.stats['oversize'] += 1
+            return
+        self._entries[key] = (version, value, size)
+        self.bytes += size
+        while self.bytes > self.budget_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.bytes -= evicted
+            self.stats['evictions'] += 1
+
+    def get_or_build(self, key, version, build, size=None, pin=None):
+        """The value of ``key`` built from data ``version``, building it if needed
+
+        ``size`` overrides the estimated bytes of the built value. Values with
+        a ``pin`` group are kept outside the budget.
+        """
+        with self._lock:
+            value = self._lookup(key, version, pin)
+            if value is not _MISSING:
+                self.stats['hits'] += 1
+                return value
+            self.stats['misses'] += 1
+            building = self._building.setdefault(key, threading.Lock())
+        # Build outside the cache lock; sessions asking for the same entry wait here
+        with building:
+            with self._lock:
+                value = self._lookup(key, version, pin)
+            if value is _MISSING:
+                value = build()
+                entry_size = estimate_bytes(value) if size is None else size
+                with self._lock:
+                    if pin is None:
+                        self._store(key, version, value, entry_size)
+                    else:
+                        self._store_pinned(pin, key, version, value, entry_size)
+        with self._lock:
+            if self._building.get(key) is building:
+                del self._building[key]
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pinned.clear()
+            self.bytes = 0
+            self.pinned_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats_snapshot(self):
+        """Counters plus the current size, budget and hit rate"""
+        with self._lock:
+            stats = dict(self.stats, entries=len(self._entries), bytes=self.bytes, budget_bytes=self.budget_bytes,
+                         pinned_entries=sum(len(group) for group in self._pinned.values()),
+                         pinned_bytes=self.pinned_bytes)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+dataset_cache = DatasetCache(DATASET_CACHE_MB * 2**20)
+register_collector('dataset_cache', dataset_cache.stats_snapshot)
+
+
+def cached(key, version, build, size=None, pin=None):
+    """Shared value of ``key`` for data ``version``, built by ``build()`` when missing or stale"""
+    return dataset_cache.get_or_build(key, version, build, size, pin)
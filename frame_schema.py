@@ -0,0 +1,158 @@
+"""Compact in-memory schema of assessment rows, and their display labels
+
+Rows materialized as DataFrames use the same compact encoding as the store
+instead of Python strings and ints:
+
+    student_name, school, region   category
+    grade                          ordered category of the integers 1-12
+    math ... social_studies        nullable UInt8
+    risk_level                     ordered category of ``RISK_LEVELS``
+    assessment_date                int32 days since 1970-01-01
+
+Import batches are converted to it as soon as they are validated, and
+``take`` builds it straight from the store's columns. Text in the interface
+language is produced only at the render boundary by ``display_frame``. It
+relabels each categorical column's categories, so the cost depends on how
+many distinct grades or risk levels there are, not on how many rows.
+``memory_report`` compares this layout with the old one of strings, Python
+ints and ISO dates.
+"""
+import numpy as np
+import pandas as pd
+
+from assessment_store import EPOCH, MAX_GRADE, MISSING_SCORE, RISK_LEVELS, SUBJECTS
+from translations import RISK_LEVEL_KEYS, get_text
+
+GRADE_DTYPE = pd.CategoricalDtype(list(range(1, MAX_GRADE + 1)), ordered=True)
+RISK_DTYPE = pd.CategoricalDtype(RISK_LEVELS, ordered=True)
+SCORE_DTYPE = pd.UInt8Dtype()
+DATE_DTYPE = np.dtype('int32')
+
+# Shown for missing values once a frame is rendered
+MISSING_LABEL = '–'
+
+
+def grade_column(grades):
+    """Grade category of an integer grade array; out-of-range grades are missing"""
+    grades = np.asarray(grades, dtype=np.int16)
+    codes = np.where((grades >= 1) & (grades <= MAX_GRADE), grades - 1, -1).astype(np.int8)
+    return pd.Categorical.from_codes(codes, dtype=GRADE_DTYPE)
+
+
+def risk_column(codes):
+    """Risk category of an array of risk codes; ``NO_RISK`` is missing"""
+    return pd.Categorical.from_codes(np.asarray(codes, dtype=np.int8), dtype=RISK_DTYPE)
+
+
+def score_column(scores):
+    """Nullable UInt8 scores of a store score array; ``MISSING_SCORE`` is missing"""
+    scores = np.asarray(scores, dtype=np.uint8)
+    return pd.arrays.IntegerArray(scores, scores == MISSING_SCORE)
+
+
+def name_column(student_ids, students):
+    """Student name category, decoding each distinct student's name once"""
+    unique_ids, codes = np.unique(np.asarray(student_ids, dtype=np.int64), return_inverse=True)
+    # Names are unique in the registry (ignoring case), so they can be the categories
+    return pd.Categorical.from_codes(codes.astype(np.int32), categories=students.names(unique_ids))
+
+
+def group_column(names, row_groups):
+    """Category of per-row indexes into a list of names, e.g. each row's school"""
+    return pd.Categorical.from_codes(np.asarray(row_groups, dtype=np.int32), categories=names)
+
+
+def compact_records(records):
+    """Convert a validated import batch to the compact schema in place and return it
+
+    Expects integer grades, numeric scores (NaN when missing), dates, and
+    optional risk level, region and school strings.
+    """
+    records['grade'] = grade_column(records['grade'].to_numpy())
+    for subject in SUBJECTS:
+        if subject in records:
+            values = pd.to_numeric(records[subject], errors='coerce').round()
+            records[subject] = values.astype(SCORE_DTYPE)
+    dates = pd.to_datetime(records['assessment_date']).to_numpy().astype('datetime64[D]')
+    records['assessment_date'] = (dates - np.datetime64(EPOCH, 'D')).astype(DATE_DTYPE)
+    if 'risk_level' in records:
+        records['risk_level'] = pd.Categorical(records['risk_level'], dtype=RISK_DTYPE)
+    for column in ('region', 'school'):
+        if column in records:
+            records[column] = records[column].astype('category')
+    return records
+
+
+def date_strings(days):
+    """ISO date strings of an array of day numbers"""
+    return np.asarray(days, dtype=DATE_DTYPE).astype('datetime64[D]').astype(str)
+
+
+def _relabel(values, labels):
+    """Replace categories by display labels and fill missing values"""
+    categorical = pd.Categorical(values)
+    relabeled = pd.Categorical.from_codes(categorical.codes, categories=pd.Index(labels, dtype=object))
+    if (categorical.codes < 0).any():
+        relabeled = relabeled.add_categories([MISSING_LABEL]).fillna(MISSING_LABEL)
+    return relabeled
+
+
+def display_frame(frame, language, columns):
+    """Headers and values of ``columns`` of a compact frame in the interface language
+
+    ``columns`` maps frame columns to translation keys of their headers.
+    """
+    grade_text = get_text('grade', language)
+    risk_labels = [get_text(key, language) for key in RISK_LEVEL_KEYS]
+    data = {}
+    for column, header_key in columns.items():
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype) and values.dtype == GRADE_DTYPE:
+            values = _relabel(values, [f"{grade_text} {grade}" for grade in GRADE_DTYPE.categories])
+        elif isinstance(values.dtype, pd.CategoricalDtype) and values.dtype == RISK_DTYPE:
+            values = _relabel(values, risk_labels)
+        elif column == 'assessment_date':
+            values = date_strings(values)
+        data[get_text(header_key, language)] = values
+    return pd.DataFrame(data)
+
+
+def legacy_frame(frame):
+    """The same rows in the old layout: label strings, Python ints and ISO dates"""
+    legacy = {}
+    for column in frame:
+        values = frame[column]
+        if column == 'grade':
+            legacy[column] = [f"Grade {g}" if g == g else '' for g in values.astype(object)]
+        elif column == 'assessment_date':
+            legacy[column] = list(date_strings(values).astype(object))
+        elif column in SUBJECTS:
+            legacy[column] = pd.Series([None if v is pd.NA else int(v) for v in values], dtype=object)
+        else:
+            legacy[column] = values.astype(object).where(values.notna(), '').astype(str)
+    return pd.DataFrame(legacy)
+
+
+def frame_bytes(frame):
+    """Deep memory use of a frame, per column"""
+    return {column: int(size) for column, size in frame.memory_usage(deep=True, index=False).items()}
+
+
+def memory_report(frame):
+    """Footprint of a compact frame against the old layout, per column and in total"""
+    compact = frame_bytes(frame)
+    legacy = frame_bytes(legacy_frame(frame))
+    columns = {
+        column: {'legacy_bytes': legacy[column], 'compact_bytes': compact[column],
+                 'ratio': legacy[column] / compact[column] if compact[column] else None}
+        for column in compact
+    }
+    total_legacy, total_compact = sum(legacy.values()), sum(compact.values())
+    return {
+        'rows': len(frame),
+        'columns': columns,
+        'legacy_bytes': total_legacy,
+        'compact_bytes': total_compact,
+        'ratio': total_legacy / total_compact if total_compact else None
+    }
+
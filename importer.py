@@ -0,0 +1,302 @@
+"""Streaming roster/assessment import from CSV and Excel files
+
+Files are read in fixed-size chunks, validated column-wise, and appended to
+the assessment store batch by batch, so peak memory depends on the chunk
+size rather than on the size of the file. Rejected rows are streamed to a CSV
+error report as they are found.
+
+Usage::
+
+    python importer.py assessments.xlsx --error-report errors.csv
+"""
+import argparse
+import csv
+import os
+import sys
+from datetime import date
+
+from assessment_store import MAX_GRADE, SUBJECTS, get_store
+
+CHUNK_ROWS = 5000
+
+# Accepted spellings of each column header, after lower-casing and replacing
+# spaces and dashes with underscores
+COLUMN_ALIASES = {
+    'student_name': ['student_name', 'name', 'student', 'full_name'],
+    'student_ref': ['student_id', 'student_number', 'student_no', 'admission_number', 'admission_no'],
+    'grade': ['grade', 'class', 'grade_level'],
+    'math': ['math', 'math_score', 'maths', 'mathematics'],
+    'reading': ['reading', 'reading_score'],
+    'writing': ['writing', 'writing_score'],
+    'science': ['science', 'science_score'],
+    'social_studies': ['social_studies', 'social_studies_score'],
+    'risk_level': ['risk_level', 'risk'],
+    'assessment_date': ['assessment_date', 'date', 'assessed_on'],
+    'region': ['region', 'district'],
+    'school': ['school', 'school_name']
+}
+REQUIRED_COLUMNS = ['student_name', 'grade', 'assessment_date']
+
+# Accepted assessment date formats, tried in order: ISO, then day-first as
+# schools here write dates. Month-first dates are never guessed, so 03/04/2024
+# is 3 April. Excel date cells need no format.
+DATE_FORMATS = ['ISO8601', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y']
+
+ERROR_REPORT_FIELDS = ['row', 'column', 'value', 'error']
+
+
+class ImportFormatError(ValueError):
+    """The file cannot be imported at all (unknown type or missing columns)"""
+
+
+def _header_key(header):
+    return str(header).strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def map_columns(headers):
+    """Map file headers to store column names, ignoring unknown columns"""
+    lookup = {alias: column for column, aliases in COLUMN_ALIASES.items() for alias in aliases}
+    mapping = {}
+    for header in headers:
+        column = lookup.get(_header_key(header))
+        if column is not None and column not in mapping.values():
+            mapping[header] = column
+    missing = [column for column in REQUIRED_COLUMNS if column not in mapping.values()]
+    if missing:
+        raise ImportFormatError(f"missing required column(s): {', '.join(missing)}")
+    if not any(subject in mapping.values() for subject in SUBJECTS):
+        raise ImportFormatError("no subject score columns found")
+    return mapping
+
+
+def _read_csv_chunks(source, chunk_rows):
+    import pandas as pd
+
+    try:
+        reader = pd.read_csv(source, chunksize=chunk_rows, dtype=str, keep_default_na=False, skipinitialspace=True)
+    except pd.errors.EmptyDataError:
+        raise ImportFormatError("the file is empty") from None
+    for chunk in reader:
+        yield chunk
+
+
+def _read_excel_chunks(source, chunk_rows):
+    import pandas as pd
+
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError("Excel import requires the openpyxl package") from None
+
+    # Read-only mode streams rows from the sheet XML instead of building the
+    # whole workbook in memory
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        headers = next(rows, None)
+        if headers is None:
+            return
+        headers = ['' if h is None else str(h) for h in headers]
+        width = len(headers)
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(batch) == chunk_rows:
+                yield pd.DataFrame(batch, columns=headers)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=headers)
+    finally:
+        workbook.close()
+
+
+def read_chunks(source, filename=None, chunk_rows=CHUNK_ROWS):
+    """Yield DataFrame chunks from a CSV or XLSX path or file object"""
+    filename = filename or getattr(source, 'name', None) or str(source)
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        return _read_csv_chunks(source, chunk_rows)
+    if extension in ('.xlsx', '.xlsm'):
+        return _read_excel_chunks(source, chunk_rows)
+    raise ImportFormatError(f"unsupported file type '{extension}', expected .csv or .xlsx")
+
+
+def parse_dates(values, formats=DATE_FORMATS):
+    """Timestamps of a column of date cells; NaT where no format in ``formats`` matches"""
+    import pandas as pd
+
+    values = pd.Series(values)
+    # Excel date cells arrive as datetimes already
+    is_date = values.map(lambda value: isinstance(value, date)).astype(bool)
+    parsed = pd.to_datetime(values.where(is_date), errors='coerce')
+    text = values.where(~is_date, '').fillna('').astype(str).str.strip()
+    for date_format in formats:
+        missing = parsed.isna() & (text != '')
+        if not missing.any():
+            break
+        parsed[missing] = pd.to_datetime(text[missing], format=date_format, errors='coerce')
+    return parsed
+
+
+def validate_chunk(chunk, mapping, first_row, today=None, date_formats=DATE_FORMATS):
+    """Split a raw chunk into valid records and a list of row errors
+
+    A row with several problems gets one error entry per problem. ``first_row`` is the spreadsheet row number of the chunk's first data row,
+    so errors point at the row a teacher sees in Excel. Valid records come
+    back in the compact schema of ``frame_schema``. Dates are read with the
+    first of ``date_formats`` that fits each one.
+    """
+    import numpy as np
+    import pandas as pd
+
+    from frame_schema import compact_records
+
+    today = today or date.today()
+    frame = chunk[list(mapping)].rename(columns=mapping)
+    count = len(frame)
+    row_numbers = np.arange(first_row, first_row + count)
+    valid = np.ones(count, dtype=bool)
+    errors = []
+
+    def reject(mask, column, message):
+        mask = np.asarray(mask, dtype=bool)
+        values = frame[column].to_numpy() if column in frame else [''] * count
+        for i in np.flatnonzero(mask):
+            value = values[i]
+            errors.append((int(row_numbers[i]), column, '' if pd.isna(value) else value, message))
+        valid[mask] = False
+
+    names = frame['student_name'].fillna('').astype(str).str.strip()
+    reject(names == '', 'student_name', 'student name is required')
+
+    grades = pd.to_numeric(
+        frame['grade'].fillna('').astype(str).str.extract(r'(\d+)', expand=False), errors='coerce'
+    )
+    reject(grades.isna() | (grades < 1) | (grades > MAX_GRADE), 'grade', f'grade must be between 1 and {MAX_GRADE}')
+
+    scores = {}
+    has_score = np.zeros(count, dtype=bool)
+    for subject in SUBJECTS:
+        if subject not in frame:
+            continue
+        raw = frame[subject]
+        blank = raw.isna() | (raw.astype(str).str.strip() == '')
+        values = pd.to_numeric(raw.where(~blank), errors='coerce')
+        reject(~blank & (values.isna() | (values < 0) | (values > 100)), subject, 'score must be a number from 0 to 100')
+        scores[subject] = values
+        has_score |= values.notna().to_numpy()
+    reject(~has_score, 'subject_scores', 'at least one subject score is required')
+
+    dates = parse_dates(frame['assessment_date'], date_formats)
+    reject(dates.isna(), 'assessment_date', 'assessment date is not a valid date')
+    reject(dates > pd.Timestamp(today), 'assessment_date', 'assessment date is in the future')
+
+    records = pd.DataFrame({
+        'student_name': names[valid],
+        'grade': grades[valid].astype(int),
+        'assessment_date': dates[valid].dt.date
+    })
+    for subject, values in scores.items():
+        records[subject] = values[valid]
+    if 'risk_level' in frame:
+        records['risk_level'] = frame['risk_level'][valid].fillna('').astype(str).str.strip().str.capitalize()
+    # The school's own student id, when given, is the student's identity.
+    # Excel reads numeric ids as floats
+    if 'student_ref' in frame:
+        records['student_ref'] = (
+            frame['student_ref'][valid].fillna('').astype(str).str.strip().str.replace(r'\.0$', '', regex=True)
+        )
+    # Pick the partition; blanks fall back to the default region/school
+    for column in ('region', 'school'):
+        if column in frame:
+            records[column] = frame[column][valid].fillna('').astype(str).str.strip()
+    errors.sort(key=lambda error: error[0])
+    return compact_records(records), errors
+
+
+def import_file(source, filename=None, store=None, error_report=None, progress=None, chunk_rows=CHUNK_ROWS,
+                sink=None, date_formats=DATE_FORMATS):
+    """Stream a file into the assessment store and return a summary dict
+
+    ``error_report`` is an optional path or text file object that receives one
+    CSV line per rejected row. ``progress`` is called with the running
+    summary after every batch. ``sink`` receives each batch of valid records
+    instead of the store, e.g. ``offline_queue.enqueue`` while offline.
+    """
+    if sink is None:
+        from risk_model import score_rows
+
+        store = store or get_store()
+
+        def sink(records):
+            store.append(records, scorer=score_rows)
+
+    summary = {'rows_read': 0, 'rows_imported': 0, 'rows_rejected': 0, 'batches': 0}
+    report_file = None
+    writer = None
+    if error_report is not None:
+        if isinstance(error_report, (str, os.PathLike)):
+            report_file = open(error_report, 'w', encoding='utf-8', newline='')
+            writer = csv.writer(report_file)
+        else:
+            writer = csv.writer(error_report)
+        writer.writerow(ERROR_REPORT_FIELDS)
+
+    try:
+        mapping = None
+        next_row = 2  # row 1 is the header
+        for chunk in read_chunks(source, filename, chunk_rows):
+            if mapping is None:
+                mapping = map_columns(chunk.columns)
+            records, errors = validate_chunk(chunk, mapping, next_row, date_formats=date_formats)
+            next_row += len(chunk)
+            if len(records):
+                sink(records)
+            if writer is not None:
+                writer.writerows(errors)
+            summary['rows_read'] += len(chunk)
+            summary['rows_imported'] += len(records)
+            summary['rows_rejected'] += len(chunk) - len(records)
+            summary['batches'] += 1
+            if progress is not None:
+                progress(dict(summary))
+        if mapping is None:
+            raise ImportFormatError("the file has no header row")
+    finally:
+        if report_file is not None:
+            report_file.close()
+    return summary
+
+
+def main(argv=None):
+    """Headless entry point: ``python importer.py FILE``"""
+    parser = argparse.ArgumentParser(description="Import student assessments into EduScan Somalia")
+    parser.add_argument('path', help="CSV or XLSX file to import")
+    parser.add_argument('--error-report', help="write rejected rows to this CSV file")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="rows validated and stored per batch")
+    parser.add_argument('--date-format', action='append', dest='date_formats',
+                        help="accepted assessment date format, e.g. %m/%d/%Y (repeatable; "
+                             f"default: {', '.join(DATE_FORMATS)})".replace('%', '%%'))
+    args = parser.parse_args(argv)
+
+    def report(summary):
+        print(
+            f"\r{summary['rows_read']:,} read, {summary['rows_imported']:,} imported, "
+            f"{summary['rows_rejected']:,} rejected",
+            end='', file=sys.stderr, flush=True
+        )
+
+    try:
+        summary = import_file(args.path, error_report=args.error_report, progress=report, chunk_rows=args.chunk_rows,
+                              date_formats=args.date_formats or DATE_FORMATS)
+    except ImportFormatError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    print(file=sys.stderr)
+    return 0 if summary['rows_rejected'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+"""Process-wide latency histograms, counters and a plain-text metrics export
+
+Hot paths are wrapped with ``timed`` (a decorator) or ``timer`` (a context
+manager). Every call lands in a histogram shared by all sessions of this
+process. A histogram keeps cumulative buckets for the export and a window of
+recent samples for percentiles. Modules that keep their own counters, such as
+the settings and figure caches, register a collector, and the collector's
+values are read at export time.
+
+The hidden diagnostics page (``?page=diagnostics``) shows all of this. The
+same data is available as Prometheus-style text from ``metrics_text``. Setting
+``EDUSCAN_METRICS_PORT`` also serves that text at ``/metrics`` on
+localhost, so a local scraper can collect it.
+"""
+import functools
+import os
+import resource
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_PORT = int(os.environ.get('EDUSCAN_METRICS_PORT', '0') or 0)
+
+# Upper bounds, in seconds, of the exported histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Recent samples kept per histogram for percentiles
+RECENT_SAMPLES = 1024
+
+# Sessions whose rerun counts are kept; the least recently active drop out
+SESSIONS_KEPT = 256
+
+
+class Histogram:
+    """Latency distribution of one instrumented function"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.recent.append(seconds)
+
+    def percentile(self, fraction):
+        """Percentile of the recent samples, in seconds"""
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_collectors = {}
+_sessions = OrderedDict()
+_metrics_server = None
+
+
+def observe(name, seconds):
+    """Record one duration under ``name``"""
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.observe(seconds)
+
+
+@contextmanager
+def timer(name):
+    """Time the enclosed block into the ``name`` histogram"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+def timed(name=None):
+    """Decorator form of ``timer``; the histogram defaults to the function name"""
+    def decorate(func):
+        label = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(label, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+def count(name, amount=1):
+    """Increase the ``name`` counter"""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def record_session(session_id, scope):
+    """Count a script or fragment run for one session"""
+    with _lock:
+        counts = _sessions.pop(session_id, None) or {}
+        counts[scope] = counts.get(scope, 0) + 1
+        _sessions[session_id] = counts
+        while len(_sessions) > SESSIONS_KEPT:
+            _sessions.popitem(last=False)
+        _counters[f'executions.{scope}'] = _counters.get(f'executions.{scope}', 0) + 1
+
+
+def register_collector(name, collect):
+    """Report ``collect()`` (a dict of numbers) under ``name`` at export time"""
+    with _lock:
+        _collectors[name] = collect
+
+
+def memory_usage():
+    """Current and peak resident memory of this process, in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        current = peak
+    return {'rss_bytes': current, 'peak_rss_bytes': peak}
+
+
+def snapshot():
+    """Everything recorded so far, as plain data"""
+    with _lock:
+        timings = {
+            name: {
+                'count': h.count,
+                'total_s': h.total,
+                'p50_s': h.percentile(0.50),
+                'p95_s': h.percentile(0.95),
+                'p99_s': h.percentile(0.99),
+                'max_s': h.max,
+                'buckets': list(h.buckets)
+            }
+            for name, h in sorted(_histograms.items())
+        }
+        counters = dict(sorted(_counters.items()))
+        sessions = {session_id: dict(counts) for session_id, counts in _sessions.items()}
+        collectors = dict(_collectors)
+    gauges = {}
+    for name, collect in sorted(collectors.items()):
+        gauges[name] = {key: value for key, value in collect().items() if isinstance(value, (int, float))}
+    gauges['memory'] = memory_usage()
+    return {'timings': timings, 'counters': counters, 'sessions': sessions, 'gauges': gauges}
+
+
+def _metric_name(name):
+    return ''.join(c if c.isalnum() else '_' for c in name)
+
+
+def metrics_text():
+    """The snapshot in the Prometheus text exposition format"""
+    data = snapshot()
+    lines = [
+        '# HELP eduscan_function_seconds Latency of instrumented functions',
+        '# TYPE eduscan_function_seconds histogram'
+    ]
+    for name, timing in data['timings'].items():
+        cumulative = 0
+        for bound, hits in zip(BUCKETS + (float('inf'),), timing['buckets']):
+            cumulative += hits
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'eduscan_function_seconds_bucket{{function="{name}",le="{le}"}} {cumulative}')
+        lines.append(f'eduscan_function_seconds_sum{{function="{name}"}} {timing["total_s"]:.6f}')
+        lines.append(f'eduscan_function_seconds_count{{function="{name}"}} {timing["count"]}')
+    lines.append('# TYPE eduscan_events_total counter')
+    for name, value in data['counters'].items():
+        lines.append(f'eduscan_events_total{{event="{name}"}} {value}')
+    lines.append('# TYPE eduscan_sessions gauge')
+    lines.append(f'eduscan_sessions {len(data["sessions"])}')
+    for group, values in data['gauges'].items():
+        metric = f'eduscan_{_metric_name(group)}'
+        lines.append(f'# TYPE {metric} gauge')
+        for key, value in values.items():
+            lines.append(f'{metric}{{stat="{key}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serves ``metrics_text`` at ``GET /metrics``"""
+
+    def do_GET(self):
+        if self.path.rstrip('/') != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=METRICS_PORT, host='127.0.0.1'):
+    """Serve ``/metrics`` from a daemon thread, once per process; no-op without a port"""
+    global _metrics_server
+    with _lock:
+        if _metrics_server is not None or not port:
+            return _metrics_server or None
+        try:
+            _metrics_server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        except OSError:
+            # Another process already owns the port; don't retry on every rerun
+            _metrics_server = False
+            return None
+    threading.Thread(target=_metrics_server.serve_forever, name='metrics-server', daemon=True).start()
+    return _metrics_server
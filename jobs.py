@@ -0,0 +1,356 @@
+"""Process-wide background jobs with progress reporting and cancellation
+
+Long-running work (re-scoring the whole roster, large imports, offline sync,
+report exports) is submitted here instead of running in the Streamlit script
+thread, so the session that started it stays interactive. A small pool of
+worker threads takes jobs from a bounded queue. The pool and the queue are
+sized for a small Render instance by ``EDUSCAN_JOB_WORKERS`` and
+``EDUSCAN_JOB_QUEUE_SIZE``. Threads rather than processes keep the memory-mapped
+store, the student registry and the loaded model shared with the sessions.
+Jobs that need more CPU can start their own process pool.
+
+A job function receives its ``Job`` as the first argument and calls
+``job.update(progress, message)`` as it goes. Sessions poll ``get_job``.
+Cancelling is cooperative: the next ``update`` raises ``JobCancelled`` in the
+job's thread.
+"""
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+
+from instrumentation import count, observe, register_collector
+from startup_profile import lazy_import
+
+JOB_WORKERS = max(int(os.environ.get('EDUSCAN_JOB_WORKERS', '1') or 1), 1)
+JOB_QUEUE_SIZE = max(int(os.environ.get('EDUSCAN_JOB_QUEUE_SIZE', '8') or 8), 1)
+
+# Finished jobs remembered for sessions to pick up their results
+JOBS_KEPT = 50
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been asked to stop"""
+
+
+class JobQueueFull(RuntimeError):
+    """Too many jobs are already waiting; try again once some have finished"""
+
+
+class Job:
+    """One unit of background work and everything a session needs to show it"""
+
+    def __init__(self, kind, func, args, kwargs, label=None, key=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.label = label or kind
+        self.key = key
+        self.state = QUEUED
+        self.progress = 0.0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._cancel = threading.Event()
+        self._cleanups = []
+
+    @property
+    def done(self):
+        return self.state in FINISHED_STATES
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Ask the job to stop at its next progress update"""
+        self._cancel.set()
+
+    def update(self, progress=None, message=None):
+        """Report progress (0-1) and a status line; raises ``JobCancelled`` when cancelled"""
+        if self._cancel.is_set():
+            raise JobCancelled()
+        if progress is not None:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def add_cleanup(self, func):
+        """Run ``func()`` when the job is forgotten, e.g. to delete a temporary file"""
+        self._cleanups.append(func)
+
+    def _run(self):
+        if self._cancel.is_set():
+            self.state = CANCELLED
+            self.finished_at = time.time()
+            return
+        self.state = RUNNING
+        self.started_at = time.time()
+        try:
+            self.result = self._func(self, *self._args, **self._kwargs)
+            self.state = SUCCEEDED
+            self.progress = 1.0
+        except JobCancelled:
+            self.state = CANCELLED
+        except Exception as exc:
+            self.state = FAILED
+            self.error = str(exc) or exc.__class__.__name__
+            traceback.print_exc()
+        finally:
+            self.finished_at = time.time()
+            # Drop references to the arguments, e.g. an uploaded file's bytes
+            self._args, self._kwargs = (), {}
+        observe(f'job.{self.kind}', self.finished_at - self.started_at)
+        count(f'jobs.{self.state}')
+
+    def _forget(self):
+        for cleanup in self._cleanups:
+            try:
+                cleanup()
+            except OSError:
+                pass
+        self._cleanups = []
+
+    def snapshot(self):
+        """The job's current status as plain data"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'label': self.label,
+            'state': self.state,
+            'progress': self.progress,
+            'message': self.message,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class JobManager:
+    """Bounded queue of jobs served by a fixed number of worker threads"""
+
+    def __init__(self, workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE):
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._work, name=f'job-worker-{len(self._threads)}', daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job._run()
+            finally:
+                self._queue.task_done()
+
+    def submit(self, kind, func, *args, label=None, key=None, **kwargs):
+        """Queue ``func(job, *args, **kwargs)`` and return its ``Job``
+
+        Jobs with a ``key`` are not queued twice: while one with the same key
+        is still queued or running, that job is returned instead.
+        """
+        with self._lock:
+            if key is not None:
+                for job in self._jobs.values():
+                    if job.key == key and not job.done:
+                        return job
+            job = Job(kind, func, args, kwargs, label=label, key=key)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise JobQueueFull(f"{self._queue.maxsize} jobs are already waiting") from None
+            self._jobs[job.id] = job
+            self._evict()
+            self._start_workers()
+        count('jobs.submitted')
+        return job
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(len(finished) - JOBS_KEPT, 0)]:
+            self._jobs.pop(job_id)._forget()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def forget(self, job_id):
+        """Drop a finished job and run its cleanups"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or not job.done:
+                return False
+            del self._jobs[job_id]
+        job._forget()
+        return True
+
+    def stats(self):
+        """Worker, queue and job-state counts"""
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+        return {
+            'workers': self.workers,
+            'queue_size': self._queue.maxsize,
+            'queued': states.count(QUEUED),
+            'running': states.count(RUNNING),
+            'succeeded': states.count(SUCCEEDED),
+            'failed': states.count(FAILED),
+            'cancelled': states.count(CANCELLED)
+        }
+
+
+job_manager = JobManager()
+register_collector('jobs', job_manager.stats)
+
+
+def submit(kind, func, *args, label=None, key=None, **kwargs):
+    """Queue a job on the process-wide manager"""
+    return job_manager.submit(kind, func, *args, label=label, key=key, **kwargs)
+
+
+def get_job(job_id):
+    return job_manager.get(job_id)
+
+
+def cancel_job(job_id):
+    return job_manager.cancel(job_id)
+
+
+def forget_job(job_id):
+    return job_manager.forget(job_id)
+
+
+# Ready-made jobs for the app
+
+def rescore_job(job, store=None, stale_only=False):
+    """Re-score every assessment, or only those scored by another model version, with the active model"""
+    rescore_store = lazy_import('risk_model').rescore_store
+
+    store = store or lazy_import('assessment_store').get_store()
+    total = store.rows
+
+    def progress(done):
+        job.update(done / total if total else 1.0, f"{done:,} of {total:,} assessments checked")
+
+    return {'rows': rescore_store(store, 0, total, progress=progress, stale_only=stale_only)}
+
+
+def retrain_job(job, store=None, min_labels=None):
+    """Continue training the risk model on new teacher labels, then re-score stale rows if it was promoted"""
+    model_registry = lazy_import('model_registry')
+    rescore_store = lazy_import('risk_model').rescore_store
+
+    store = store or lazy_import('assessment_store').get_store()
+    min_labels = model_registry.RETRAIN_MIN_LABELS if min_labels is None else min_labels
+    meta = model_registry.get_registry().retrain(
+        store, min_labels=min_labels, progress=lambda fraction: job.update(fraction / 2, "Training")
+    )
+    if meta is None:
+        return {'version': None, 'promoted': False, 'rows': 0}
+    rows = 0
+    if meta['promoted']:
+        total = store.rows
+
+        def progress(done):
+            job.update(0.5 + done / total / 2 if total else 1.0, f"{done:,} of {total:,} assessments checked")
+
+        rows = rescore_store(store, progress=progress, stale_only=True)
+    return dict(meta, rows=rows)
+
+
+def import_job(job, path, filename, offline=False):
+    """Import an uploaded file saved at ``path``; the error report goes next to it"""
+    # Imported through lazy_import, which keeps them from racing a session's imports
+    importer = lazy_import('importer')
+    sink = lazy_import('offline_queue').enqueue if offline else None
+    report_path = f'{path}.errors.csv'
+    job.add_cleanup(lambda: os.unlink(report_path))
+    size = max(os.path.getsize(path), 1)
+    with open(path, 'rb') as source:
+        def progress(summary):
+            job.update(
+                source.tell() / size,
+                f"{summary['rows_read']:,} rows read · {summary['rows_imported']:,} imported · "
+                f"{summary['rows_rejected']:,} rejected"
+            )
+
+        try:
+            summary = importer.import_file(
+                source, filename=filename, error_report=report_path, progress=progress, sink=sink
+            )
+        finally:
+            os.unlink(path)
+    if not offline:
+        _retrain_if_due()
+    return dict(summary, offline=offline, error_report=report_path)
+
+
+def _retrain_if_due():
+    """Queue a retrain once enough new teacher labels have been imported"""
+    model_registry = lazy_import('model_registry')
+    store = lazy_import('assessment_store').get_store()
+    if model_registry.get_registry().pending_labels(store) >= model_registry.RETRAIN_MIN_LABELS:
+        try:
+            submit('retrain', retrain_job, label="Risk model retraining", key='retrain')
+        except JobQueueFull:
+            # The next import tries again
+            pass
+
+
+def sync_job(job):
+    """Push assessments captured while offline"""
+    offline_queue = lazy_import('offline_queue')
+    total = offline_queue.queue_depth()
+
+    def progress(stats):
+        job.update(stats['records'] / total if total else 1.0, f"{stats['records']:,} of {total:,} rows synced")
+
+    return offline_queue.sync(progress=progress)
+
+
+def report_job(job, store, formats, language):
+    """Generate student and class reports of a store or view into a zip file"""
+    reports = lazy_import('reports')
+    path = os.path.join(reports.REPORTS_DIR, f'{job.id}.zip')
+    job.add_cleanup(lambda: os.unlink(path))
+
+    def progress(done, total):
+        job.update(done / total if total else 1.0, f"{done:,} of {total:,} reports")
+
+    summary = reports.export_reports(path, store, formats, language, progress=progress)
+    return dict(summary, path=path)
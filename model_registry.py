@@ -0,0 +1,415 @@
+"""Versioned risk model artifacts, incremental retraining, promotion and rollback
+
+Every trained model is a numbered version under ``data/models/v0001``,
+``v0002`` and so on. For serving it is stored as plain arrays: the feature
+scaler and the linear classifier's weights. These are loaded memory-mapped,
+so scoring needs numpy only and every process shares one copy. The
+scikit-learn estimator is stored next to them only to continue training
+from.
+
+``registry.json`` lists the versions and names the active one. It is replaced
+atomically, and every process re-reads it once the ``models`` data version
+moves (see ``data_version``). Promoting or rolling back a version therefore
+takes effect in every process without a restart. Scored rows record the version that scored
+them in the store's ``model_version`` column. After a promotion only rows
+scored by another version need re-scoring; see
+``risk_model.rescore_store(stale_only=True)``.
+
+Retraining is incremental. The active version's classifier is updated with
+``partial_fit`` on teacher labels (the imported *Risk Level* column) that
+arrived since it was trained. Each version records, per partition, how many
+rows it has seen. One labelled row in five is held out. The candidate is
+promoted when it is at least as accurate as the active version on them, and
+only once ``MIN_HELD_OUT`` labels were held out; with fewer, it is kept for a
+manual promote.
+
+    python model_registry.py list
+    python model_registry.py retrain [--promote]
+    python model_registry.py promote 3
+    python model_registry.py rollback
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+import numpy as np
+
+from assessment_store import NO_RISK, RISK_LEVELS, SUBJECTS, _file_lock
+from atomic_io import write_json_atomic
+from data_version import bump, data_version
+from instrumentation import register_collector
+from risk_model import MODEL_DIR, MODEL_FILE, bootstrap_training_set, build_features
+from startup_profile import startup_phase
+
+REGISTRY_FORMAT = 1
+
+# New teacher labels needed before a retrain is worth it
+RETRAIN_MIN_LABELS = int(os.environ.get('EDUSCAN_RETRAIN_MIN_LABELS', '200') or 200)
+
+# Held-out labels needed before a candidate is promoted without being asked
+MIN_HELD_OUT = 30
+
+# Labelled rows read per step while retraining
+RETRAIN_CHUNK_ROWS = 262144
+
+SERVING_ARRAYS = ['scaler_mean', 'scaler_scale', 'coef', 'intercept', 'classes']
+
+
+def _holdout(rows):
+    """Deterministic one-in-five split of labelled rows for evaluation"""
+    return (np.asarray(rows, dtype=np.uint64) * np.uint64(2654435761) % np.uint64(5)) == 0
+
+
+class LinearRiskModel:
+    """A model version ready for scoring, backed by memory-mapped arrays"""
+
+    def __init__(self, version, path):
+        self.version = version
+        self.path = path
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in SERVING_ARRAYS}
+        self.scaler_mean = arrays['scaler_mean']
+        self.scaler_scale = arrays['scaler_scale']
+        self.coef = arrays['coef']
+        self.intercept = arrays['intercept']
+        self.classes = arrays['classes']
+
+    def decision_function(self, features):
+        scaled = (np.asarray(features, dtype=np.float32) - self.scaler_mean) / self.scaler_scale
+        return scaled @ self.coef.T + self.intercept
+
+    def predict(self, features):
+        """Risk code of every feature row"""
+        return np.asarray(self.classes)[np.argmax(self.decision_function(features), axis=1)].astype(np.int8)
+
+
+class ModelRegistry:
+    """The versions on disk and which one is active"""
+
+    def __init__(self, root=MODEL_DIR):
+        self.root = root
+        self.registry_path = os.path.join(root, 'registry.json')
+        self.lock_path = os.path.join(root, '.registry.lock')
+        self._write_lock = threading.Lock()
+        self._registry_stat = None
+        self._registry_version = None
+        self._registry = {'format': REGISTRY_FORMAT, 'active': None, 'history': [], 'versions': []}
+        self._models = {}
+        self._models_lock = threading.Lock()
+
+    def _version_path(self, version):
+        return os.path.join(self.root, f'v{version:04d}')
+
+    def read(self):
+        """The current registry; the same object until the file changes"""
+        version = data_version('models')
+        if self._registry_stat is not None and version == self._registry_version:
+            return self._registry
+        try:
+            stat = os.stat(self.registry_path)
+        except FileNotFoundError:
+            return self._registry
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key != self._registry_stat:
+            with open(self.registry_path, 'r', encoding='utf-8') as f:
+                self._registry = json.load(f)
+            self._registry_stat = key
+        self._registry_version = version
+        return self._registry
+
+    def _write(self, registry):
+        write_json_atomic(self.registry_path, registry)
+        bump('models')
+        self._registry, self._registry_stat = registry, None
+
+    def versions(self):
+        return list(self.read()['versions'])
+
+    def info(self, version):
+        for meta in self.read()['versions']:
+            if meta['version'] == version:
+                return meta
+        raise KeyError(f"model version {version} does not exist")
+
+    @property
+    def active_version(self):
+        return self.read()['active']
+
+    def ensure(self):
+        """Create version 1 from the legacy model file or the bootstrap set if the registry is empty"""
+        if self.read()['active'] is not None:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        with _file_lock(self.lock_path, self._write_lock), startup_phase('risk model'):
+            self._registry_stat = None
+            if self.read()['active'] is not None:
+                return
+            features, labels = bootstrap_training_set()
+            if os.path.exists(MODEL_FILE):
+                import joblib
+
+                # A scaler + logistic regression pipeline saved by earlier versions
+                pipeline = joblib.load(MODEL_FILE)
+                scaler, classifier = pipeline[0], pipeline[-1]
+                estimator, kind = None, 'imported'
+            else:
+                scaler, classifier = _fit_bootstrap(features, labels)
+                estimator, kind = classifier, 'bootstrap'
+            accuracy = float(np.mean(classifier.predict(scaler.transform(features)) == labels))
+            version = self._add_version(scaler, classifier, estimator, {
+                'kind': kind, 'parent': None, 'trained_labels': 0, 'watermarks': {},
+                'accuracy': None, 'bootstrap_accuracy': round(accuracy, 4)
+            })
+            self._promote(version)
+
+    def _add_version(self, scaler, classifier, estimator, meta):
+        """Write a new version's artifacts and list it (not promoted); call with the lock held"""
+        registry = self.read()
+        version = max([m['version'] for m in registry['versions']], default=0) + 1
+        path = self._version_path(version)
+        tmp_path = f'{path}.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        classes = np.asarray(classifier.classes_, dtype=np.int8)
+        coef = np.asarray(classifier.coef_, dtype=np.float32)
+        intercept = np.asarray(classifier.intercept_, dtype=np.float32)
+        arrays = {
+            'scaler_mean': np.asarray(scaler.mean_, dtype=np.float32),
+            'scaler_scale': np.asarray(scaler.scale_, dtype=np.float32),
+            'coef': coef,
+            'intercept': intercept,
+            'classes': classes
+        }
+        for name, values in arrays.items():
+            np.save(os.path.join(tmp_path, f'{name}.npy'), values)
+        if estimator is not None:
+            import joblib
+
+            joblib.dump({'scaler': scaler, 'classifier': estimator}, os.path.join(tmp_path, 'estimator.joblib'))
+        os.replace(tmp_path, path)
+        meta = dict(meta, version=version, created_at=time.time())
+        self._write(dict(registry, versions=registry['versions'] + [meta]))
+        return version
+
+    def _promote(self, version):
+        registry = self.read()
+        self.info(version)
+        history = [v for v in registry['history'] if v != version] + [version]
+        self._write(dict(registry, active=version, history=history))
+
+    def promote(self, version):
+        """Make ``version`` the active model in every process"""
+        with _file_lock(self.lock_path, self._write_lock):
+            self._registry_stat = None
+            self._promote(version)
+
+    def rollback(self):
+        """Re-activate the previously active version; returns it"""
+        with _file_lock(self.lock_path, self._write_lock):
+            self._registry_stat = None
+            registry = self.read()
+            history = list(registry['history'])
+            if len(history) < 2:
+                raise ValueError("there is no earlier model version to roll back to")
+            history.pop()
+            self._write(dict(registry, active=history[-1], history=history))
+            return history[-1]
+
+    def model(self, version=None):
+        """A loaded version, the active one by default; loaded once per process"""
+        if version is None:
+            self.ensure()
+            version = self.active_version
+        with self._models_lock:
+            model = self._models.get(version)
+            if model is None:
+                model = self._models[version] = LinearRiskModel(version, self._version_path(version))
+            return model
+
+    def _estimator(self, version):
+        """Scaler and a classifier that can continue training from ``version``"""
+        path = os.path.join(self._version_path(version), 'estimator.joblib')
+        if os.path.exists(path):
+            import joblib
+
+            saved = joblib.load(path)
+            return saved['scaler'], saved['classifier']
+        # An imported model has no SGD state; start one from its weights
+        model = self.model(version)
+        features, labels = bootstrap_training_set()
+        scaler = _scaler(model)
+        classifier = _new_classifier()
+        classifier.fit(scaler.transform(features), labels,
+                       coef_init=np.array(model.coef), intercept_init=np.array(model.intercept))
+        return scaler, classifier
+
+    def pending_labels(self, store, version=None):
+        """Teacher-labelled rows the given (default: active) version has not been trained on"""
+        version = version or self.active_version
+        watermarks = self.info(version)['watermarks'] if version else {}
+        total = 0
+        for entry, part in _partitions(store):
+            start = watermarks.get(entry['path'], 0)
+            total += int(np.count_nonzero(part.column('risk_label')[start:] != NO_RISK))
+        return total
+
+    def retrain(self, store=None, min_labels=RETRAIN_MIN_LABELS, promote=None, progress=None):
+        """Continue training the active version on new teacher labels
+
+        Returns the new version's metadata, or None when fewer than
+        ``min_labels`` new labels exist. ``promote=None`` promotes the new
+        version only when it is at least as accurate as the active one on at
+        least ``MIN_HELD_OUT`` held-out labels. ``progress`` is called with a 0-1 fraction.
+        """
+        from assessment_store import get_store
+
+        store = store or get_store()
+        self.ensure()
+        parent = self.active_version
+        parent_meta = self.info(parent)
+        if self.pending_labels(store, parent) < min_labels:
+            return None
+        scaler, classifier = self._estimator(parent)
+        classes = np.arange(len(RISK_LEVELS), dtype=np.int8)
+        watermarks = dict(parent_meta['watermarks'])
+        held_features, held_labels = [], []
+        trained = 0
+        parts = _partitions(store)
+        for number, (entry, part) in enumerate(parts):
+            rows = part.rows
+            for start in range(watermarks.get(entry['path'], 0), rows, RETRAIN_CHUNK_ROWS):
+                stop = min(start + RETRAIN_CHUNK_ROWS, rows)
+                labels = np.asarray(part.column('risk_label')[start:stop])
+                labelled = np.flatnonzero(labels != NO_RISK)
+                if not len(labelled):
+                    continue
+                scores = np.column_stack([part.column(subject)[start:stop][labelled] for subject in SUBJECTS])
+                features, scored = build_features(scores)
+                features, labels, labelled = features[scored], labels[labelled][scored], labelled[scored]
+                held = _holdout(labelled + start)
+                held_features.append(features[held])
+                held_labels.append(labels[held])
+                if np.any(~held):
+                    classifier.partial_fit(scaler.transform(features[~held]), labels[~held], classes=classes)
+                    trained += int(np.count_nonzero(~held))
+            watermarks[entry['path']] = rows
+            if progress is not None:
+                progress((number + 1) / len(parts))
+
+        held_features = np.concatenate(held_features) if held_features else np.empty((0, len(SUBJECTS) + 2))
+        held_labels = np.concatenate(held_labels) if held_labels else np.empty(0, dtype=np.int8)
+        accuracy = parent_accuracy = None
+        if len(held_labels):
+            accuracy = float(np.mean(classifier.predict(scaler.transform(held_features)) == held_labels))
+            parent_accuracy = float(np.mean(self.model(parent).predict(held_features) == held_labels))
+        with _file_lock(self.lock_path, self._write_lock):
+            self._registry_stat = None
+            version = self._add_version(scaler, classifier, classifier, {
+                'kind': 'incremental', 'parent': parent,
+                'trained_labels': parent_meta['trained_labels'] + trained,
+                'new_labels': trained, 'held_out': int(len(held_labels)), 'watermarks': watermarks,
+                'accuracy': None if accuracy is None else round(accuracy, 4),
+                'parent_accuracy': None if parent_accuracy is None else round(parent_accuracy, 4)
+            })
+            if promote is None:
+                # Too few held-out labels say nothing about the candidate; a person decides
+                promote = len(held_labels) >= MIN_HELD_OUT and accuracy >= parent_accuracy
+            if promote:
+                self._promote(version)
+        return dict(self.info(version), promoted=bool(promote))
+
+    def stats(self):
+        registry = self.read()
+        return {'active_version': registry['active'] or 0, 'versions': len(registry['versions'])}
+
+
+def _new_classifier():
+    from sklearn.linear_model import SGDClassifier
+
+    return SGDClassifier(loss='log_loss', alpha=1e-4, random_state=0)
+
+
+def _fit_bootstrap(features, labels):
+    from sklearn.preprocessing import StandardScaler
+
+    # The scaler is fitted once and then frozen, so every later version sees
+    # features on the same scale as the weights it continues from
+    scaler = StandardScaler().fit(features)
+    classifier = _new_classifier()
+    classifier.fit(scaler.transform(features), labels)
+    return scaler, classifier
+
+
+def _scaler(model):
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    scaler.mean_ = np.array(model.scaler_mean, dtype=np.float64)
+    scaler.scale_ = np.array(model.scaler_scale, dtype=np.float64)
+    scaler.var_ = scaler.scale_ ** 2
+    scaler.n_features_in_ = len(scaler.mean_)
+    scaler.n_samples_seen_ = 0
+    return scaler
+
+
+def _partitions(store):
+    """``(entry, store)`` of every partition of a store; a flat store is one partition"""
+    store = getattr(store, 'all', store)
+    if hasattr(store, 'partitions'):
+        return store.partitions()
+    return [({'path': '.'}, store)]
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Process-wide model registry"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+            register_collector('risk_model', _registry.stats)
+        return _registry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EduScan risk model versions")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('list', help="show every version and the active one")
+    retrain_parser = commands.add_parser('retrain', help="continue training on new teacher labels")
+    retrain_parser.add_argument('--min-labels', type=int, default=RETRAIN_MIN_LABELS)
+    retrain_parser.add_argument('--promote', action='store_true', default=None,
+                                help="promote even if it is less accurate on held-out labels")
+    promote_parser = commands.add_parser('promote', help="make a version active")
+    promote_parser.add_argument('version', type=int)
+    commands.add_parser('rollback', help="re-activate the previously active version")
+    args = parser.parse_args(argv)
+
+    registry = get_registry()
+    registry.ensure()
+    if args.command == 'retrain':
+        meta = registry.retrain(min_labels=args.min_labels, promote=args.promote)
+        print(json.dumps(meta, indent=2) if meta else f"Fewer than {args.min_labels} new labels; nothing to do.")
+    elif args.command == 'promote':
+        registry.promote(args.version)
+    elif args.command == 'rollback':
+        registry.rollback()
+    if args.command != 'retrain':
+        registry._registry_stat = None
+        print(json.dumps({'active': registry.active_version, 'versions': registry.versions()}, indent=2))
+    if args.command in ('promote', 'rollback') or (args.command == 'retrain' and meta and meta['promoted']):
+        from assessment_store import get_store
+        from risk_model import rescore_store
+
+        rows = rescore_store(get_store(), stale_only=True)
+        print(f"Re-scored {rows:,} rows scored by other versions.", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,452 @@
+"""Student name search tolerant of Somali spelling variants and Arabic script
+
+Each word of a name is reduced to a spelling-independent key:
+
+* Arabic script is transliterated letter by letter (محمد -> mhmd)
+* Somali orthography is folded onto the common English spellings: ``x`` is
+  ``h`` (Maxamed/Mohamed), ``c`` is dropped (Cabdi/Abdi), ``q`` is ``k``,
+  ``th`` is ``s`` as Somali pronounces it (Cismaan/Othman) and ``dh``/``gh``
+  lose their ``h``
+* vowels, ``w``, ``y`` and doubled letters are dropped, because they are
+  spelled differently from one school register to the next, and Arabic
+  script rarely writes them at all
+
+Students share a small vocabulary of keys (a few thousand given names), so
+fuzzy and prefix matching run over the vocabulary. Keys alone would tie
+different names with the same consonants (Mohamed and Mahmoud are both
+``mhmd``), so posting arrays map each spelling of a word with its long vowels
+kept (``mhmd`` and ``mhmwd``), and its
+position in the name, to the students whose name contains it. Matches are
+ranked by how close the spelling is and by whether the query's words start
+the name and follow each other in it. The index is kept under
+``data/assessments/search`` and remembers how many registry names it has seen
+(the watermark). Newly registered students are merged in with
+``searchsorted``/``insert`` instead of rebuilding it.
+"""
+import difflib
+import functools
+import json
+import os
+import re
+import threading
+import unicodedata
+
+import numpy as np
+
+from assessment_store import STORE_DIR, get_store
+from atomic_io import write_json_atomic
+from dataset_cache import cached
+from instrumentation import timed
+
+SEARCH_DIR = os.path.join(STORE_DIR, 'search')
+
+# Trigram similarity a vocabulary key needs to count as a fuzzy match
+MIN_KEY_SIMILARITY = 0.4
+
+# Similarity of a key that only starts with the word being typed
+PREFIX_SIMILARITY = 0.9
+
+# Mean per-word similarity a student needs to be returned
+MIN_SCORE = 0.5
+
+# Share of a word's similarity that depends on its spelling rather than its key
+SPELLING_WEIGHT = 0.3
+
+# Bonus for a name that starts with the query's first word and has the
+# query's words in the same order
+ORDER_WEIGHT = 0.2
+
+# Word positions followed for word order, one bit of a byte each
+ORDER_POSITIONS = 8
+
+# Candidates re-ranked by full spelling similarity per result requested
+RERANK_FACTOR = 2
+
+# Bumped when the index layout on disk changes
+INDEX_FORMAT = 2
+
+ARABIC_LETTERS = {
+    'ا': 'a', 'أ': 'a', 'إ': 'a', 'آ': 'a', 'ى': 'a', 'ة': 'a',
+    'ء': '', 'ئ': '', 'ؤ': '', 'ع': '', 'ـ': '',
+    'ب': 'b', 'ت': 't', 'ث': 's', 'ج': 'j', 'ح': 'h', 'خ': 'kh', 'د': 'd', 'ذ': 'd',
+    'ر': 'r', 'ز': 'z', 'س': 's', 'ش': 'sh', 'ص': 's', 'ض': 'd', 'ط': 't', 'ظ': 'z',
+    'غ': 'g', 'ف': 'f', 'ق': 'k', 'ك': 'k', 'ل': 'l', 'م': 'm', 'ن': 'n', 'ه': 'h',
+    'و': 'w', 'ي': 'y', 'پ': 'b', 'چ': 'j', 'ڤ': 'f', 'ک': 'k', 'گ': 'g', 'ی': 'y'
+}
+
+SOMALI_FOLDS = [
+    (re.compile(r'dh'), 'd'),
+    (re.compile(r'th'), 's'),
+    (re.compile(r'gh'), 'g'),
+    (re.compile(r'x'), 'h'),
+    (re.compile(r'c'), ''),
+    (re.compile(r'q'), 'k'),
+    (re.compile(r'([a-z])\1+'), r'\1')
+]
+
+VOWELS = re.compile(r'[aeiouwy]')
+
+# Spellings keep the long vowels Arabic script writes: i/y as y and u/w as w
+SPELLING_FOLDS = [
+    (re.compile(r'[aeo]'), ''),
+    (re.compile(r'i'), 'y'),
+    (re.compile(r'u'), 'w'),
+    (re.compile(r'([a-z])\1+'), r'\1')
+]
+
+# Trigram characters: padding space, a-z and 0-9
+GRAM_ALPHABET = {c: i for i, c in enumerate(' abcdefghijklmnopqrstuvwxyz0123456789')}
+GRAM_BASE = len(GRAM_ALPHABET)
+
+
+def normalize_name(name):
+    """Lower-case Latin spelling of a name with Somali variants folded, e.g. ``mahamed abdi``"""
+    return ' '.join(filter(None, (_normalize_word(word) for word in str(name).split())))
+
+
+@functools.lru_cache(maxsize=65536)
+def _normalize_word(word):
+    text = ''.join(ARABIC_LETTERS.get(c, c) for c in unicodedata.normalize('NFKD', word))
+    text = ''.join(c for c in text if not unicodedata.combining(c)).casefold()
+    text = re.sub(r'[^a-z0-9]+', ' ', text.replace("'", '').replace('’', ''))
+    for pattern, replacement in SOMALI_FOLDS:
+        text = pattern.sub(replacement, text)
+    return text.strip()
+
+
+# Names repeat the same few thousand given names, so keys are worked out once per word
+@functools.lru_cache(maxsize=65536)
+def _word_keys(word):
+    keys = []
+    for token in _normalize_word(word).split():
+        skeleton = re.sub(r'([a-z])\1+', r'\1', VOWELS.sub('', token))
+        # All-vowel names such as "Aw" keep their spelling
+        keys.append(skeleton or token)
+    return tuple(keys)
+
+
+def name_keys(name):
+    """Spelling-independent key of each word of a name, e.g. ``['mhmd', 'bd']``"""
+    return [key for word in str(name).split() for key in _word_keys(word)]
+
+
+@functools.lru_cache(maxsize=65536)
+def _word_spellings(word):
+    spellings = []
+    for token in _normalize_word(word).split():
+        spelling = token
+        for pattern, replacement in SPELLING_FOLDS:
+            spelling = pattern.sub(replacement, spelling)
+        spellings.append(spelling or token)
+    return tuple(zip(spellings, _word_keys(word)))
+
+
+def name_spellings(name):
+    """Spelling and key of each word of a name, e.g. ``[('mhmwd', 'mhmd'), ('ly', 'l')]``
+
+    The spelling keeps the long vowels that tell Mahmoud from Mohamed in
+    every script, so it decides between names that share a key.
+    """
+    return [pair for word in str(name).split() for pair in _word_spellings(word)]
+
+
+def _key_grams(key):
+    """Trigram codes of a space-padded key"""
+    padded = f' {key} '
+    return [
+        (GRAM_ALPHABET[padded[i]] * GRAM_BASE + GRAM_ALPHABET[padded[i + 1]]) * GRAM_BASE + GRAM_ALPHABET[padded[i + 2]]
+        for i in range(len(padded) - 2)
+    ]
+
+
+class NameIndex:
+    """Vocabulary and key postings over the student registry, updated incrementally"""
+
+    def __init__(self, students, root=SEARCH_DIR):
+        self.students = students
+        self.root = root
+        self.state_path = os.path.join(root, 'state.json')
+        self._lock = threading.Lock()
+        self._load()
+
+    def _empty(self):
+        self.watermark = 0
+        self.vocabulary = []
+        self.codes = {}
+        # Folded spellings of words and the key code of each
+        self.spellings = []
+        self.spelling_codes = {}
+        self.spelling_keys = np.empty(0, dtype=np.int32)
+        # (spelling code, student id, word position) sorted by code, ties in student id order
+        self.posting_codes = np.empty(0, dtype=np.int32)
+        self.posting_ids = np.empty(0, dtype=np.int32)
+        self.posting_positions = np.empty(0, dtype=np.int8)
+        self._index_vocabulary()
+
+    def _load(self):
+        self._empty()
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('format') != INDEX_FORMAT:
+                raise ValueError('index format changed')
+            postings = [
+                np.load(os.path.join(self.root, f'{name}.npy'))
+                for name in ('posting_codes', 'posting_ids', 'posting_positions')
+            ]
+        except (OSError, ValueError):
+            # A missing, damaged or outdated index is rebuilt from the registry
+            return
+        self.watermark = state['watermark']
+        self.vocabulary = state['vocabulary']
+        self.codes = {key: code for code, key in enumerate(self.vocabulary)}
+        self.spellings = state['spellings']
+        self.spelling_codes = {spelling: code for code, spelling in enumerate(self.spellings)}
+        self.spelling_keys = np.array(state['spelling_keys'], dtype=np.int32)
+        self.posting_codes, self.posting_ids, self.posting_positions = postings
+        self._index_vocabulary()
+
+    def _save(self):
+        os.makedirs(self.root, exist_ok=True)
+        for name in ('posting_codes', 'posting_ids', 'posting_positions'):
+            path = os.path.join(self.root, f'{name}.npy')
+            tmp_path = f'{path}.tmp.npy'
+            np.save(tmp_path, getattr(self, name))
+            os.replace(tmp_path, path)
+        # The state file is written last and references the arrays above
+        write_json_atomic(self.state_path, {
+            'format': INDEX_FORMAT,
+            'watermark': self.watermark,
+            'vocabulary': self.vocabulary,
+            'spellings': self.spellings,
+            'spelling_keys': self.spelling_keys.tolist()
+        })
+
+    def _index_vocabulary(self):
+        """Sorted keys for prefix lookups and key trigrams for fuzzy lookups"""
+        keys = np.array(self.vocabulary, dtype=str) if self.vocabulary else np.empty(0, dtype='<U1')
+        order = np.argsort(keys, kind='stable')
+        self._sorted_keys, self._sorted_codes = keys[order], order.astype(np.int32)
+        grams = [_key_grams(key) for key in self.vocabulary]
+        self._gram_counts = np.array([len(g) for g in grams], dtype=np.int32)
+        codes = np.repeat(np.arange(len(grams), dtype=np.int32), self._gram_counts)
+        flat = np.array([code for g in grams for code in g], dtype=np.int32)
+        order = np.argsort(flat, kind='stable')
+        self._grams, self._gram_codes = flat[order], codes[order]
+
+    def refresh(self):
+        """Index students registered since the last refresh"""
+        count = self.students.count
+        with self._lock:
+            if self.watermark == count:
+                return False
+            if self.watermark > count:
+                # The registry was replaced underneath us; start again
+                self._empty()
+            ids = np.arange(self.watermark, count)
+            known_keys = len(self.vocabulary)
+            new_spelling_keys = []
+            new_codes, new_ids, new_positions = [], [], []
+            for student_id, name in zip(ids.tolist(), self.students.names(ids)):
+                seen = set()
+                for position, (spelling, key) in enumerate(name_spellings(name)):
+                    code = self.spelling_codes.get(spelling)
+                    if code is None:
+                        key_code = self.codes.get(key)
+                        if key_code is None:
+                            key_code = self.codes[key] = len(self.vocabulary)
+                            self.vocabulary.append(key)
+                        code = self.spelling_codes[spelling] = len(self.spellings)
+                        self.spellings.append(spelling)
+                        new_spelling_keys.append(key_code)
+                    # A repeated word is posted once, at its first position
+                    if code not in seen:
+                        seen.add(code)
+                        new_codes.append(code)
+                        new_ids.append(student_id)
+                        new_positions.append(min(position, 127))
+            if new_spelling_keys:
+                self.spelling_keys = np.concatenate([self.spelling_keys, np.array(new_spelling_keys, dtype=np.int32)])
+            if len(self.vocabulary) > known_keys:
+                self._index_vocabulary()
+            new_codes = np.array(new_codes, dtype=np.int32)
+            order = np.argsort(new_codes, kind='stable')
+            new_codes = new_codes[order]
+            new_ids = np.array(new_ids, dtype=np.int32)[order]
+            new_positions = np.array(new_positions, dtype=np.int8)[order]
+            # side='right' keeps ties in id order: new students come last
+            positions = np.searchsorted(self.posting_codes, new_codes, side='right')
+            self.posting_codes = np.insert(self.posting_codes, positions, new_codes)
+            self.posting_ids = np.insert(self.posting_ids, positions, new_ids)
+            self.posting_positions = np.insert(self.posting_positions, positions, new_positions)
+            self.watermark = count
+            self._save()
+            return True
+
+    def _similar_keys(self, key, prefix):
+        """Vocabulary codes close to ``key`` and how close, from 0 to 1
+
+        With ``prefix``, keys that merely start with ``key`` also match, for
+        the word that is still being typed.
+        """
+        similarity = np.zeros(len(self.vocabulary), dtype=np.float32)
+        query_grams = np.unique(np.array(_key_grams(key), dtype=np.int32))
+        starts = np.searchsorted(self._grams, query_grams, side='left')
+        stops = np.searchsorted(self._grams, query_grams, side='right')
+        hits = [self._gram_codes[start:stop] for start, stop in zip(starts, stops) if stop > start]
+        if hits:
+            shared = np.bincount(np.concatenate(hits), minlength=len(self.vocabulary))
+            jaccard = shared / (len(query_grams) + self._gram_counts - shared)
+            similarity[jaccard >= MIN_KEY_SIMILARITY] = jaccard[jaccard >= MIN_KEY_SIMILARITY]
+        if prefix:
+            start = np.searchsorted(self._sorted_keys, key, side='left')
+            stop = np.searchsorted(self._sorted_keys, key + '\uffff', side='right')
+            matches = self._sorted_codes[start:stop]
+            similarity[matches] = np.maximum(similarity[matches], PREFIX_SIMILARITY)
+        exact = self.codes.get(key)
+        if exact is not None:
+            similarity[exact] = 1.0
+        codes = np.flatnonzero(similarity)
+        return codes, similarity[codes]
+
+    def _similar_spellings(self, spelling, key, prefix):
+        """Spelling codes close to a query word, with how close their keys are and how close they are
+
+        Both run from 0 to 1. A spelling's own similarity is its key's, scaled
+        down by up to ``SPELLING_WEIGHT`` as it drifts from the query's spelling.
+        """
+        codes, similarity = self._similar_keys(key, prefix)
+        key_similarity = np.zeros(len(self.vocabulary), dtype=np.float32)
+        key_similarity[codes] = similarity
+        matches = np.flatnonzero(key_similarity[self.spelling_keys])
+        # The word being typed is compared with as much of each spelling
+        closeness = np.array([
+            difflib.SequenceMatcher(
+                None, spelling, self.spellings[code][:len(spelling)] if prefix else self.spellings[code]
+            ).ratio()
+            for code in matches.tolist()
+        ], dtype=np.float32)
+        key_similarity = key_similarity[self.spelling_keys[matches]]
+        return matches, key_similarity, key_similarity * (1 - SPELLING_WEIGHT + SPELLING_WEIGHT * closeness)
+
+    def search(self, query, limit=20, student_ids=None):
+        """Best matching students as ``[(student_id, name, score)]``, best first
+
+        A student must match the query's words by key: the mean, over the
+        words, of how closely the student's name matches each is at least
+        ``MIN_SCORE``. ``score`` is that mean with each word's similarity
+        also weighed by spelling, plus up to ``ORDER_WEIGHT`` when the name
+        starts with the query's first word and follows the query's word
+        order, plus up to 0.1 for the closest overall spelling. The last word
+        also matches as a prefix unless the query ends with a space.
+        ``student_ids`` limits the search to those students before the best
+        ``limit`` are picked.
+        """
+        words = name_spellings(query)
+        if not words:
+            return []
+        typing = not query[-1:].isspace()
+        with self._lock:
+            students = self.watermark
+            matched = np.zeros(students, dtype=np.float32)
+            scores = np.zeros(students, dtype=np.float32)
+            order = np.zeros(students, dtype=np.float32)
+            # Bit p set: the student's best match for the previous word is word p of the name
+            previous = np.zeros(students, dtype=np.uint8)
+            for i, (spelling, key) in enumerate(words):
+                codes, key_similarity, similarity = self._similar_spellings(
+                    spelling, key, prefix=typing and i == len(words) - 1
+                )
+                starts = np.searchsorted(self.posting_codes, codes, side='left')
+                stops = np.searchsorted(self.posting_codes, codes, side='right')
+                lengths = stops - starts
+                if not lengths.sum():
+                    previous[:] = 0
+                    continue
+                ids = np.concatenate([self.posting_ids[start:stop] for start, stop in zip(starts, stops)])
+                positions = np.concatenate([self.posting_positions[start:stop] for start, stop in zip(starts, stops)])
+                # Best matching word of each student for this query word, by key and by spelling
+                for total, values in ((matched, key_similarity), (scores, similarity)):
+                    best = np.zeros(students, dtype=np.float32)
+                    values = np.repeat(values, lengths)
+                    np.maximum.at(best, ids, values)
+                    total += best
+                # Word order, by the student's best matching words: the first
+                # word starts the name, later words follow the one before
+                closest = (values == best[ids]) & (positions < ORDER_POSITIONS)
+                ids, positions = ids[closest], positions[closest].astype(np.uint8)
+                follows = np.zeros(students, dtype=bool)
+                if i == 0:
+                    follows[ids[positions == 0]] = True
+                else:
+                    later = positions > 0
+                    ids_later = ids[later]
+                    follows[ids_later[(previous[ids_later] >> (positions[later] - 1)) & 1 == 1]] = True
+                order += follows
+                previous[:] = 0
+                np.bitwise_or.at(previous, ids, np.left_shift(1, positions, dtype=np.uint8))
+            matched /= len(words)
+            scores = scores / len(words) + ORDER_WEIGHT * order / len(words)
+
+        if student_ids is None:
+            candidates = np.flatnonzero(matched >= MIN_SCORE)
+        else:
+            student_ids = student_ids[student_ids < students]
+            candidates = student_ids[matched[student_ids] >= MIN_SCORE]
+        if not len(candidates):
+            return []
+        shortlist = min(len(candidates), limit * RERANK_FACTOR)
+        candidates = candidates[np.argpartition(-scores[candidates], shortlist - 1)[:shortlist]]
+        # Break ties between equally close words by how close the whole spelling is
+        wanted = ' '.join(spelling for spelling, _ in words)
+        ranked = sorted(
+            (
+                (float(scores[student_id]) + 0.1 * difflib.SequenceMatcher(
+                    None, wanted, ' '.join(spelling for spelling, _ in name_spellings(name))
+                ).ratio(),
+                 int(student_id), name)
+                for student_id, name in zip(candidates, self.students.names(candidates))
+            ),
+            reverse=True
+        )
+        return [(student_id, name, round(score, 3)) for score, student_id, name in ranked[:limit]]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_name_index():
+    """Process-wide name index, caught up with the student registry"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NameIndex(get_store().students)
+    _index.refresh()
+    return _index
+
+
+@timed('name_search.search')
+def search_students(query, limit=20, store=None):
+    """Students whose names match ``query`` in any supported spelling or script
+
+    With a scoped ``store`` view only students who have assessments in it are
+    returned, so a school's table is not crowded out by other schools' matches.
+    """
+    index = get_name_index()
+    student_ids, scope, version = None, None, index.watermark
+    if store is not None and getattr(store, 'view_id', 'all') != 'all':
+        student_ids = view_students(store)
+        scope, version = store.state_root, (index.watermark, store.layout, store.rows)
+    # Paging through a search re-runs it; the results are shared until new students arrive.
+    # A trailing space turns off prefix matching, so it is part of the key
+    key = ('name_search', query.strip(), query[-1:].isspace(), limit, scope)
+    return cached(key, version, lambda: index.search(query, limit, student_ids))
+
+
+def view_students(store):
+    """Sorted ids of the students with assessments in a store view"""
+    return cached(
+        ('view_students', store.state_root), (store.layout, store.rows),
+        lambda: np.unique(store.column('student_id'))
+    )
@@ -0,0 +1,387 @@
+"""Durable offline capture queue with batched, idempotent sync
+
+While the app is in offline mode, captured assessments go into an SQLite
+outbox (``data/offline_queue.db``, WAL mode) instead of the assessment store.
+When the connection is back, ``sync`` drains the outbox in gzip-compressed
+JSON batches. Every record carries a UUID and the receiving side ignores
+UUIDs it has already applied, so a retried batch never duplicates rows.
+The receiving side journals each apply before appending. The appended rows
+carry the journal entry's receipt, so an apply interrupted between the
+store and SQLite is completed, not repeated.
+
+The receiving side is ``apply_batch``. It runs in-process when no sync URL is
+configured, and behind a small HTTP server otherwise. That server doubles as
+a local stand-in for the central service::
+
+    python offline_queue.py serve --port 8765          # central stand-in
+    EDUSCAN_SYNC_URL=http://localhost:8765/sync python offline_queue.py sync
+    python offline_queue.py status
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from data_version import bump, data_version
+from settings_store import DATA_DIR
+
+QUEUE_FILE = os.path.join(DATA_DIR, 'offline_queue.db')
+SYNC_URL = os.environ.get('EDUSCAN_SYNC_URL') or None
+
+SYNC_BATCH_SIZE = 500
+SYNC_TIMEOUT_S = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    record_uuid TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    captured_at REAL NOT NULL,
+    synced_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (id) WHERE synced_at IS NULL;
+CREATE TABLE IF NOT EXISTS received (
+    record_uuid TEXT PRIMARY KEY,
+    received_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS applying (
+    receipt TEXT PRIMARY KEY,
+    records TEXT NOT NULL,
+    started_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sync_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    finished_at REAL NOT NULL,
+    batches INTEGER NOT NULL,
+    records INTEGER NOT NULL,
+    raw_bytes INTEGER NOT NULL,
+    sent_bytes INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    error TEXT
+);
+"""
+
+_apply_lock = threading.Lock()
+
+
+class SyncError(RuntimeError):
+    """The central store rejected a batch or could not be reached"""
+
+
+def _connect(path=QUEUE_FILE):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    connection = sqlite3.connect(path, timeout=30)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()[:10]
+    if hasattr(value, 'item'):
+        # numpy scalars
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _clean_record(record):
+    """Drop missing values so the JSON stays compact"""
+    cleaned = {}
+    for key, value in record.items():
+        if value is None or (isinstance(value, float) and value != value):
+            continue
+        if hasattr(value, 'item'):
+            value = value.item()
+        cleaned[key] = value
+    return cleaned
+
+
+def enqueue(records, path=QUEUE_FILE):
+    """Durably capture assessments while offline; returns how many were queued"""
+    if hasattr(records, 'to_dict'):
+        # Plain values for JSON; pandas' missing markers become None
+        records = records.astype(object).where(records.notna(), None).to_dict('records')
+    now = time.time()
+    rows = [
+        (str(uuid.uuid4()), json.dumps(_clean_record(record), default=_json_default, separators=(',', ':')), now)
+        for record in records
+    ]
+    connection = _connect(path)
+    try:
+        with connection:
+            connection.executemany(
+                'INSERT INTO outbox (record_uuid, payload, captured_at) VALUES (?, ?, ?)', rows
+            )
+    finally:
+        connection.close()
+    bump('offline')
+    return len(rows)
+
+
+_status_cache = {}
+
+
+def _cached_status(name, path, read):
+    """Result of a status query, re-run only after the queue has changed"""
+    version = data_version('offline')
+    hit = _status_cache.get((name, path))
+    if hit is not None and hit[0] == version:
+        return hit[1]
+    value = read(path)
+    _status_cache[(name, path)] = (version, value)
+    return value
+
+
+def queue_depth(path=QUEUE_FILE):
+    """Number of captured assessments not yet synced"""
+    return _cached_status('queue_depth', path, _queue_depth)
+
+
+def _queue_depth(path):
+    if not os.path.exists(path):
+        return 0
+    connection = _connect(path)
+    try:
+        return connection.execute('SELECT COUNT(*) FROM outbox WHERE synced_at IS NULL').fetchone()[0]
+    finally:
+        connection.close()
+
+
+def last_sync(path=QUEUE_FILE):
+    """The most recent sync run as a dict, or None"""
+    return _cached_status('last_sync', path, _last_sync)
+
+
+def _last_sync(path):
+    if not os.path.exists(path):
+        return None
+    connection = _connect(path)
+    try:
+        row = connection.execute(
+            'SELECT finished_at, batches, records, raw_bytes, sent_bytes, seconds, error '
+            'FROM sync_log ORDER BY id DESC LIMIT 1'
+        ).fetchone()
+    finally:
+        connection.close()
+    if row is None:
+        return None
+    keys = ['finished_at', 'batches', 'records', 'raw_bytes', 'sent_bytes', 'seconds', 'error']
+    stats = dict(zip(keys, row))
+    stats['records_per_second'] = stats['records'] / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+def encode_batch(records):
+    """Compress a batch; the batch id is derived from its record UUIDs"""
+    batch_id = hashlib.sha256(''.join(r['uuid'] for r in records).encode('ascii')).hexdigest()[:32]
+    raw = json.dumps({'batch_id': batch_id, 'records': records}, separators=(',', ':')).encode('utf-8')
+    return batch_id, raw, gzip.compress(raw, compresslevel=6)
+
+
+def _complete_apply(connection, store, receipt, records):
+    """Append a journaled apply's records and mark their UUIDs received
+
+    The rows are committed with ``receipt``, so running this again after a
+    crash skips the partitions that already hold them.
+    """
+    import pandas as pd
+    from risk_model import score_rows
+
+    frame = pd.DataFrame([{k: v for k, v in r.items() if k != 'uuid'} for r in records])
+    store.append(frame, scorer=score_rows, receipt=receipt)
+    now = time.time()
+    with connection:
+        connection.executemany(
+            'INSERT OR IGNORE INTO received (record_uuid, received_at) VALUES (?, ?)',
+            [(record['uuid'], now) for record in records]
+        )
+        connection.execute('DELETE FROM applying WHERE receipt = ?', (receipt,))
+
+
+def apply_batch(body, path=QUEUE_FILE, store=None):
+    """Apply a gzip-compressed batch to the assessment store, skipping seen UUIDs"""
+    from assessment_store import get_store
+
+    batch = json.loads(gzip.decompress(body))
+    records = batch['records']
+    store = store or get_store()
+    connection = _connect(path)
+    try:
+        with _apply_lock:
+            # Finish applies that stopped between the store and this database
+            for receipt, journaled in connection.execute('SELECT receipt, records FROM applying').fetchall():
+                _complete_apply(connection, store, receipt, json.loads(journaled))
+            uuids = [record['uuid'] for record in records]
+            seen = set()
+            for start in range(0, len(uuids), 500):
+                chunk = uuids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                seen.update(row[0] for row in connection.execute(
+                    f'SELECT record_uuid FROM received WHERE record_uuid IN ({placeholders})', chunk
+                ))
+            fresh = [record for record in records if record['uuid'] not in seen]
+            if fresh:
+                receipt = uuid.uuid4().hex
+                with connection:
+                    connection.execute(
+                        'INSERT INTO applying (receipt, records, started_at) VALUES (?, ?, ?)',
+                        (receipt, json.dumps(fresh, separators=(',', ':')), time.time())
+                    )
+                _complete_apply(connection, store, receipt, fresh)
+    finally:
+        connection.close()
+    return {'batch_id': batch['batch_id'], 'applied': len(fresh), 'duplicates': len(records) - len(fresh)}
+
+
+def _post_batch(url, batch_id, body):
+    request = urllib.request.Request(url, data=body, method='POST', headers={
+        'Content-Type': 'application/json',
+        'Content-Encoding': 'gzip',
+        'Idempotency-Key': batch_id
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=SYNC_TIMEOUT_S) as response:
+            return json.loads(response.read())
+    except (urllib.error.URLError, OSError, ValueError) as exc:
+        raise SyncError(f"sync to {url} failed: {exc}") from exc
+
+
+def sync(url=SYNC_URL, batch_size=SYNC_BATCH_SIZE, path=QUEUE_FILE, progress=None):
+    """Drain the outbox in compressed batches and return the run's statistics
+
+    Without a ``url`` the batches are applied to this instance's assessment
+    store directly, through the same idempotent path the server uses.
+    """
+    stats = {'batches': 0, 'records': 0, 'raw_bytes': 0, 'sent_bytes': 0, 'seconds': 0.0, 'error': None}
+    started = time.perf_counter()
+    connection = _connect(path)
+    try:
+        while True:
+            rows = connection.execute(
+                'SELECT id, record_uuid, payload FROM outbox WHERE synced_at IS NULL ORDER BY id LIMIT ?',
+                (batch_size,)
+            ).fetchall()
+            if not rows:
+                break
+            records = [dict(json.loads(payload), uuid=record_uuid) for _, record_uuid, payload in rows]
+            batch_id, raw, body = encode_batch(records)
+            try:
+                if url:
+                    _post_batch(url, batch_id, body)
+                else:
+                    apply_batch(body, path)
+            except SyncError as exc:
+                stats['error'] = str(exc)
+                break
+            except Exception as exc:
+                # Applying locally failed; the batch stays queued and the failure is logged
+                stats['error'] = f"{type(exc).__name__}: {exc}"
+                break
+            with connection:
+                connection.executemany(
+                    'UPDATE outbox SET synced_at = ? WHERE id = ?', [(time.time(), row[0]) for row in rows]
+                )
+            bump('offline')
+            stats['batches'] += 1
+            stats['records'] += len(rows)
+            stats['raw_bytes'] += len(raw)
+            stats['sent_bytes'] += len(body)
+            if progress is not None:
+                progress(dict(stats))
+        stats['seconds'] = time.perf_counter() - started
+        if stats['batches'] or stats['error']:
+            with connection:
+                connection.execute(
+                    'INSERT INTO sync_log (finished_at, batches, records, raw_bytes, sent_bytes, seconds, error) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (time.time(), stats['batches'], stats['records'], stats['raw_bytes'],
+                     stats['sent_bytes'], stats['seconds'], stats['error'])
+                )
+            bump('offline')
+    finally:
+        connection.close()
+    stats['records_per_second'] = stats['records'] / stats['seconds'] if stats['seconds'] else 0.0
+    return stats
+
+
+class SyncRequestHandler(BaseHTTPRequestHandler):
+    """Accepts ``POST /sync`` batches on behalf of the central store"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/sync':
+            self._reply(404, {'error': 'not found'})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if self.headers.get('Content-Encoding') != 'gzip':
+            body = gzip.compress(body)
+        try:
+            result = apply_batch(body)
+        except (ValueError, KeyError, OSError) as exc:
+            self._reply(400, {'error': str(exc)})
+            return
+        self._reply(200, result)
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host='127.0.0.1', port=8765):
+    """Run the stand-in central sync server until interrupted"""
+    server = ThreadingHTTPServer((host, port), SyncRequestHandler)
+    print(f"Sync server listening on http://{host}:{port}/sync", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EduScan offline capture queue")
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help="run the stand-in central sync server")
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    sync_parser = commands.add_parser('sync', help="push queued assessments")
+    sync_parser.add_argument('--url', default=SYNC_URL, help="sync endpoint (default: apply locally)")
+    sync_parser.add_argument('--batch-size', type=int, default=SYNC_BATCH_SIZE)
+    commands.add_parser('status', help="show queue depth and the last sync")
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        serve(args.host, args.port)
+        return 0
+    if args.command == 'sync':
+        stats = sync(args.url, args.batch_size)
+        print(json.dumps(stats, indent=2))
+        return 1 if stats['error'] else 0
+    print(json.dumps({'queue_depth': queue_depth(), 'last_sync': last_sync()}, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,449 @@
+"""Assessment data partitioned by region, school and academic term
+
+Each partition is an ordinary ``AssessmentStore`` under
+``data/assessments/parts/<region>/<school>/<term>``. All partitions share one
+``StudentRegistry`` at the top of ``data/assessments``, so a student keeps the
+same id across terms, and across schools when rows carry the school's own
+student id. ``catalog.json`` lists the partitions and is replaced atomically
+whenever one is added.
+
+Readers ask for a ``StoreView`` of the partitions that match a scope, e.g. one
+school, and only those partitions' files are ever opened. A view has the same
+read API as a single store, so the dashboard aggregates, sort indexes and
+trends work on it unchanged. Their state is kept per view under
+``data/assessments/views/<view id>``. A view lists its partitions by term, so
+appends for the current term land at the end of a school's rows. An append
+anywhere else shifts later rows and changes the view's ``layout``; consumers
+then compare ``segments()`` snapshots with ``segment_changes``, move the row
+numbers they hold with ``shift_rows`` and fold in only the new rows.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+
+import numpy as np
+
+from assessment_store import (
+    COLUMNS, STORE_DIR, AssessmentStore, ColumnReader, StudentRegistry, _file_lock, encode_dates
+)
+from atomic_io import write_json_atomic
+from data_version import bump, data_version
+from dataset_cache import cached
+
+CATALOG_FORMAT = 1
+
+PARTS_DIR = 'parts'
+VIEWS_DIR = 'views'
+
+# Rows without a region or school column land here
+DEFAULT_REGION = os.environ.get('EDUSCAN_DEFAULT_REGION', 'Unassigned')
+DEFAULT_SCHOOL = os.environ.get('EDUSCAN_DEFAULT_SCHOOL', 'Unassigned')
+
+# Per-view aggregates, indexes and trends kept in memory per process
+VIEW_STATE_CACHE_SIZE = 16
+
+# The Somaliland school year starts in September: Term 1 runs September to
+# December, Term 2 January to April and Term 3 May to August
+TERM_START_MONTHS = {1: 9, 2: 1, 3: 5}
+
+
+def term_codes(day_numbers):
+    """Academic term of each day number as ``start_year * 10 + term``"""
+    months = np.asarray(day_numbers, dtype='<i4').astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    years = months // 12 + 1970
+    month = months % 12 + 1
+    start_year = np.where(month >= 9, years, years - 1)
+    term = np.select([month >= 9, month <= 4], [1, 2], 3)
+    return start_year * 10 + term
+
+
+def term_label(code):
+    """Display label of a term code, e.g. ``2023-24 T3``"""
+    start_year, term = divmod(int(code), 10)
+    return f"{start_year}-{(start_year + 1) % 100:02d} T{term}"
+
+
+def segment_changes(old, new):
+    """How rows moved between two ``segments()`` snapshots of the same view
+
+    Returns ``(old_ends, shifts, ranges)``: a row numbered below
+    ``old_ends[i]`` (and at or past ``old_ends[i - 1]``) is now ``shifts[i]``
+    further on, and ``ranges`` are the ``(start, stop)`` row ranges that are
+    new. None when a partition disappeared or shrank, which leaves nothing
+    to carry over.
+    """
+    new_offsets = {}
+    offset = 0
+    for path, rows in new:
+        new_offsets[path] = (offset, rows)
+        offset += rows
+    old_ends, shifts, kept = [], [], {}
+    offset = 0
+    for path, rows in old:
+        if path not in new_offsets or new_offsets[path][1] < rows:
+            return None
+        offset += rows
+        old_ends.append(offset)
+        shifts.append(new_offsets[path][0] - (offset - rows))
+        kept[path] = rows
+    ranges = []
+    for path, (start, rows) in new_offsets.items():
+        if rows > kept.get(path, 0):
+            ranges.append((start + kept.get(path, 0), start + rows))
+    return np.asarray(old_ends, dtype=np.int64), np.asarray(shifts, dtype=np.int64), ranges
+
+
+def shift_rows(rows, old_ends, shifts):
+    """Row numbers moved as ``segment_changes`` describes; negative placeholders stay put"""
+    rows = np.asarray(rows)
+    if not len(shifts) or not shifts.any():
+        return rows
+    known = rows >= 0
+    moved = rows.copy()
+    moved[known] += shifts[np.searchsorted(old_ends, rows[known], side='right')].astype(rows.dtype)
+    return moved
+
+
+def _slug(name):
+    """Filesystem-safe, collision-free directory name for a region or school"""
+    readable = re.sub(r'[^0-9a-z]+', '-', name.casefold()).strip('-')[:40] or 'x'
+    return f"{readable}-{hashlib.sha1(name.encode('utf-8')).hexdigest()[:6]}"
+
+
+def _clean_names(values, default):
+    """Stripped region/school names with blanks replaced by ``default``"""
+    names = values.astype(object).fillna('').astype(str).str.strip()
+    return names.where(names != '', default)
+
+
+class StoreView(ColumnReader):
+    """Read-only union of the partitions matching one scope
+
+    ``regions``, ``schools`` and ``terms`` are lists of names (term labels for
+    terms); None matches everything. Row numbers run through the matching
+    partitions in (term, region, school) order.
+    """
+
+    def __init__(self, catalog, regions=None, schools=None, terms=None):
+        self.catalog = catalog
+        self.scope = {
+            'regions': sorted(regions) if regions else None,
+            'schools': sorted(schools) if schools else None,
+            'terms': sorted(terms) if terms else None
+        }
+        spec = json.dumps(self.scope, sort_keys=True, ensure_ascii=False)
+        self.view_id = 'all' if not any(self.scope.values()) else hashlib.sha1(spec.encode('utf-8')).hexdigest()[:12]
+        self.state_root = os.path.join(catalog.root, VIEWS_DIR, self.view_id)
+        self.students = catalog.students
+        self._parts_key = None
+        self._parts = []
+
+    def partitions(self):
+        """``(entry, store)`` for every partition in this view, in row order"""
+        catalog = self.catalog.read_catalog()
+        if self._parts_key is not catalog:
+            entries = self.catalog.match(**self.scope)
+            self._parts = [(entry, self.catalog.partition_store(entry)) for entry in entries]
+            self._parts_key = catalog
+        return self._parts
+
+    def _row_counts(self):
+        return [store.rows for _, store in self.partitions()]
+
+    @property
+    def rows(self):
+        return sum(self._row_counts())
+
+    @property
+    def exists(self):
+        return bool(self.partitions())
+
+    @property
+    def layout(self):
+        # Growth of the last partition only adds rows at the end; anything
+        # else moves rows that consumers have already folded in
+        parts = self.partitions()
+        counts = self._row_counts()
+        token = [[entry['path'] for entry, _ in parts], counts[:-1]]
+        return hashlib.sha1(json.dumps(token).encode('utf-8')).hexdigest()[:16]
+
+    def segments(self):
+        """``[path, rows]`` of every partition in row order; see ``segment_changes``"""
+        return [[entry['path'], store.rows] for entry, store in self.partitions()]
+
+    def generation(self, name):
+        return sum(store.generation(name) for _, store in self.partitions())
+
+    def column(self, name):
+        parts = self.partitions()
+        if not parts:
+            return np.empty(0, dtype=COLUMNS[name])
+        if len(parts) == 1:
+            return parts[0][1].column(name)
+        # The concatenation is the one copy of a view's column in this process.
+        # Pinned per view, so derived entries never evict what they are built from
+        version = tuple((entry['path'], store.rows, store.generation(name)) for entry, store in parts)
+        return cached(
+            ('view_column', self.state_root, name), version,
+            lambda: np.concatenate([store.column(name) for _, store in parts]), pin=self.state_root
+        )
+
+    def write_column(self, name, start, values):
+        """Overwrite committed values, split across the partitions they fall in"""
+        values = np.asarray(values)
+        offset = 0
+        for _, store in self.partitions():
+            rows = store.rows
+            lo, hi = max(start, offset), min(start + len(values), offset + rows)
+            if lo < hi:
+                store.write_column(name, lo - offset, values[lo - start:hi - start])
+            offset += rows
+
+    def _row_groups(self, rows):
+        """Region and school of the given rows, as categories"""
+        import frame_schema
+
+        parts = self.partitions()
+        ends = np.cumsum(self._row_counts())
+        row_parts = np.searchsorted(ends, rows, side='right')
+        groups = {}
+        for column in ('region', 'school'):
+            names = sorted({entry[column] for entry, _ in parts})
+            part_codes = np.asarray([names.index(entry[column]) for entry, _ in parts], dtype=np.int32)
+            groups[column] = frame_schema.group_column(names, part_codes[row_parts] if len(parts) else row_parts)
+        return groups
+
+    def partition_summary(self):
+        """Region, school, term and row count of every partition in the view"""
+        return [dict(entry, rows=store.rows) for entry, store in self.partitions()]
+
+
+class PartitionedStore:
+    """Catalog of partitions plus the process-wide entry point for appends
+
+    Reads without a scope go to the view of every partition, so code that
+    expects a single store keeps working.
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.catalog_path = os.path.join(root, 'catalog.json')
+        self.lock_path = os.path.join(root, '.catalog.lock')
+        self.students = StudentRegistry(root)
+        self._write_lock = threading.Lock()
+        self._catalog_stat = None
+        self._catalog_version = None
+        self._catalog = {'format': CATALOG_FORMAT, 'partitions': []}
+        self._stores = {}
+        self._views = {}
+        self._views_lock = threading.Lock()
+
+    @property
+    def exists(self):
+        return os.path.exists(self.catalog_path)
+
+    def read_catalog(self):
+        """The current catalog; the same object until the file changes"""
+        version = data_version('assessments')
+        if self._catalog_stat is not None and version == self._catalog_version:
+            return self._catalog
+        try:
+            stat = os.stat(self.catalog_path)
+        except FileNotFoundError:
+            return self._catalog
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key != self._catalog_stat:
+            with open(self.catalog_path, 'r', encoding='utf-8') as f:
+                self._catalog = json.load(f)
+            self._catalog_stat = key
+        self._catalog_version = version
+        return self._catalog
+
+    def create(self):
+        """Write an empty catalog for a brand-new store"""
+        with _file_lock(self.lock_path, self._write_lock):
+            if not self.exists:
+                write_json_atomic(self.catalog_path, {'format': CATALOG_FORMAT, 'partitions': []})
+                bump('assessments')
+
+    def match(self, regions=None, schools=None, terms=None):
+        """Catalog entries in the given scope, in (term, region, school) order"""
+        entries = [
+            entry for entry in self.read_catalog()['partitions']
+            if (not regions or entry['region'] in regions)
+            and (not schools or entry['school'] in schools)
+            and (not terms or entry['term'] in terms)
+        ]
+        return sorted(entries, key=lambda e: (e['term'], e['region'], e['school']))
+
+    def regions(self):
+        return sorted({entry['region'] for entry in self.read_catalog()['partitions']})
+
+    def schools(self, region=None):
+        return sorted({
+            entry['school'] for entry in self.read_catalog()['partitions']
+            if region is None or entry['region'] == region
+        })
+
+    def terms(self):
+        return sorted({entry['term'] for entry in self.read_catalog()['partitions']})
+
+    def partition_store(self, entry):
+        store = self._stores.get(entry['path'])
+        if store is None:
+            store = AssessmentStore(os.path.join(self.root, entry['path']), students=self.students)
+            self._stores[entry['path']] = store
+        return store
+
+    def view(self, regions=None, schools=None, terms=None):
+        """Shared view of the partitions in a scope"""
+        key = json.dumps([regions and sorted(regions), schools and sorted(schools), terms and sorted(terms)],
+                         ensure_ascii=False)
+        with self._views_lock:
+            view = self._views.get(key)
+            if view is None:
+                view = self._views[key] = StoreView(self, regions, schools, terms)
+            return view
+
+    def _ensure_partition(self, region, school, term):
+        """Catalog entry for a partition, creating it when new"""
+        return self.ensure_partitions([(region, school, term)])[0]
+
+    def ensure_partitions(self, keys):
+        """Catalog entries for ``(region, school, term)`` keys, creating the new ones with one catalog write"""
+        def lookup(catalog):
+            entries = {(e['region'], e['school'], e['term']): e for e in catalog['partitions']}
+            return [entries.get(tuple(key)) for key in keys]
+
+        found = lookup(self.read_catalog())
+        if all(entry is not None for entry in found):
+            return found
+        with _file_lock(self.lock_path, self._write_lock):
+            self._catalog_stat = None
+            catalog = self.read_catalog()
+            found = lookup(catalog)
+            added = {}
+            for i, (region, school, term) in enumerate(keys):
+                if found[i] is None:
+                    found[i] = added.setdefault((region, school, term), {
+                        'region': region,
+                        'school': school,
+                        'term': term,
+                        'path': os.path.join(PARTS_DIR, _slug(region), _slug(school), term.replace(' ', '-').lower())
+                    })
+            if added:
+                catalog = dict(catalog, partitions=catalog['partitions'] + list(added.values()))
+                write_json_atomic(self.catalog_path, catalog)
+                bump('assessments')
+                self._catalog, self._catalog_stat = catalog, None
+            return found
+
+    def append(self, records, scorer=None, receipt=None):
+        """Route assessments to their partitions; returns the number of rows appended
+
+        Optional ``region`` and ``school`` columns pick the partition, along
+        with the term of each ``assessment_date``. A ``receipt`` is committed
+        with each partition's rows; repeating the append skips the partitions
+        that already hold it.
+        """
+        import pandas as pd
+
+        frame = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+        if not len(frame):
+            return 0
+        days = encode_dates(frame['assessment_date'])
+        keys = pd.DataFrame({
+            'region': _clean_names(frame['region'], DEFAULT_REGION) if 'region' in frame else DEFAULT_REGION,
+            'school': _clean_names(frame['school'], DEFAULT_SCHOOL) if 'school' in frame else DEFAULT_SCHOOL,
+            'term': [term_label(code) for code in term_codes(days)]
+        }, index=frame.index)
+        rows = frame.drop(columns=[c for c in ('region', 'school') if c in frame])
+        # The school is part of a student's identity when the row has no student id
+        rows['school'] = keys['school']
+        appended = 0
+        for (region, school, term), group in keys.groupby(['region', 'school', 'term'], sort=False):
+            store = self.partition_store(self._ensure_partition(region, school, term))
+            start, stop = store.append(rows.loc[group.index], scorer=scorer, receipt=receipt)
+            appended += stop - start
+        return appended
+
+    def upgrade(self):
+        """Bring every partition up to the current column set"""
+        for entry in self.read_catalog()['partitions']:
+            self.partition_store(entry).upgrade()
+
+    # Unscoped reads see every partition
+    @property
+    def all(self):
+        return self.view()
+
+    @property
+    def state_root(self):
+        return self.all.state_root
+
+    @property
+    def layout(self):
+        return self.all.layout
+
+    @property
+    def rows(self):
+        return self.all.rows
+
+    def segments(self):
+        return self.all.segments()
+
+    def partition_summary(self):
+        return self.all.partition_summary()
+
+    def generation(self, name):
+        return self.all.generation(name)
+
+    def column(self, name):
+        return self.all.column(name)
+
+    def write_column(self, name, start, values):
+        self.all.write_column(name, start, values)
+
+    def take(self, row_indices):
+        return self.all.take(row_indices)
+
+    def tail(self, limit):
+        return self.all.tail(limit)
+
+
+def migrate_flat_store(flat, partitioned):
+    """Move a single-directory store into term partitions of the default school
+
+    The flat manifest is removed last, so an interrupted migration simply
+    runs again on the next start. Student ids are kept, because the registry
+    files already sit where the partitioned store expects them.
+    """
+    for leftover in (PARTS_DIR, VIEWS_DIR):
+        shutil.rmtree(os.path.join(partitioned.root, leftover), ignore_errors=True)
+    try:
+        os.unlink(partitioned.catalog_path)
+    except FileNotFoundError:
+        pass
+    partitioned._catalog_stat = None
+    partitioned._catalog = {'format': CATALOG_FORMAT, 'partitions': []}
+    partitioned.create()
+
+    columns = {name: np.asarray(flat.column(name)) for name in COLUMNS}
+    terms = term_codes(columns['assessment_date'])
+    for code in np.unique(terms):
+        rows = np.flatnonzero(terms == code)
+        entry = partitioned._ensure_partition(DEFAULT_REGION, DEFAULT_SCHOOL, term_label(code))
+        partitioned.partition_store(entry).append_columns({name: values[rows] for name, values in columns.items()})
+
+    os.unlink(flat.manifest_path)
+    for path in [flat._column_path(name) for name in COLUMNS] + [flat.lock_path]:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+    # Derived state of the flat store; views rebuild their own
+    for derived in ('aggregates', 'index', 'trends'):
+        shutil.rmtree(os.path.join(flat.root, derived), ignore_errors=True)
@@ -0,0 +1,465 @@
+"""Printable per-student and per-class reports, generated in bulk into one zip
+
+Each student report has the student's assessments, latest risk level and the
+risk model's recommendations. Each class report (one school's grade) lists
+every student's latest assessment. Both are localized with ``translations``
+into English, Somali or Arabic, and can be written as HTML, CSV or Excel. PDF
+is available when ``reportlab`` is installed, except in Arabic: its built-in
+fonts have no Arabic glyphs and it does not shape or reorder right-to-left
+text.
+
+Students are sent to a pool of worker processes in chunks of
+``STUDENTS_PER_TASK``. The parent writes each rendered chunk into the zip as
+soon as it comes back, so memory use is bounded by the few chunks in flight,
+not by the size of the school. Each worker builds its labels and HTML
+template once and reuses them for every student. The workers come from a fork
+server that has already imported this module, so they start in milliseconds
+without forking the multithreaded app process itself (spawned where there is
+no fork server). ``EDUSCAN_REPORT_WORKERS`` sets their number.
+
+The same export is available without the UI::
+
+    python reports.py --format html xlsx --language Somali --school "Boorama Primary" -o reports.zip
+"""
+import argparse
+import csv
+import html
+import io
+import multiprocessing
+import os
+import re
+import string
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from assessment_store import DATA_DIR, MISSING_SCORE, RISK_LEVELS, SUBJECTS, days_to_dates, get_store
+from risk_model import RECOMMENDATIONS
+from translations import RISK_LEVEL_KEYS, TRANSLATIONS, get_text, translate_recommendation
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table
+except ImportError:  # optional: PDF reports need ``pip install reportlab``
+    SimpleDocTemplate = None
+
+REPORTS_DIR = os.path.join(DATA_DIR, 'reports')
+
+REPORT_FORMATS = ['html', 'csv', 'xlsx'] + (['pdf'] if SimpleDocTemplate is not None else [])
+
+REPORT_WORKERS = max(int(os.environ.get('EDUSCAN_REPORT_WORKERS', '0') or 0), 0) or min(os.cpu_count() or 1, 2)
+
+# Students rendered per worker task; tasks in flight are capped at twice the workers
+STUDENTS_PER_TASK = 200
+
+# Formats that are already compressed are stored in the zip as they are
+COMPRESSED_FORMATS = {'xlsx', 'pdf'}
+
+RTL_LANGUAGES = {'Arabic'}
+
+XLSX_SHEET = 'xl/worksheets/sheet1.xml'
+
+HTML_TEMPLATE = string.Template("""<!DOCTYPE html>
+<html lang="$lang" dir="$dir">
+<head>
+<meta charset="utf-8">
+<title>$title</title>
+<style>
+body { font-family: "Segoe UI", "Noto Sans", "Noto Naskh Arabic", sans-serif; margin: 2em; color: #1e293b; }
+h1 { font-size: 1.4em; border-bottom: 2px solid #667eea; padding-bottom: .3em; }
+dl { display: grid; grid-template-columns: max-content auto; gap: .2em 1em; }
+dt { font-weight: 600; }
+table { border-collapse: collapse; width: 100%; margin: 1em 0; }
+th, td { border: 1px solid #cbd5e1; padding: .3em .5em; text-align: start; }
+th { background: #f1f5f9; }
+@media print { body { margin: 0; } }
+</style>
+</head>
+<body>
+<h1>$title</h1>
+<dl>$facts</dl>
+<table><thead><tr>$headers</tr></thead><tbody>$rows</tbody></table>
+$recommendations
+</body>
+</html>
+""")
+
+
+def report_formats(language):
+    """Formats reports can be written in for a language"""
+    if language in RTL_LANGUAGES:
+        return [fmt for fmt in REPORT_FORMATS if fmt != 'pdf']
+    return list(REPORT_FORMATS)
+
+
+def _file_name(text):
+    """Zip-safe file name part that keeps non-Latin letters"""
+    return re.sub(r'[^\w]+', '-', str(text)).strip('-')[:60] or 'x'
+
+
+class ReportRenderer:
+    """Renders report documents in one language, reusing its labels and templates"""
+
+    def __init__(self, language='English'):
+        self.language = language if language in TRANSLATIONS else 'English'
+        self.text = {key: get_text(key, self.language) for key in TRANSLATIONS['English']}
+        self.risk_labels = [self.text[key] for key in RISK_LEVEL_KEYS]
+        self.recommendations = [
+            [translate_recommendation(item, self.language) for item in RECOMMENDATIONS[level]]
+            for level in RISK_LEVELS
+        ]
+        subject_headers = [self.text.get(f'{subject}_score', subject) for subject in SUBJECTS]
+        self.student_headers = [self.text['assessment_date'], self.text['grade']] + subject_headers + [self.text['risk_level']]
+        self.class_headers = [self.text['student_name'], self.text['assessment_date']] + subject_headers + [self.text['risk_level']]
+        # The page template is filled in for the language once, then per report
+        self.html_page = string.Template(HTML_TEMPLATE.safe_substitute(
+            lang={'Somali': 'so', 'Arabic': 'ar'}.get(self.language, 'en'),
+            dir='rtl' if self.language in RTL_LANGUAGES else 'ltr'
+        ))
+        self._xlsx = None
+
+    def grade_label(self, grade):
+        return f"{self.text['grade']} {int(grade)}"
+
+    def risk_label(self, code):
+        return self.risk_labels[code] if code >= 0 else '–'
+
+    def _score_cells(self, data, rows):
+        return [[int(v) if v != MISSING_SCORE else '' for v in data[subject][rows]] for subject in SUBJECTS]
+
+    def student_documents(self, data):
+        """One document per student of a chunk built by ``_student_chunks``"""
+        dates = days_to_dates(data['assessment_date']).astype(str)
+        offsets = data['offsets']
+        for i, (student_id, name, school) in enumerate(zip(data['student_id'], data['name'], data['school'])):
+            rows = slice(offsets[i], offsets[i + 1])
+            scores = self._score_cells(data, rows)
+            grades = data['grade'][rows]
+            risk = data['risk_level'][rows]
+            table = [
+                [date, self.grade_label(grade)] + [column[j] for column in scores] + [self.risk_label(code)]
+                for j, (date, grade, code) in enumerate(zip(dates[rows], grades, risk))
+            ]
+            latest_risk = int(risk[-1])
+            document = {
+                'title': f"{self.text['student_report']}: {name}",
+                'facts': [
+                    (self.text['student_name'], name),
+                    (self.text['school'], school),
+                    (self.text['grade'], self.grade_label(grades[-1])),
+                    (self.text['latest_assessment'], dates[rows][-1]),
+                    (self.text['risk_level'], self.risk_label(latest_risk))
+                ],
+                'headers': self.student_headers,
+                'rows': table,
+                'recommendations': self.recommendations[latest_risk] if latest_risk >= 0 else []
+            }
+            yield f"students/{_file_name(school)}/grade-{int(grades[-1]):02d}/{student_id}-{_file_name(name)}", document
+
+    def class_document(self, data):
+        """The document of one class built by ``_class_tasks``"""
+        dates = days_to_dates(data['assessment_date']).astype(str)
+        scores = self._score_cells(data, slice(None))
+        table = [
+            [name, date] + [column[j] for column in scores] + [self.risk_label(code)]
+            for j, (name, date, code) in enumerate(zip(data['name'], dates, data['risk_level']))
+        ]
+        counts = np.bincount(data['risk_level'][data['risk_level'] >= 0], minlength=len(self.risk_labels))
+        grade = self.grade_label(data['grade'])
+        document = {
+            'title': f"{self.text['class_report']}: {data['school']} · {grade}",
+            'facts': [
+                (self.text['school'], data['school']),
+                (self.text['grade'], grade),
+                (self.text['students'], f"{len(table):,}")
+            ] + [(label, f"{int(count):,}") for label, count in zip(self.risk_labels, counts)],
+            'headers': self.class_headers,
+            'rows': table,
+            'recommendations': []
+        }
+        return f"classes/{_file_name(data['school'])}/grade-{int(data['grade']):02d}", document
+
+    def render(self, document, fmt):
+        """A document as the bytes of one report file"""
+        return getattr(self, f'_render_{fmt}')(document)
+
+    def _render_html(self, document):
+        escape = html.escape
+        recommendations = ''
+        if document['recommendations']:
+            items = ''.join(f"<li>{escape(item)}</li>" for item in document['recommendations'])
+            recommendations = f"<h2>{escape(self.text['recommendations'])}</h2><ul>{items}</ul>"
+        page = self.html_page.substitute(
+            title=escape(document['title']),
+            facts=''.join(f"<dt>{escape(label)}</dt><dd>{escape(str(value))}</dd>" for label, value in document['facts']),
+            headers=''.join(f"<th>{escape(header)}</th>" for header in document['headers']),
+            rows=''.join(
+                '<tr>' + ''.join(f"<td>{escape(str(value))}</td>" for value in row) + '</tr>'
+                for row in document['rows']
+            ),
+            recommendations=recommendations
+        )
+        return page.encode('utf-8')
+
+    def _lines(self, document):
+        """Report as spreadsheet rows: facts, the table, then recommendations"""
+        yield [document['title']]
+        yield from ([label, value] for label, value in document['facts'])
+        yield []
+        yield document['headers']
+        yield from document['rows']
+        if document['recommendations']:
+            yield []
+            yield [self.text['recommendations']]
+            yield from ([item] for item in document['recommendations'])
+
+    def _render_csv(self, document):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(self._lines(document))
+        # The byte order mark makes Excel read Somali and Arabic text as UTF-8
+        return buffer.getvalue().encode('utf-8-sig')
+
+    def _xlsx_template(self):
+        """Every part of an empty workbook except the worksheet, and the worksheet around its rows"""
+        if self._xlsx is None:
+            from openpyxl import Workbook
+
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet(self.text['reports'][:31])
+            if self.language in RTL_LANGUAGES:
+                sheet.sheet_view.rightToLeft = True
+            buffer = io.BytesIO()
+            workbook.save(buffer)
+            with zipfile.ZipFile(buffer) as archive:
+                parts = {name: archive.read(name) for name in archive.namelist()}
+            head, tail = parts.pop(XLSX_SHEET).decode('utf-8').split('<sheetData></sheetData>')
+            self._xlsx = (parts, f'{head}<sheetData>', f'</sheetData>{tail}')
+        return self._xlsx
+
+    def _render_xlsx(self, document):
+        # Building and saving a workbook with openpyxl costs milliseconds per
+        # report; only the worksheet differs, so it is written directly
+        parts, head, tail = self._xlsx_template()
+        rows = []
+        for number, line in enumerate(self._lines(document), 1):
+            cells = ''.join(
+                f'<c t="n"><v>{value}</v></c>' if isinstance(value, int)
+                else '<c/>' if value == ''
+                else f'<c t="inlineStr"><is><t>{html.escape(str(value), quote=False)}</t></is></c>'
+                for value in line
+            )
+            rows.append(f'<row r="{number}">{cells}</row>')
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, content in parts.items():
+                archive.writestr(name, content)
+            archive.writestr(XLSX_SHEET, f"{head}{''.join(rows)}{tail}")
+        return buffer.getvalue()
+
+    def _render_pdf(self, document):
+        # Never called for Arabic; see ``report_formats``
+        styles = getSampleStyleSheet()
+        story = [Paragraph(html.escape(document['title']), styles['Title'])]
+        story += [Paragraph(f"<b>{html.escape(label)}</b>: {html.escape(str(value))}", styles['Normal'])
+                  for label, value in document['facts']]
+        story += [Spacer(1, 12), Table([document['headers']] + document['rows'], repeatRows=1)]
+        if document['recommendations']:
+            story.append(Paragraph(html.escape(self.text['recommendations']), styles['Heading2']))
+            story += [Paragraph(f"• {html.escape(item)}", styles['Normal']) for item in document['recommendations']]
+        buffer = io.BytesIO()
+        SimpleDocTemplate(buffer, pagesize=A4, title=document['title']).build(story)
+        return buffer.getvalue()
+
+
+_renderer = None
+
+
+def _init_worker(language):
+    """Worker process initializer: one renderer per process, reused for every task"""
+    global _renderer
+    _renderer = ReportRenderer(language)
+
+
+def _worker_context():
+    """Start method of the worker pool: a fork server preloaded with this module, else spawn"""
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['reports'])
+    return context
+
+
+def _render_task(kind, data, formats, renderer=None):
+    """Render one task into ``(arcname, bytes)`` pairs"""
+    renderer = renderer or _renderer
+    documents = renderer.student_documents(data) if kind == 'students' else [renderer.class_document(data)]
+    return [(f'{name}.{fmt}', renderer.render(document, fmt)) for name, document in documents for fmt in formats]
+
+
+def _row_schools(store):
+    """School name of every row, as (names, per-row index into names)"""
+    if not hasattr(store, 'partition_summary'):
+        return ['–'], np.zeros(store.rows, dtype=np.int32)
+    parts = store.partition_summary()
+    names = sorted({part['school'] for part in parts})
+    index = [names.index(part['school']) for part in parts]
+    return names, np.repeat(np.asarray(index, dtype=np.int32), [part['rows'] for part in parts])
+
+
+def _plan(store):
+    """Rows grouped by student (oldest first) and each student's latest row"""
+    student_ids = np.asarray(store.column('student_id'))
+    dates = np.asarray(store.column('assessment_date'))
+    rows = np.arange(len(student_ids))
+    order = np.lexsort((rows, dates, student_ids))
+    sorted_ids = student_ids[order]
+    starts = np.flatnonzero(np.append(True, sorted_ids[1:] != sorted_ids[:-1])) if len(order) else np.empty(0, int)
+    bounds = np.append(starts, len(order))
+    return order, bounds, order[bounds[1:] - 1]
+
+
+def _take(store, rows, columns):
+    return {name: np.asarray(store.column(name)[rows]) for name in columns}
+
+
+def _student_chunks(store, plan, school_names, row_school):
+    """Worker payloads of ``STUDENTS_PER_TASK`` students each"""
+    order, bounds, latest = plan
+    columns = ['grade', 'risk_level', 'assessment_date'] + SUBJECTS
+    for first in range(0, len(bounds) - 1, STUDENTS_PER_TASK):
+        last = min(first + STUDENTS_PER_TASK, len(bounds) - 1)
+        rows = order[bounds[first]:bounds[last]]
+        student_ids = store.column('student_id')[latest[first:last]]
+        data = _take(store, rows, columns)
+        data.update(
+            student_id=np.asarray(student_ids),
+            name=store.students.names(student_ids),
+            school=[school_names[i] for i in row_school[latest[first:last]]],
+            offsets=bounds[first:last + 1] - bounds[first]
+        )
+        yield 'students', data, last - first
+
+
+def _class_tasks(store, plan, school_names, row_school):
+    """Worker payloads of one class (a school's grade) each, from its students' latest rows"""
+    latest = plan[2]
+    classes = row_school[latest].astype(np.int64) * 256 + store.column('grade')[latest]
+    for key in np.unique(classes):
+        rows = latest[classes == key]
+        student_ids = store.column('student_id')[rows]
+        names = store.students.names(student_ids)
+        by_name = np.argsort(np.asarray(names, dtype=object), kind='stable')
+        rows = rows[by_name]
+        data = _take(store, rows, ['risk_level', 'assessment_date'] + SUBJECTS)
+        data.update(
+            name=[names[i] for i in by_name],
+            school=school_names[key // 256],
+            grade=int(key % 256)
+        )
+        yield 'class', data, 1
+
+
+def export_reports(path, store=None, formats=('html',), language='English', workers=REPORT_WORKERS,
+                   progress=None):
+    """Write student and class reports of a store or view into the zip at ``path``
+
+    ``progress`` is called with ``(reports_done, reports_total)`` after every
+    chunk; an exception it raises (e.g. a cancelled job) stops the export and
+    leaves no zip behind. ``workers=0`` renders in this process. Returns a
+    summary dict.
+    """
+    unknown = set(formats) - set(report_formats(language))
+    if unknown:
+        raise ValueError(f"unsupported report format(s) in {language}: {', '.join(sorted(unknown))}")
+    store = store or get_store()
+    started = time.perf_counter()
+    plan = _plan(store)
+    school_names, row_school = _row_schools(store)
+    students = len(plan[2])
+    class_keys = row_school[plan[2]].astype(np.int64) * 256 + store.column('grade')[plan[2]]
+    classes = len(np.unique(class_keys))
+    total = students + classes
+    tasks = (task for tasks in (_student_chunks(store, plan, school_names, row_school),
+                                _class_tasks(store, plan, school_names, row_school)) for task in tasks)
+
+    summary = {'students': students, 'classes': classes, 'files': 0, 'bytes': 0, 'seconds': 0.0}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    executor = None
+    try:
+        with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            if workers:
+                # Not forked from here: the app's server, script and job threads
+                # may hold locks that a forked child would inherit held
+                executor = ProcessPoolExecutor(workers, mp_context=_worker_context(), initializer=_init_worker,
+                                               initargs=(language,))
+                results = _bounded_map(executor, tasks, formats, window=workers * 2)
+            else:
+                renderer = ReportRenderer(language)
+                results = ((_render_task(kind, data, formats, renderer), units) for kind, data, units in tasks)
+            done = 0
+            for files, units in results:
+                for arcname, content in files:
+                    compress = zipfile.ZIP_STORED if arcname.rsplit('.', 1)[1] in COMPRESSED_FORMATS else zipfile.ZIP_DEFLATED
+                    archive.writestr(arcname, content, compress_type=compress)
+                    summary['files'] += 1
+                    summary['bytes'] += len(content)
+                done += units
+                if progress is not None:
+                    progress(done, total)
+        os.replace(tmp_path, path)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    summary['seconds'] = time.perf_counter() - started
+    return summary
+
+
+def _bounded_map(executor, tasks, formats, window):
+    """Render tasks in the pool, in order, with at most ``window`` in flight"""
+    pending = deque()
+    for kind, data, units in tasks:
+        pending.append((executor.submit(_render_task, kind, data, formats), units))
+        if len(pending) >= window:
+            future, units = pending.popleft()
+            yield future.result(), units
+    while pending:
+        future, units = pending.popleft()
+        yield future.result(), units
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate student and class reports into a zip file.")
+    parser.add_argument('-o', '--output', default='reports.zip')
+    parser.add_argument('--format', nargs='+', default=['html'], choices=REPORT_FORMATS)
+    parser.add_argument('--language', default='English', choices=list(TRANSLATIONS))
+    parser.add_argument('--region', action='append', help="limit to a region (repeatable)")
+    parser.add_argument('--school', action='append', help="limit to a school (repeatable)")
+    parser.add_argument('--term', action='append', help="limit to a term label, e.g. 2023-24 T3 (repeatable)")
+    parser.add_argument('--workers', type=int, default=REPORT_WORKERS, help="worker processes; 0 renders in-process")
+    args = parser.parse_args(argv)
+    unsupported = sorted(set(args.format) - set(report_formats(args.language)))
+    if unsupported:
+        parser.error(f"{', '.join(unsupported)} reports are not available in {args.language}")
+
+    view = get_store().view(regions=args.region, schools=args.school, terms=args.term)
+
+    def report(done, total):
+        print(f"\r{done:,}/{total:,} reports", end='', file=sys.stderr)
+
+    summary = export_reports(args.output, view, args.format, args.language, args.workers, progress=report)
+    print(file=sys.stderr)
+    print(f"{summary['students']:,} students and {summary['classes']:,} classes: {summary['files']:,} files "
+          f"({summary['bytes'] / 2**20:,.1f} MB) in {summary['seconds']:.1f}s -> {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
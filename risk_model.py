@@ -0,0 +1,155 @@
+"""Vectorized learning-risk scoring with the active model version
+
+The whole assessment matrix is scored in a single ``predict`` call. Model
+versions live under ``data/models`` (see ``model_registry``). Each one is
+loaded at most once per process, and every Streamlit session shares it.
+"""
+import os
+
+import numpy as np
+
+from assessment_store import DATA_DIR, MISSING_SCORE, NO_RISK, RISK_LEVELS, SUBJECTS
+
+MODEL_DIR = os.path.join(DATA_DIR, 'models')
+# Single model file written by earlier releases; imported as version 1
+MODEL_FILE = os.path.join(MODEL_DIR, 'risk_model.joblib')
+
+# Rows are scored in slices of this size when re-scoring a whole store
+SCORING_CHUNK_ROWS = 262144
+
+RECOMMENDATIONS = {
+    'Low': [
+        "Continue current learning approach",
+        "Provide enrichment activities",
+        "Monitor progress regularly",
+        "Encourage independent learning",
+        "Maintain engagement"
+    ],
+    'Medium': [
+        "Additional support recommended",
+        "Small group instruction",
+        "Regular progress monitoring",
+        "Parent-teacher collaboration",
+        "Targeted skill building",
+        "Use visual learning aids"
+    ],
+    'High': [
+        "Immediate intervention required",
+        "One-on-one tutoring recommended",
+        "Consult with learning specialist",
+        "Implement individualized learning plan",
+        "Regular progress monitoring",
+        "Family support engagement"
+    ]
+}
+
+def build_features(scores):
+    """Turn an ``(n, len(SUBJECTS))`` score matrix into model features
+
+    Missing scores are imputed with the student's own mean so that a missing
+    subject neither helps nor hurts. Rows with no scores at all come back in
+    the returned mask so callers can leave them unscored.
+    """
+    scores = np.asarray(scores)
+    present = scores != MISSING_SCORE
+    values = np.where(present, scores, 0).astype(np.float32)
+    counts = present.sum(axis=1)
+    scored = counts > 0
+    means = values.sum(axis=1) / np.maximum(counts, 1)
+    imputed = np.where(present, values, means[:, None])
+    minimums = np.where(present, values, np.float32(101)).min(axis=1)
+    minimums = np.where(scored, minimums, means)
+    features = np.column_stack([imputed, means, minimums]).astype(np.float32)
+    return features, scored
+
+
+def bootstrap_training_set(rows=20000, seed=7):
+    """Synthetic, rule-labelled scores used until enough teacher labels exist
+
+    A student is Low risk with a mean of 80+ and no subject under 60, High
+    risk with a mean under 65 or any subject under 40, and Medium otherwise.
+    """
+    rng = np.random.default_rng(seed)
+    ability = rng.normal(74, 12, size=(rows, 1))
+    scores = np.clip(np.round(ability + rng.normal(0, 8, size=(rows, len(SUBJECTS)))), 0, 100)
+    scores = scores.astype(np.uint8)
+    scores[rng.random(scores.shape) < 0.15] = MISSING_SCORE
+    features, scored = build_features(scores)
+    features, means, minimums = features[scored], features[scored, -2], features[scored, -1]
+    labels = np.full(len(features), RISK_LEVELS.index('Medium'), dtype=np.int8)
+    labels[(means >= 80) & (minimums >= 60)] = RISK_LEVELS.index('Low')
+    labels[(means < 65) | (minimums < 40)] = RISK_LEVELS.index('High')
+    return features, labels
+
+
+def get_model():
+    """The active model version, created on first use"""
+    from model_registry import get_registry
+
+    return get_registry().model()
+
+
+def score_rows(scores):
+    """Risk codes of a score matrix and the model version that produced them"""
+    model = get_model()
+    features, scored = build_features(scores)
+    codes = np.full(len(features), NO_RISK, dtype=np.int8)
+    if scored.any():
+        codes[scored] = model.predict(features[scored])
+    return codes, model.version
+
+
+def score_matrix(scores):
+    """Risk code (index into ``RISK_LEVELS``) for every row of a score matrix"""
+    return score_rows(scores)[0]
+
+
+def recommendations_for_codes(codes):
+    """Recommendation lists for an array of risk codes, looked up in bulk"""
+    table = np.empty(len(RISK_LEVELS) + 1, dtype=object)
+    for i, level in enumerate(RISK_LEVELS):
+        table[i] = RECOMMENDATIONS[level]
+    table[-1] = []
+    codes = np.asarray(codes, dtype=np.int64)
+    # NO_RISK (-1) lands on the trailing empty list
+    return table[codes]
+
+
+def score_frame(frame):
+    """Add ``risk_level`` and ``recommendations`` columns to a frame of scores"""
+    import pandas as pd
+
+    scores = np.column_stack([
+        pd.to_numeric(frame[subject], errors='coerce').clip(0, 100).round().fillna(MISSING_SCORE).to_numpy(np.uint8)
+        if subject in frame else np.full(len(frame), MISSING_SCORE, dtype=np.uint8)
+        for subject in SUBJECTS
+    ])
+    codes = score_matrix(scores)
+    scored = frame.copy()
+    scored['risk_level'] = pd.Categorical.from_codes(codes, categories=RISK_LEVELS)
+    scored['recommendations'] = recommendations_for_codes(codes)
+    return scored
+
+
+def rescore_store(store, start=0, stop=None, progress=None, stale_only=False):
+    """Re-score rows ``[start, stop)`` of an assessment store in place
+
+    With ``stale_only`` only chunks holding rows scored by another model
+    version are rewritten; returns the number of rows re-scored.
+    ``progress`` is called after every chunk with the number of rows covered
+    so far.
+    """
+    stop = store.rows if stop is None else stop
+    rescored = 0
+    for chunk_start in range(start, stop, SCORING_CHUNK_ROWS):
+        chunk_stop = min(chunk_start + SCORING_CHUNK_ROWS, stop)
+        version = get_model().version
+        if not stale_only or np.any(store.column('model_version')[chunk_start:chunk_stop] != version):
+            scores = np.column_stack([store.column(subject)[chunk_start:chunk_stop] for subject in SUBJECTS])
+            codes, version = score_rows(scores)
+            store.write_column('risk_level', chunk_start, codes)
+            store.write_column('model_version', chunk_start, np.full(len(codes), version, dtype='<i2'))
+            rescored += len(codes)
+        if progress is not None:
+            progress(chunk_stop - start)
+    return rescored
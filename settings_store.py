@@ -0,0 +1,124 @@
+"""Process-wide cache for ``data/app_settings.json``
+
+Streamlit re-executes ``app.py`` from the top on every rerun, so anything that
+should outlive a single rerun has to live in an imported module like this one.
+The cached copy is revalidated with an ``os.stat`` only after the ``settings``
+data version moved, and the file is parsed again only when its mtime or size
+changed.
+"""
+import json
+import logging
+import os
+import threading
+
+from atomic_io import write_json_atomic
+from data_version import bump, data_version, watcher
+from instrumentation import register_collector, timed
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.environ.get('EDUSCAN_DATA_DIR', 'data')
+SETTINGS_FILE = os.path.join(DATA_DIR, 'app_settings.json')
+
+VALID_THEMES = ['Modern', 'Classic', 'Dark']
+DEFAULT_SETTINGS = {
+    'language': 'English',
+    'theme': 'Modern',
+    'offline_mode': False
+}
+
+# Counters surfaced for diagnostics: a hit is a load served from memory, a
+# miss is a load that had to read the file
+SETTINGS_STATS = {
+    'hits': 0,
+    'misses': 0,
+    'parse_failures': 0,
+    'writes': 0,
+    'write_failures': 0
+}
+
+_lock = threading.Lock()
+_cached_stat = None
+_cached_settings = None
+_cached_version = None
+
+# Edits made to the file by hand are noticed too
+watcher.watch('settings', SETTINGS_FILE)
+
+
+def _file_signature(path):
+    """Return ``(mtime_ns, size)`` for ``path`` or None when it is missing"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_settings(path):
+    """Parse and validate the settings file, falling back to defaults"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+        if not isinstance(settings, dict):
+            raise ValueError('settings file does not contain a JSON object')
+    except (OSError, ValueError) as exc:
+        SETTINGS_STATS['parse_failures'] += 1
+        logger.warning("Could not read %s, using default settings: %s", path, exc)
+        return dict(DEFAULT_SETTINGS)
+    # Validate theme setting
+    if settings.get('theme') not in VALID_THEMES:
+        settings['theme'] = 'Modern'
+    return settings
+
+
+@timed('settings.load')
+def load_settings(path=SETTINGS_FILE):
+    """Return a copy of the current settings, re-reading the file only when it changed"""
+    global _cached_stat, _cached_settings, _cached_version
+    version = data_version('settings')
+    with _lock:
+        if _cached_settings is not None and path == SETTINGS_FILE and version == _cached_version:
+            SETTINGS_STATS['hits'] += 1
+            return dict(_cached_settings)
+    signature = _file_signature(path)
+    with _lock:
+        if _cached_settings is not None and signature == _cached_stat:
+            SETTINGS_STATS['hits'] += 1
+            _cached_version = version
+            return dict(_cached_settings)
+        SETTINGS_STATS['misses'] += 1
+        settings = dict(DEFAULT_SETTINGS) if signature is None else _read_settings(path)
+        _cached_stat = signature
+        _cached_settings = settings
+        _cached_version = version
+        return dict(settings)
+
+
+@timed('settings.save')
+def save_settings(settings, path=SETTINGS_FILE):
+    """Atomically replace the settings file; returns False if the write failed"""
+    global _cached_stat, _cached_settings
+    with _lock:
+        try:
+            write_json_atomic(path, settings)
+        except OSError as exc:
+            SETTINGS_STATS['write_failures'] += 1
+            logger.error("Could not save settings to %s: %s", path, exc)
+            return False
+        SETTINGS_STATS['writes'] += 1
+        _cached_stat = _file_signature(path)
+        _cached_settings = dict(settings)
+    bump('settings')
+    return True
+
+
+def settings_cache_stats():
+    """Snapshot of the cache counters plus the hit rate"""
+    stats = dict(SETTINGS_STATS)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+
+register_collector('settings_cache', settings_cache_stats)
@@ -0,0 +1,160 @@
+"""Lazy imports and a cold-start time budget
+
+Render's free plan puts the service to sleep, so the first request after a
+wake-up pays for every import and one-off initialization. Heavy modules are
+therefore imported through ``lazy_import`` on the pages that need them, and
+one-off work is wrapped in ``startup_phase``. Both record how long they took
+the first time, which gives a time-to-first-render breakdown.
+
+Set ``EDUSCAN_PROFILE_STARTUP=1`` to print that breakdown to stderr and show
+it under the first rendered page, or run ``python startup_profile.py`` to
+measure a cold start of ``app.py`` in a fresh process. A first render slower
+than ``EDUSCAN_STARTUP_BUDGET_S`` seconds is always logged as a warning.
+"""
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ENABLED = os.environ.get('EDUSCAN_PROFILE_STARTUP', '').lower() in ('1', 'true', 'yes')
+STARTUP_BUDGET_S = float(os.environ.get('EDUSCAN_STARTUP_BUDGET_S', '5.0'))
+
+_MODULE_LOADED_AT = time.time()
+
+_lock = threading.Lock()
+# First imports run one at a time: sessions and background jobs importing
+# pandas and plotly concurrently can otherwise see a half-initialized module
+_import_lock = threading.RLock()
+_imported = set()
+_phases = []
+_recorded = set()
+_first_render_s = None
+
+
+def _process_start_time():
+    """Wall-clock time this process started, falling back to this module's import"""
+    try:
+        with open('/proc/self/stat', 'r') as f:
+            # The command name can contain spaces, so split after its ')'
+            fields = f.read().rsplit(')', 1)[1].split()
+        start_ticks = int(fields[19])
+        with open('/proc/stat', 'r') as f:
+            boot_time = next(int(line.split()[1]) for line in f if line.startswith('btime'))
+        return boot_time + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, StopIteration, AttributeError):
+        return _MODULE_LOADED_AT
+
+
+PROCESS_STARTED_AT = _process_start_time()
+
+
+def _record(name, seconds):
+    with _lock:
+        if name not in _recorded:
+            _recorded.add(name)
+            _phases.append((name, seconds))
+
+
+def lazy_import(name):
+    """Import ``name`` on first use, recording how long the first import took"""
+    if name in _imported:
+        return sys.modules[name]
+    with _import_lock:
+        module = sys.modules.get(name)
+        if module is None:
+            started = time.perf_counter()
+            module = importlib.import_module(name)
+            _record(f'import {name}', time.perf_counter() - started)
+        _imported.add(name)
+        return module
+
+
+@contextmanager
+def startup_phase(name):
+    """Time a block of one-off initialization; only the first run is recorded"""
+    if name in _recorded:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(f'init {name}', time.perf_counter() - started)
+
+
+def mark_first_render():
+    """Record time-to-first-render once per process; True the first time"""
+    global _first_render_s
+    with _lock:
+        if _first_render_s is not None:
+            return False
+        _first_render_s = time.time() - PROCESS_STARTED_AT
+    if _first_render_s > STARTUP_BUDGET_S:
+        logger.warning(
+            "First render took %.2fs, over the %.2fs cold-start budget", _first_render_s, STARTUP_BUDGET_S
+        )
+    if PROFILE_ENABLED:
+        print(format_report(), file=sys.stderr)
+    return True
+
+
+def startup_report():
+    """Breakdown of the cold start as a dict"""
+    with _lock:
+        phases = list(_phases)
+    return {
+        'time_to_first_render_s': _first_render_s,
+        'budget_s': STARTUP_BUDGET_S,
+        'within_budget': _first_render_s is not None and _first_render_s <= STARTUP_BUDGET_S,
+        'phases': [{'phase': name, 'seconds': round(seconds, 4)} for name, seconds in phases]
+    }
+
+
+def format_report():
+    """Plain-text version of ``startup_report`` for logs and the CLI"""
+    report = startup_report()
+    lines = ["Startup profile"]
+    for phase in sorted(report['phases'], key=lambda p: -p['seconds']):
+        lines.append(f"  {phase['seconds']:8.3f}s  {phase['phase']}")
+    if report['time_to_first_render_s'] is not None:
+        status = 'within' if report['within_budget'] else 'OVER'
+        lines.append(
+            f"  {report['time_to_first_render_s']:8.3f}s  time to first render "
+            f"({status} {report['budget_s']:.2f}s budget)"
+        )
+    return '\n'.join(lines)
+
+
+def main():
+    """Cold-start ``app.py`` headlessly in this fresh process and print the profile"""
+    import argparse
+
+    global STARTUP_BUDGET_S, PROFILE_ENABLED
+    parser = argparse.ArgumentParser(description="Measure the cold start of the EduScan app")
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET_S, help="seconds allowed for the first render")
+    parser.add_argument('--page', default='dashboard', help="page to render first")
+    args = parser.parse_args()
+    STARTUP_BUDGET_S = args.budget
+    PROFILE_ENABLED = False
+
+    # The app imports this module by name; make sure it shares our state
+    sys.modules.setdefault('startup_profile', sys.modules[__name__])
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    harness_s = time.perf_counter() - started
+
+    app = AppTest.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py'), default_timeout=120)
+    app.session_state['current_page'] = args.page
+    app.run()
+    print(format_report())
+    print(f"  ({harness_s:.3f}s of that was loading the Streamlit test harness)")
+    return 0 if startup_report()['within_budget'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
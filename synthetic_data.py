@@ -0,0 +1,514 @@
+"""Deterministic synthetic Somali school data for load and scale testing
+
+Generates students and assessments straight into the partitioned store's
+on-disk format, without going through CSV or the importer:
+
+* names are a given name plus father's and grandfather's names (and
+  great-grandfather's when more students are asked for than three-part
+  names can cover). They are drawn from common Somali names and spelled in
+  Somali orthography (Maxamed Cabdi), in anglicized form (Mohamed Abdi) or
+  in Arabic script (محمد عبدي). Every student's name is unique.
+* schools are spread over the Somaliland regions with skewed sizes, and
+  enrolment thins out in the higher grades
+* each student has one latent ability plus per-subject strengths and a
+  yearly trend, so subject scores are correlated and some students decline
+* assessments fall in the exam weeks of each term of the last ``years``
+  academic years, and a student moves up one grade per year
+* ``risk_mix`` sets the share of Low, Medium and High ability students.
+  A ``label_rate`` share of rows carries a teacher's risk label, and the
+  displayed risk level is scored by the active model as usual.
+
+Students are generated in blocks of ``STUDENTS_PER_TASK`` on a pool of
+worker processes started from a preloaded fork server. The parent registers each block's names and
+appends its rows to their partitions while later blocks are being
+generated. Each block draws from its own random stream derived from
+``seed``, so the same arguments give the same data for any number of
+workers. The target data directory must not hold any students yet::
+
+    EDUSCAN_DATA_DIR=/tmp/eduscan-10m python synthetic_data.py --rows 10000000 --students 1000000
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+
+from assessment_store import COLUMNS, EPOCH, MAX_GRADE, MISSING_SCORE, NO_RISK, RISK_LEVELS, STORE_DIR, SUBJECTS
+from partitions import PartitionedStore, term_label
+
+GENERATOR_WORKERS = max(int(os.environ.get('EDUSCAN_GENERATOR_WORKERS', '0') or 0), 0) or os.cpu_count() or 1
+
+# Students generated per worker task; tasks in flight are capped at twice the workers
+STUDENTS_PER_TASK = 20000
+
+# Buffered rows of one partition are appended once there are this many, and
+# every partition is flushed once this many rows are buffered overall
+PARTITION_FLUSH_ROWS = 50000
+BUFFER_ROWS = 5000000
+
+DEFAULT_RISK_MIX = (0.6, 0.3, 0.1)
+DEFAULT_SCRIPT_MIX = (0.6, 0.3, 0.1)
+SCRIPTS = ('somali', 'anglicized', 'arabic')
+
+# (Somali orthography, anglicized, Arabic script)
+MALE_NAMES = [
+    ('Maxamed', 'Mohamed', 'محمد'), ('Axmed', 'Ahmed', 'أحمد'), ('Cali', 'Ali', 'علي'),
+    ('Cabdi', 'Abdi', 'عبدي'), ('Cabdullaahi', 'Abdullahi', 'عبد الله'), ('Cabdiraxmaan', 'Abdirahman', 'عبد الرحمن'),
+    ('Cabdirisaaq', 'Abdirizak', 'عبد الرزاق'), ('Cabdiqaadir', 'Abdikadir', 'عبد القادر'),
+    ('Cabdiwali', 'Abdiwali', 'عبد الولي'), ('Cabdisalaan', 'Abdisalan', 'عبد السلام'),
+    ('Cabdinaasir', 'Abdinasir', 'عبد الناصر'), ('Cabdikariim', 'Abdikarim', 'عبد الكريم'),
+    ('Xasan', 'Hassan', 'حسن'), ('Xuseen', 'Hussein', 'حسين'), ('Ibraahim', 'Ibrahim', 'إبراهيم'),
+    ('Ismaaciil', 'Ismail', 'إسماعيل'), ('Yuusuf', 'Yusuf', 'يوسف'), ('Cismaan', 'Osman', 'عثمان'),
+    ('Cumar', 'Omar', 'عمر'), ('Khaalid', 'Khalid', 'خالد'), ('Mahad', 'Mahad', 'مهد'),
+    ('Faarax', 'Farah', 'فارح'), ('Jaamac', 'Jama', 'جامع'), ('Warsame', 'Warsame', 'ورسمي'),
+    ('Guuleed', 'Guled', 'غوليد'), ('Daahir', 'Dahir', 'ظاهر'), ('Saciid', 'Said', 'سعيد'),
+    ('Muuse', 'Musa', 'موسى'), ('Aadan', 'Adan', 'آدم'), ('Nuur', 'Nur', 'نور'),
+    ('Bashiir', 'Bashir', 'بشير'), ('Shariif', 'Sharif', 'شريف'), ('Xamza', 'Hamza', 'حمزة'),
+    ('Bilaal', 'Bilal', 'بلال'), ('Sulaymaan', 'Suleiman', 'سليمان'), ('Daa\'uud', 'Daud', 'داود'),
+    ('Idiris', 'Idris', 'إدريس'), ('Ilyaas', 'Ilyas', 'إلياس'), ('Yaasiin', 'Yasin', 'ياسين'),
+    ('Zakariye', 'Zakaria', 'زكريا'), ('Mukhtaar', 'Mukhtar', 'مختار'), ('Mustafe', 'Mustafa', 'مصطفى'),
+    ('Abshir', 'Abshir', 'أبشر'), ('Abuukar', 'Abukar', 'أبوبكر'), ('Liibaan', 'Liban', 'ليبان'),
+    ('Roble', 'Roble', 'روبلي'), ('Samatar', 'Samatar', 'سمتر'), ('Shire', 'Shire', 'شيري'),
+    ('Geedi', 'Gedi', 'غيدي'), ('Qaasim', 'Qasim', 'قاسم'), ('Raage', 'Rage', 'راغي'),
+    ('Sahal', 'Sahal', 'سهل'), ('Sharmaarke', 'Sharmarke', 'شرماركي'), ('Cawad', 'Awad', 'عوض'),
+    ('Diiriye', 'Dirie', 'ديريه'), ('Cilmi', 'Elmi', 'علمي'), ('Xirsi', 'Hirsi', 'حرسي'),
+    ('Jibriil', 'Jibril', 'جبريل'), ('Kaahin', 'Kahin', 'كاهن'), ('Maxamuud', 'Mahmoud', 'محمود'),
+    ('Mahdi', 'Mahdi', 'مهدي'), ('Naasir', 'Nasir', 'ناصر'), ('Raashid', 'Rashid', 'راشد'),
+    ('Waliid', 'Walid', 'وليد'), ('Yaxye', 'Yahya', 'يحيى'), ('Saalax', 'Salah', 'صالح'),
+    ('Xaashi', 'Hashi', 'هاشي'), ('Fu\'aad', 'Fuad', 'فؤاد'), ('Guutaale', 'Gutale', 'غوتالي'),
+    ('Barkhad', 'Barkhad', 'بركد'),
+]
+FEMALE_NAMES = [
+    ('Faadumo', 'Fadumo', 'فاطمة'), ('Caasha', 'Asha', 'عائشة'), ('Xaliimo', 'Halima', 'حليمة'),
+    ('Khadiija', 'Khadija', 'خديجة'), ('Maryan', 'Maryan', 'مريم'), ('Sahra', 'Sahra', 'زهراء'),
+    ('Hodan', 'Hodan', 'هودن'), ('Nimco', 'Nimo', 'نعمة'), ('Ifraax', 'Ifrah', 'إفراح'),
+    ('Ayaan', 'Ayan', 'أيان'), ('Hibo', 'Hibo', 'هبة'), ('Hamdi', 'Hamdi', 'حمدي'),
+    ('Aamina', 'Amina', 'آمنة'), ('Sucaad', 'Suad', 'سعاد'), ('Sagal', 'Sagal', 'ساغال'),
+    ('Ubax', 'Ubah', 'أوباح'), ('Deeqa', 'Deka', 'ديقة'), ('Filsan', 'Filsan', 'فلسان'),
+    ('Idil', 'Idil', 'إديل'), ('Muna', 'Muna', 'منى'), ('Nasra', 'Nasra', 'نصرة'),
+    ('Qamar', 'Qamar', 'قمر'), ('Saynab', 'Zeinab', 'زينب'), ('Shukri', 'Shukri', 'شكري'),
+    ('Sumaya', 'Sumaya', 'سمية'), ('Xaawo', 'Hawa', 'حواء'), ('Laylo', 'Leila', 'ليلى'),
+    ('Warsan', 'Warsan', 'ورسن'), ('Yasmiin', 'Yasmin', 'ياسمين'), ('Najma', 'Najma', 'نجمة'),
+    ('Hinda', 'Hinda', 'هند'), ('Kowsar', 'Kawsar', 'كوثر'), ('Fartuun', 'Fartun', 'فرتون'),
+    ('Raxmo', 'Rahma', 'رحمة'), ('Samiira', 'Samira', 'سميرة'), ('Nuura', 'Nura', 'نورة'),
+    ('Safiyo', 'Safia', 'صفية'), ('Jamiila', 'Jamila', 'جميلة'), ('Salmo', 'Salma', 'سلمى'),
+    ('Mulki', 'Mulki', 'ملكي'), ('Nasteexo', 'Nasteho', 'نستيهو'), ('Ruqiyo', 'Ruqia', 'رقية'),
+    ('Aniisa', 'Anisa', 'أنيسة'), ('Iqra', 'Iqra', 'إقرأ'), ('Bilan', 'Bilan', 'بيلان'),
+    ('Dahabo', 'Dahabo', 'ذهبو'), ('Marwo', 'Marwo', 'مروة'), ('Sabriin', 'Sabrin', 'صابرين'),
+]
+
+# Region: (share of schools, towns)
+REGIONS = {
+    'Maroodi Jeex': (0.30, ['Hargeysa', 'Salaxlay', 'Faraweyne']),
+    'Awdal': (0.14, ['Boorama', 'Baki', 'Lughaya', 'Saylac']),
+    'Togdheer': (0.18, ['Burco', 'Oodweyne', 'Sheekh']),
+    'Saaxil': (0.10, ['Berbera', 'Mandheera']),
+    'Sanaag': (0.09, ['Ceerigaabo', 'Badhan', 'Ceel Afweyn']),
+    'Sool': (0.08, ['Laascaanood', 'Caynabo']),
+    'Gabiley': (0.11, ['Gabiley', 'Arabsiyo', 'Kalabaydh']),
+}
+SCHOOL_KINDS = ['Primary', 'Primary', 'Intermediate', 'Secondary', 'Community School', 'Model School']
+SCHOOL_PATRONS = ['Sheikh Bashir', 'Al-Nuur', 'Imam Shafici', 'Sheikh Ali Jowhar', 'Faarax Oomaar',
+                  'Al-Huda', 'Cabdi Bile', 'Ahmed Guray', 'Al-Hidaya', 'Sheikh Madar']
+
+# Enrolment share of each grade falls by this factor per grade
+GRADE_RETENTION = 0.93
+
+# Latent ability (mean, standard deviation) and yearly trend of Low, Medium
+# and High risk students, in score points
+ABILITY = [(86.0, 3.5), (72.0, 3.5), (55.0, 7.0)]
+TREND = [(0.5, 2.0), (-0.5, 3.0), (-3.0, 3.0)]
+SUBJECT_DIFFICULTY = np.array([-3.0, 2.0, -1.0, 0.0, 1.0])
+SUBJECT_STRENGTH_SD = 4.0
+SCORE_NOISE_SD = 4.0
+
+# Any subject but math is skipped this often; social studies starts in grade 4
+MISSING_RATE = 0.03
+SOCIAL_STUDIES_FROM_GRADE = 4
+
+# Share of teacher labels that disagree with the student's band
+LABEL_NOISE = 0.1
+
+# Assessments fall in each term's exam weeks: (month, day) of the first day and the length in days
+EXAM_WEEKS = {1: ((11, 15), 40), 2: ((3, 20), 40), 3: ((5, 25), 35)}
+
+
+def _check_names():
+    """Names stay unique only if no spelling, in any script, stands for two different names"""
+    owners = {}
+    for i, spellings in enumerate(MALE_NAMES + FEMALE_NAMES):
+        for spelling in spellings:
+            if owners.setdefault(spelling.casefold(), i) != i:
+                raise ValueError(f"the spelling {spelling!r} is used for two names")
+
+
+_check_names()
+
+
+def name_parts(students):
+    """Number of name parts needed to give ``students`` students distinct names"""
+    given, patronymics = len(MALE_NAMES) + len(FEMALE_NAMES), len(MALE_NAMES)
+    parts = 3
+    while given * patronymics ** (parts - 1) < students:
+        parts += 1
+    return parts
+
+
+def _multiplier(space, seed):
+    """An odd multiplier coprime with ``space``, so ``id * multiplier + offset`` visits every name once"""
+    multiplier = (0x9E3779B97F4A7C15 ^ (seed * 0x632BE59BD9B4E019)) % space | 1
+    while math.gcd(multiplier, space) != 1:
+        multiplier += 2
+    return multiplier
+
+
+def _student_names(student_ids, scripts, plan):
+    """Distinct names of the given students; girls' and boys' given names come from their own lists"""
+    given, patronymics = len(MALE_NAMES) + len(FEMALE_NAMES), len(MALE_NAMES)
+    codes = (student_ids.astype(object) * plan['name_multiplier'] + plan['name_offset']) % plan['name_space']
+    codes = codes.astype(np.int64)
+    tables = [
+        [spellings[script] for spellings in MALE_NAMES + FEMALE_NAMES] for script in range(len(SCRIPTS))
+    ]
+    parts = [codes % given]
+    codes = codes // given
+    for _ in range(plan['name_parts'] - 1):
+        parts.append(codes % patronymics)
+        codes = codes // patronymics
+    names = []
+    for i, script in enumerate(scripts):
+        table = tables[script]
+        names.append(' '.join(table[part[i]] for part in parts))
+    return names
+
+
+def _exam_windows(years, end):
+    """First day, length and term code of every exam window of the last ``years`` academic years up to ``end``"""
+    end_day = (end - EPOCH).days
+    last_year = end.year if end.month >= 9 else end.year - 1
+    windows = []
+    start_year = last_year
+    # Early in a school year there may be no exams yet; that year does not count
+    while len({window[0] for window in windows}) < years:
+        for term, ((month, day), length) in EXAM_WEEKS.items():
+            year = start_year if term == 1 else start_year + 1
+            first = (date(year, month, day) - EPOCH).days
+            length = min(length, end_day + 1 - first)
+            if length > 0:
+                windows.append((start_year, first, length, start_year * 10 + term))
+        start_year -= 1
+    windows.sort()
+    start_years = sorted({window[0] for window in windows})
+    year_index = np.array([start_years.index(window[0]) for window in windows])
+    # First window of each academic year, plus an end marker
+    year_starts = np.searchsorted(year_index, np.arange(len(start_years) + 1))
+    return {
+        'first_day': np.array([w[1] for w in windows], dtype=np.int64),
+        'length': np.array([w[2] for w in windows], dtype=np.int64),
+        'term': np.array([w[3] for w in windows], dtype=np.int64),
+        'year_index': year_index,
+        'year_starts': year_starts,
+        'years': len(start_years),
+    }
+
+
+def _schools(count, rng):
+    """``count`` distinct (region, school) pairs and their shares of the students"""
+    regions = list(REGIONS)
+    shares = np.array([REGIONS[region][0] for region in regions])
+    seen, schools = set(), []
+    attempts = 0
+    while len(schools) < count:
+        attempts += 1
+        if attempts > count * 100:
+            raise ValueError(f"cannot name {count} distinct schools")
+        region = regions[rng.choice(len(regions), p=shares / shares.sum())]
+        town = REGIONS[region][1][rng.integers(len(REGIONS[region][1]))]
+        kind = SCHOOL_KINDS[rng.integers(len(SCHOOL_KINDS))]
+        name = f"{town} {kind}"
+        if name in seen or rng.random() < 0.5:
+            name = f"{town} {SCHOOL_PATRONS[rng.integers(len(SCHOOL_PATRONS))]} {kind}"
+        if name in seen:
+            continue
+        seen.add(name)
+        schools.append((region, name))
+    sizes = rng.lognormal(0.0, 0.6, count)
+    return schools, sizes / sizes.sum()
+
+
+def plan_dataset(rows, students=None, seed=0, years=3, end=None, schools=100, risk_mix=DEFAULT_RISK_MIX,
+                 label_rate=0.1, script_mix=DEFAULT_SCRIPT_MIX):
+    """Everything the workers share: sizes, schools, exam windows and name encoding"""
+    students = students or max(rows // 10, 1)
+    if years < 1:
+        raise ValueError("years must be at least 1")
+    if rows < students:
+        raise ValueError("every student needs at least one assessment: rows must be >= students")
+    if len(risk_mix) != len(RISK_LEVELS) or min(risk_mix) < 0 or sum(risk_mix) <= 0:
+        raise ValueError(f"risk mix needs {len(RISK_LEVELS)} non-negative shares")
+    if len(script_mix) != len(SCRIPTS) or min(script_mix) < 0 or sum(script_mix) <= 0:
+        raise ValueError(f"script mix needs {len(SCRIPTS)} non-negative shares")
+    rng = np.random.default_rng([seed, 0])
+    school_names, school_shares = _schools(schools, rng)
+    parts = name_parts(students)
+    space = (len(MALE_NAMES) + len(FEMALE_NAMES)) * len(MALE_NAMES) ** (parts - 1)
+    windows = _exam_windows(years, end or date.today())
+    # A student may start below grade 1 or leave after grade 12 within the span.
+    # Weighting by years in school keeps the rows of each grade on the retention curve.
+    first_grades = np.arange(2 - windows['years'], MAX_GRADE + 1)
+    years_in_school = np.minimum(windows['years'] - 1, MAX_GRADE - first_grades) - np.maximum(0, 1 - first_grades) + 1
+    grade_shares = GRADE_RETENTION ** (np.clip(first_grades, 1, MAX_GRADE) - 1) * years_in_school
+    return {
+        'rows': rows,
+        'students': students,
+        'seed': seed,
+        'schools': school_names,
+        'school_shares': school_shares,
+        'windows': windows,
+        'first_grades': first_grades,
+        'grade_shares': grade_shares / grade_shares.sum(),
+        'risk_mix': np.asarray(risk_mix, dtype=float) / sum(risk_mix),
+        'script_mix': np.asarray(script_mix, dtype=float) / sum(script_mix),
+        'label_rate': label_rate,
+        'name_parts': parts,
+        'name_space': space,
+        'name_multiplier': _multiplier(space, seed),
+        'name_offset': int(np.random.default_rng([seed, 1]).integers(space)),
+    }
+
+
+def generate_block(plan, block):
+    """Names and encoded rows of one block of students
+
+    Rows come back grouped by student, with ``student_id`` numbered from the
+    plan's first student, plus each row's school index and term code.
+    """
+    from risk_model import score_rows
+
+    first = block * STUDENTS_PER_TASK
+    ids = np.arange(first, min(first + STUDENTS_PER_TASK, plan['students']), dtype=np.int64)
+    count = len(ids)
+    rng = np.random.default_rng([plan['seed'], 2, block])
+    windows = plan['windows']
+
+    scripts = rng.choice(len(SCRIPTS), count, p=plan['script_mix'])
+    names = _student_names(ids, scripts, plan)
+    school = rng.choice(len(plan['schools']), count, p=plan['school_shares']).astype(np.int32)
+    band = rng.choice(len(RISK_LEVELS), count, p=plan['risk_mix'])
+    ability_mean = np.array([mean for mean, _ in ABILITY])[band]
+    ability_sd = np.array([sd for _, sd in ABILITY])[band]
+    ability = rng.normal(ability_mean, ability_sd)
+    trend = rng.normal(np.array([mean for mean, _ in TREND])[band], np.array([sd for _, sd in TREND])[band])
+    strengths = rng.normal(0, SUBJECT_STRENGTH_SD, (count, len(SUBJECTS))) + SUBJECT_DIFFICULTY
+    first_grade = plan['first_grades'][rng.choice(len(plan['first_grades']), count, p=plan['grade_shares'])]
+
+    # Every student sits rows // students assessments, the first few one more
+    per_student, extra = divmod(plan['rows'], plan['students'])
+    assessments = per_student + (ids < extra)
+    row_student = np.repeat(np.arange(count), assessments)
+    n = len(row_student)
+
+    # Only the academic years in which the student is in grades 1-12
+    low_year = np.clip(1 - first_grade, 0, windows['years'] - 1)
+    high_year = np.clip(MAX_GRADE - first_grade, 0, windows['years'] - 1)
+    low_window = windows['year_starts'][low_year][row_student]
+    high_window = windows['year_starts'][high_year + 1][row_student]
+    window = low_window + (rng.random(n) * (high_window - low_window)).astype(np.int64)
+    days = windows['first_day'][window] + (rng.random(n) * windows['length'][window]).astype(np.int64)
+    year = windows['year_index'][window]
+    grades = np.clip(first_grade[row_student] + year, 1, MAX_GRADE)
+
+    elapsed = (days - windows['first_day'][0]) / 365.25
+    scores = (ability[row_student, None] + strengths[row_student] + (trend[row_student] * elapsed)[:, None]
+              + rng.normal(0, SCORE_NOISE_SD, (n, len(SUBJECTS))))
+    scores = np.clip(np.round(scores), 0, 100).astype(np.uint8)
+    missing = rng.random((n, len(SUBJECTS))) < MISSING_RATE
+    missing[:, SUBJECTS.index('math')] = False
+    missing[:, SUBJECTS.index('social_studies')] |= grades < SOCIAL_STUDIES_FROM_GRADE
+    scores[missing] = MISSING_SCORE
+
+    labels = np.full(n, NO_RISK, dtype=np.int8)
+    labelled = rng.random(n) < plan['label_rate']
+    labels[labelled] = band[row_student[labelled]]
+    noisy = labelled & (rng.random(n) < LABEL_NOISE)
+    labels[noisy] = rng.integers(0, len(RISK_LEVELS), int(noisy.sum()))
+
+    risk, model_version = score_rows(scores)
+    columns = {
+        'student_id': ids[row_student].astype(COLUMNS['student_id']),
+        'grade': grades.astype(COLUMNS['grade']),
+        'risk_level': risk.astype(COLUMNS['risk_level']),
+        'risk_label': labels,
+        'model_version': np.full(n, model_version, dtype=COLUMNS['model_version']),
+        'assessment_date': days.astype(COLUMNS['assessment_date']),
+    }
+    for i, subject in enumerate(SUBJECTS):
+        columns[subject] = scores[:, i]
+    return names, columns, school[row_student], windows['term'][window]
+
+
+class _PartitionWriter:
+    """Buffers generated rows per partition and appends them in large batches"""
+
+    def __init__(self, store, plan):
+        self.store = store
+        self.plan = plan
+        self.buffers = {}
+        self.buffered = 0
+        self.entries = {}
+        self.appended = 0
+
+    def add(self, columns, schools, terms):
+        keys = schools.astype(np.int64) * 1000000 + terms
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        for rows in np.split(order, bounds):
+            key = (int(schools[rows[0]]), int(terms[rows[0]]))
+            parts = self.buffers.setdefault(key, [])
+            parts.append({name: values[rows] for name, values in columns.items()})
+            size = sum(len(part['student_id']) for part in parts)
+            self.buffered += len(rows)
+            if size >= PARTITION_FLUSH_ROWS:
+                self._flush(key)
+        if self.buffered >= BUFFER_ROWS:
+            self.flush()
+
+    def _entries(self, keys):
+        missing = [key for key in keys if key not in self.entries]
+        if missing:
+            labels = [(*self.plan['schools'][school], term_label(term)) for school, term in missing]
+            self.entries.update(zip(missing, self.store.ensure_partitions(labels)))
+
+    def _flush(self, key):
+        parts = self.buffers.pop(key, None)
+        if not parts:
+            return
+        self._entries([key])
+        columns = {name: np.concatenate([part[name] for part in parts]) for name in COLUMNS}
+        self.store.partition_store(self.entries[key]).append_columns(columns)
+        rows = len(columns['student_id'])
+        self.buffered -= rows
+        self.appended += rows
+
+    def flush(self):
+        self._entries(list(self.buffers))
+        for key in list(self.buffers):
+            self._flush(key)
+
+
+def generate(rows, students=None, seed=0, years=3, end=None, schools=100, risk_mix=DEFAULT_RISK_MIX,
+             label_rate=0.1, script_mix=DEFAULT_SCRIPT_MIX, root=STORE_DIR, workers=GENERATOR_WORKERS,
+             progress=None):
+    """Write a synthetic dataset into the (empty) store at ``root``; returns a summary dict
+
+    ``progress`` is called with ``(rows_done, rows_total)`` after every block.
+    ``workers=0`` generates in this process.
+    """
+    from model_registry import get_registry
+
+    started = time.perf_counter()
+    plan = plan_dataset(rows, students, seed, years, end, schools, risk_mix, label_rate, script_mix)
+    store = PartitionedStore(root)
+    if store.students.count:
+        raise ValueError(f"{root} already has {store.students.count:,} students; "
+                         "generate into an empty data directory")
+    store.create()
+    # Workers score with the active model; create it once, before they start
+    get_registry().ensure()
+    writer = _PartitionWriter(store, plan)
+    blocks = range(math.ceil(plan['students'] / STUDENTS_PER_TASK))
+    executor = None
+    try:
+        if workers:
+            # Started like the report workers, never forked from a threaded caller
+            executor = ProcessPoolExecutor(workers, mp_context=_worker_context())
+            results = _bounded_map(executor, plan, blocks, window=workers * 2)
+        else:
+            results = (generate_block(plan, block) for block in blocks)
+        done = 0
+        for names, columns, row_schools, terms in results:
+            ids = store.students.register(names)
+            if ids[0] != columns['student_id'][0]:
+                raise RuntimeError("students were registered by another process during generation")
+            writer.add(columns, row_schools, terms)
+            done += len(columns['student_id'])
+            if progress is not None:
+                progress(done, plan['rows'])
+        writer.flush()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return {
+        'rows': writer.appended,
+        'students': plan['students'],
+        'schools': len(plan['schools']),
+        'partitions': len(writer.entries),
+        'name_parts': plan['name_parts'],
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def _worker_context():
+    """Start method of the worker pool: a fork server preloaded with this module, else spawn"""
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['synthetic_data', 'risk_model'])
+    return context
+
+
+def _bounded_map(executor, plan, blocks, window):
+    """Generate blocks in the pool, in order, with at most ``window`` in flight"""
+    pending = deque()
+    for block in blocks:
+        pending.append(executor.submit(generate_block, plan, block))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _shares(text):
+    return tuple(float(share) for share in text.split(','))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic Somali school data into an empty data directory.")
+    parser.add_argument('--rows', type=int, default=1000000, help="assessments to generate")
+    parser.add_argument('--students', type=int, help="distinct students (default: rows / 10)")
+    parser.add_argument('--schools', type=int, default=100)
+    parser.add_argument('--years', type=int, default=3, help="academic years of assessments, up to today")
+    parser.add_argument('--end', type=date.fromisoformat, help="last assessment date (default: today)")
+    parser.add_argument('--risk-mix', type=_shares, default=DEFAULT_RISK_MIX,
+                        help="shares of Low,Medium,High students, e.g. 0.6,0.3,0.1")
+    parser.add_argument('--script-mix', type=_shares, default=DEFAULT_SCRIPT_MIX,
+                        help="shares of names in Somali, anglicized and Arabic spelling")
+    parser.add_argument('--label-rate', type=float, default=0.1, help="share of rows with a teacher's risk label")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=GENERATOR_WORKERS, help="worker processes; 0 generates in-process")
+    args = parser.parse_args(argv)
+
+    def report(done, total):
+        print(f"\r{done:,}/{total:,} assessments", end='', file=sys.stderr)
+
+    try:
+        summary = generate(args.rows, args.students, args.seed, args.years, args.end, args.schools, args.risk_mix,
+                           args.label_rate, args.script_mix, workers=args.workers, progress=report)
+    except ValueError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    print(file=sys.stderr)
+    print(f"{summary['rows']:,} assessments of {summary['students']:,} students in {summary['schools']} schools "
+          f"({summary['partitions']:,} partitions) in {summary['seconds']:.1f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
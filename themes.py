@@ -0,0 +1,238 @@
+"""Theme stylesheets built once per process
+
+Each theme is rendered from one CSS template and a colour palette, minified
+once per process and injected as an inline ``<style>`` element. The pinned
+Streamlit serves static files other than images as ``text/plain`` with
+``nosniff``, so browsers would refuse a linked stylesheet.
+"""
+import re
+import threading
+from string import Template
+
+DEFAULT_THEME = 'Modern'
+
+PALETTES = {
+    'Modern': {
+        'font': "'Poppins', sans-serif",
+        'app_background': '#f8fafc',
+        'header_background': 'linear-gradient(135deg, rgba(255,255,255,0.1) 0%, rgba(255,255,255,0.05) 100%)',
+        'header_border': 'rgba(255,255,255,0.2)',
+        'header_text': 'white',
+        'title_text': '#000000',
+        'card_background': 'linear-gradient(135deg, rgba(255,255,255,0.95) 0%, rgba(255,255,255,0.9) 100%)',
+        'card_text': '#2c3e50',
+        'metric_background': 'linear-gradient(135deg, rgba(255,255,255,0.1) 0%, rgba(255,255,255,0.05) 100%)',
+        'metric_value': '#2c3e50',
+        'button_background': 'linear-gradient(135deg, #3b82f6 0%, #2563eb 100%)',
+        'button_hover': 'linear-gradient(135deg, #2563eb 0%, #1d4ed8 100%)',
+        'button_shadow': 'rgba(59, 130, 246, 0.3)',
+        'input_background': 'rgba(255,255,255,0.9)',
+        'form_text': '#000000',
+        'form_background': '#ffffff',
+        'radius': '20px'
+    },
+    'Classic': {
+        'font': "Georgia, 'Times New Roman', serif",
+        'app_background': '#ffffff',
+        'header_background': '#f5f1e8',
+        'header_border': '#d6cfc0',
+        'header_text': '#3f3a30',
+        'title_text': '#1f2937',
+        'card_background': '#fbf9f4',
+        'card_text': '#1f2937',
+        'metric_background': '#fbf9f4',
+        'metric_value': '#1e3a5f',
+        'button_background': '#1e3a5f',
+        'button_hover': '#16304f',
+        'button_shadow': 'rgba(30, 58, 95, 0.25)',
+        'input_background': '#ffffff',
+        'form_text': '#000000',
+        'form_background': '#ffffff',
+        'radius': '4px'
+    },
+    'Dark': {
+        'font': "'Poppins', sans-serif",
+        'app_background': '#0f172a',
+        'header_background': 'linear-gradient(135deg, #1e293b 0%, #0f172a 100%)',
+        'header_border': '#334155',
+        'header_text': '#cbd5e1',
+        'title_text': '#f8fafc',
+        'card_background': '#1e293b',
+        'card_text': '#e2e8f0',
+        'metric_background': '#1e293b',
+        'metric_value': '#f8fafc',
+        'button_background': 'linear-gradient(135deg, #6366f1 0%, #4f46e5 100%)',
+        'button_hover': 'linear-gradient(135deg, #4f46e5 0%, #4338ca 100%)',
+        'button_shadow': 'rgba(99, 102, 241, 0.35)',
+        'input_background': '#1e293b',
+        'form_text': '#f8fafc',
+        'form_background': '#1e293b',
+        'radius': '20px'
+    }
+}
+
+APP_CSS = Template("""
+.stApp {
+    background: $app_background !important;
+    font-family: $font;
+    min-height: 100vh !important;
+}
+
+.main-header {
+    background: $header_background;
+    backdrop-filter: blur(20px);
+    border: 1px solid $header_border;
+    border-radius: $radius;
+    padding: 2rem;
+    margin-bottom: 2rem;
+    color: $header_text;
+    text-align: center;
+    box-shadow: 0 8px 32px rgba(0,0,0,0.1);
+}
+
+.main-header h1 {
+    font-size: 3rem;
+    font-weight: 700;
+    margin-bottom: 0.5rem;
+    color: $title_text;
+    text-shadow: 2px 2px 4px rgba(255,255,255,0.3);
+}
+
+.main-header p {
+    font-size: 1.2rem;
+    opacity: 0.9;
+    margin-bottom: 0;
+}
+
+/* Force all Streamlit buttons to use the theme colour */
+div[data-testid="stButton"] > button {
+    background: $button_background !important;
+    color: white !important;
+    border: none !important;
+    border-radius: 8px !important;
+    font-weight: 600 !important;
+    transition: all 0.3s ease !important;
+}
+
+div[data-testid="stButton"] > button:hover {
+    background: $button_hover !important;
+    transform: translateY(-2px) !important;
+    box-shadow: 0 4px 15px $button_shadow !important;
+}
+
+.metric-card {
+    background: $metric_background;
+    backdrop-filter: blur(15px);
+    border: 1px solid $header_border;
+    border-radius: 15px;
+    padding: 1.5rem;
+    margin: 1rem 0;
+    color: $card_text;
+    box-shadow: 0 8px 32px rgba(0,0,0,0.1);
+    transition: all 0.3s ease;
+}
+
+.metric-card:hover {
+    transform: translateY(-5px);
+    box-shadow: 0 15px 40px rgba(0,0,0,0.2);
+}
+
+.metric-value {
+    font-size: 2.5rem;
+    font-weight: 700;
+    color: $metric_value;
+}
+
+.metric-title {
+    font-size: 1.1rem;
+    opacity: 0.9;
+    margin-bottom: 0.5rem;
+}
+
+.metric-desc {
+    font-size: 0.9rem;
+    opacity: 0.7;
+}
+
+.content-card {
+    background: $card_background;
+    backdrop-filter: blur(20px);
+    border: 1px solid $header_border;
+    border-radius: $radius;
+    padding: 2rem;
+    margin: 1rem 0;
+    box-shadow: 0 8px 32px rgba(0,0,0,0.1);
+    color: $card_text;
+}
+
+.content-card h2 {
+    color: $title_text !important;
+}
+
+.stSelectbox > div > div,
+.stTextInput > div > div > input,
+.stNumberInput > div > div > input {
+    background-color: $input_background !important;
+    border-radius: 10px !important;
+}
+""")
+
+# Only linked on the Settings page, whose form needs higher-contrast labels
+SETTINGS_CSS = Template("""
+.stSelectbox > div > div > div,
+[data-baseweb="select"] > div {
+    color: $form_text !important;
+    background-color: $form_background !important;
+}
+
+.stSelectbox > div > div > div > div,
+.stMarkdown h3,
+.stCheckbox > label,
+.stSelectbox label,
+.stMarkdown p {
+    color: $form_text !important;
+}
+
+button[kind="primary"] {
+    background: $button_background !important;
+    color: white !important;
+}
+
+button[kind="primary"]:hover {
+    background: $button_hover !important;
+}
+""")
+
+STYLESHEETS = {'app': APP_CSS, 'settings': SETTINGS_CSS}
+
+_lock = threading.Lock()
+_assets = None
+
+
+def minify_css(css):
+    """Strip comments and redundant whitespace from a stylesheet"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{}:;,>])\s*', r'\1', css)
+    return css.replace(';}', '}').strip()
+
+
+def render_stylesheet(theme, sheet='app'):
+    """Minified CSS of one stylesheet for one theme"""
+    palette = PALETTES.get(theme, PALETTES[DEFAULT_THEME])
+    return minify_css(STYLESHEETS[sheet].substitute(palette))
+
+
+def get_theme_assets():
+    """Minified CSS of every theme's stylesheets, ``{(theme, sheet): css}``, built once per process"""
+    global _assets
+    with _lock:
+        if _assets is None:
+            _assets = {(theme, sheet): render_stylesheet(theme, sheet) for theme in PALETTES for sheet in STYLESHEETS}
+        return _assets
+
+
+def stylesheet_tag(theme, sheet='app'):
+    """``<style>`` element that applies a theme stylesheet"""
+    assets = get_theme_assets()
+    return f"<style>{assets.get((theme, sheet)) or assets[(DEFAULT_THEME, sheet)]}</style>"
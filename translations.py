@@ -0,0 +1,268 @@
+"""Interface text in English, Somali and Arabic
+
+Kept apart from ``app.py`` so that code running outside Streamlit, such as the
+report workers in ``reports.py``, can localize text without importing it.
+"""
+
+TRANSLATIONS = {
+    'English': {
+        'app_title': 'EduScan Somalia',
+        'app_subtitle': 'Professional Learning Risk Assessment System',
+        'dashboard': 'Dashboard',
+        'settings': 'Settings',
+        'system_overview': 'System Overview',
+        'total_students': 'Total Students',
+        'on_track': 'On Track',
+        'at_risk': 'At Risk',
+        'intervention': 'Intervention Required',
+        'academic_performance_by_subject': 'Academic Performance by Subject',
+        'student_risk_distribution': 'Student Risk Distribution',
+        'recent_assessment_results': 'Recent Assessment Results',
+        'performance_trends': 'Performance Trends',
+        'declining_students': 'Students with Declining Scores',
+        'moving_average': '30-day average',
+        'trend_per_month': 'Trend (points/month)',
+        'region': 'Region',
+        'school': 'School',
+        'term': 'Term',
+        'all': 'All',
+        'search_student': 'Search student',
+        'background_jobs': 'Background jobs',
+        'rescore_all': 'Re-score all assessments',
+        'cancel': 'Cancel',
+        'risk_model': 'Risk model',
+        'model_version': 'Model version',
+        'active_model': 'Active',
+        'promote_model': 'Promote',
+        'rollback_model': 'Roll back',
+        'retrain_model': 'Retrain on new labels',
+        'new_labels': 'New teacher labels',
+        'student_name': 'Student Name',
+        'grade': 'Grade',
+        'math_score': 'Math Score',
+        'reading_score': 'Reading Score',
+        'science_score': 'Science Score',
+        'writing_score': 'Writing Score',
+        'social_studies_score': 'Social Studies Score',
+        'recommendations': 'Recommendations',
+        'latest_assessment': 'Latest Assessment',
+        'assessments': 'Assessments',
+        'students': 'Students',
+        'reports': 'Reports',
+        'student_report': 'Student Report',
+        'class_report': 'Class Report',
+        'report_format': 'Report format',
+        'generate_reports': 'Generate reports',
+        'download_reports': 'Download reports',
+        'risk_level': 'Risk Level',
+        'assessment_date': 'Assessment Date',
+        'language': 'Language',
+        'theme': 'Theme',
+        'offline_mode': 'Offline Mode',
+        'save_settings': 'Save Settings',
+        'reset_app': 'Reset Application',
+        'subjects': 'Subjects',
+        'average_score': 'Average Score',
+        'student_risk_overview': 'Student Risk Overview',
+        'average_subject_scores': 'Average Subject Scores',
+        'analytics': 'Analytics',
+        'group_by': 'Group by',
+        'score_distribution': 'Score distribution',
+        'not_scored': 'Not scored',
+        'show_students': 'Show students',
+        'show_model_versions': 'Show model versions',
+        'matching_students': 'Matching students',
+        'import_data': 'Import Data'
+    },
+    'Somali': {
+        'app_title': 'EduScan Somalia',
+        'app_subtitle': 'Nidaamka Qiimaynta Khatarta Barashada ee Xirfadda leh',
+        'dashboard': 'Shabakada',
+        'settings': 'Dejinta',
+        'system_overview': 'Guud ahaan Nidaamka',
+        'total_students': 'Wadarta Ardayda',
+        'on_track': 'Jidka Saxda ah',
+        'at_risk': 'Halis ku jira',
+        'intervention': 'Waxaa loo baahan yahay faragelin',
+        'academic_performance_by_subject': 'Waxqabadka Waxbarasho ee Maaddada',
+        'student_risk_distribution': 'Qaybinta Halista Ardayda',
+        'recent_assessment_results': 'Natiijooyinka Qiimaynta ee dhawaan',
+        'performance_trends': 'Isbeddelka Waxqabadka',
+        'declining_students': 'Ardayda Dhibcahoodu Hoos u Dhacayaan',
+        'moving_average': 'Celceliska 30-ka maalmood',
+        'trend_per_month': 'Isbeddel (dhibcood/bil)',
+        'region': 'Gobolka',
+        'school': 'Dugsiga',
+        'term': 'Xilliga',
+        'all': 'Dhammaan',
+        'search_student': 'Raadi arday',
+        'background_jobs': 'Hawlaha gadaasha',
+        'rescore_all': 'Dib u qiimee dhammaan qiimaynta',
+        'cancel': 'Jooji',
+        'risk_model': 'Moodeelka khatarta',
+        'model_version': 'Nooca moodeelka',
+        'active_model': 'Firfircoon',
+        'promote_model': 'Dallacsii',
+        'rollback_model': 'Dib ugu celi',
+        'retrain_model': 'Dib u tababar calaamadaha cusub',
+        'new_labels': 'Calaamadaha cusub ee macallinka',
+        'student_name': 'Magaca Ardayga',
+        'grade': 'Fasalka',
+        'math_score': 'Dhibcaha Xisaabta',
+        'reading_score': 'Dhibcaha Akhriska',
+        'science_score': 'Dhibcaha Sayniska',
+        'writing_score': 'Dhibcaha Qorista',
+        'social_studies_score': 'Dhibcaha Cilmiga Bulshada',
+        'recommendations': 'Talooyin',
+        'latest_assessment': 'Qiimaynta ugu Dambeysay',
+        'assessments': 'Qiimaynno',
+        'students': 'Ardayda',
+        'reports': 'Warbixinno',
+        'student_report': 'Warbixinta Ardayga',
+        'class_report': 'Warbixinta Fasalka',
+        'report_format': 'Qaabka warbixinta',
+        'generate_reports': 'Samee warbixinno',
+        'download_reports': 'Soo deji warbixinnada',
+        'risk_level': 'Heerka Halista',
+        'assessment_date': 'Taariikhda Qiimaynta',
+        'language': 'Luuqada',
+        'theme': 'Qaabka',
+        'offline_mode': 'Qaabka aan internetka lahayn',
+        'save_settings': 'Kaydi Dejinta',
+        'reset_app': 'Dib u deji Codsiga',
+        'subjects': 'Maaddooyinka',
+        'average_score': 'Celceliska Dhibcaha',
+        'student_risk_overview': 'Guud ahaan Halista Ardayda',
+        'average_subject_scores': 'Celceliska Dhibcaha Maaddada',
+        'analytics': 'Falanqaynta',
+        'group_by': 'U kala saar',
+        'score_distribution': 'Qaybinta dhibcaha',
+        'not_scored': 'Aan la qiimayn',
+        'show_students': 'Muuji ardayda',
+        'show_model_versions': 'Muuji noocyada moodeelka',
+        'matching_students': 'Ardayda u dhiganta',
+        'import_data': 'Soo Gali Xogta'
+    },
+    'Arabic': {
+        'app_title': 'EduScan Somalia',
+        'app_subtitle': 'نظام تقييم مخاطر التعلم المهني',
+        'dashboard': 'لوحة التحكم',
+        'settings': 'الإعدادات',
+        'system_overview': 'نظرة عامة على النظام',
+        'total_students': 'إجمالي الطلاب',
+        'on_track': 'على المسار الصحيح',
+        'at_risk': 'في خطر',
+        'intervention': 'يتطلب تدخلاً',
+        'academic_performance_by_subject': 'الأداء الأكاديمي حسب المادة',
+        'student_risk_distribution': 'توزيع مخاطر الطلاب',
+        'recent_assessment_results': 'نتائج التقييم الأخيرة',
+        'performance_trends': 'اتجاهات الأداء',
+        'declining_students': 'الطلاب ذوو الدرجات المتراجعة',
+        'moving_average': 'متوسط 30 يومًا',
+        'trend_per_month': 'الاتجاه (نقاط/شهر)',
+        'region': 'المنطقة',
+        'school': 'المدرسة',
+        'term': 'الفصل الدراسي',
+        'all': 'الكل',
+        'search_student': 'ابحث عن طالب',
+        'background_jobs': 'المهام في الخلفية',
+        'rescore_all': 'إعادة تقييم جميع التقييمات',
+        'cancel': 'إلغاء',
+        'risk_model': 'نموذج المخاطر',
+        'model_version': 'إصدار النموذج',
+        'active_model': 'نشط',
+        'promote_model': 'ترقية',
+        'rollback_model': 'التراجع',
+        'retrain_model': 'إعادة التدريب على التصنيفات الجديدة',
+        'new_labels': 'تصنيفات المعلمين الجديدة',
+        'student_name': 'اسم الطالب',
+        'grade': 'الصف',
+        'math_score': 'درجة الرياضيات',
+        'reading_score': 'درجة القراءة',
+        'science_score': 'درجة العلوم',
+        'writing_score': 'درجة الكتابة',
+        'social_studies_score': 'درجة الدراسات الاجتماعية',
+        'recommendations': 'التوصيات',
+        'latest_assessment': 'آخر تقييم',
+        'assessments': 'التقييمات',
+        'students': 'الطلاب',
+        'reports': 'التقارير',
+        'student_report': 'تقرير الطالب',
+        'class_report': 'تقرير الفصل',
+        'report_format': 'تنسيق التقرير',
+        'generate_reports': 'إنشاء التقارير',
+        'download_reports': 'تنزيل التقارير',
+        'risk_level': 'مستوى الخطر',
+        'assessment_date': 'تاريخ التقييم',
+        'language': 'اللغة',
+        'theme': 'المظهر',
+        'offline_mode': 'الوضع غير المتصل',
+        'save_settings': 'حفظ الإعدادات',
+        'reset_app': 'إعادة تعيين التطبيق',
+        'subjects': 'المواد',
+        'average_score': 'متوسط الدرجة',
+        'student_risk_overview': 'نظرة عامة على مخاطر الطلاب',
+        'average_subject_scores': 'متوسط درجات المواد',
+        'analytics': 'التحليلات',
+        'group_by': 'التجميع حسب',
+        'score_distribution': 'توزيع الدرجات',
+        'not_scored': 'غير مقيّم',
+        'show_students': 'عرض الطلاب',
+        'show_model_versions': 'عرض إصدارات النموذج',
+        'matching_students': 'الطلاب المطابقون',
+        'import_data': 'استيراد البيانات'
+    }
+}
+
+# The risk model's recommendations are written in English and translated here
+RECOMMENDATION_TRANSLATIONS = {
+    'Somali': {
+        "Continue current learning approach": "Sii wad habka waxbarasho ee hadda",
+        "Provide enrichment activities": "Bixi hawlo kobcin ah",
+        "Monitor progress regularly": "La soco horumarka si joogto ah",
+        "Encourage independent learning": "Dhiirri geli waxbarasho madax-bannaan",
+        "Maintain engagement": "Ilaali ka qaybgalka",
+        "Additional support recommended": "Taageero dheeraad ah ayaa lagu talinayaa",
+        "Small group instruction": "Waxbarid koox yar",
+        "Regular progress monitoring": "Kormeer joogto ah oo horumarka",
+        "Parent-teacher collaboration": "Iskaashi waalidka iyo macallinka",
+        "Targeted skill building": "Dhisidda xirfado la beegsaday",
+        "Use visual learning aids": "Isticmaal qalab waxbarasho oo muuqaal ah",
+        "Immediate intervention required": "Faragelin degdeg ah ayaa loo baahan yahay",
+        "One-on-one tutoring recommended": "Waxbarid hal-ka-hal ah ayaa lagu talinayaa",
+        "Consult with learning specialist": "La tasho khabiir waxbarasho",
+        "Implement individualized learning plan": "Hirgeli qorshe waxbarasho oo shakhsi ah",
+        "Family support engagement": "Ku lug yeelo taageerada qoyska"
+    },
+    'Arabic': {
+        "Continue current learning approach": "الاستمرار في أسلوب التعلم الحالي",
+        "Provide enrichment activities": "توفير أنشطة إثرائية",
+        "Monitor progress regularly": "متابعة التقدم بانتظام",
+        "Encourage independent learning": "تشجيع التعلم المستقل",
+        "Maintain engagement": "الحفاظ على المشاركة",
+        "Additional support recommended": "يوصى بدعم إضافي",
+        "Small group instruction": "التدريس في مجموعات صغيرة",
+        "Regular progress monitoring": "المتابعة المنتظمة للتقدم",
+        "Parent-teacher collaboration": "التعاون بين الوالدين والمعلم",
+        "Targeted skill building": "بناء مهارات موجّه",
+        "Use visual learning aids": "استخدام وسائل التعلم البصرية",
+        "Immediate intervention required": "يلزم تدخل فوري",
+        "One-on-one tutoring recommended": "يوصى بالتدريس الفردي",
+        "Consult with learning specialist": "استشارة أخصائي تعلم",
+        "Implement individualized learning plan": "تطبيق خطة تعلم فردية",
+        "Family support engagement": "إشراك الأسرة في الدعم"
+    }
+}
+
+# Translation keys of the risk levels, in ``RISK_LEVELS`` order
+RISK_LEVEL_KEYS = ['on_track', 'at_risk', 'intervention']
+
+
+def get_text(key, language='English'):
+    """Localized text for ``key``, falling back to English and then to the key itself"""
+    return TRANSLATIONS.get(language, TRANSLATIONS['English']).get(key, key)
+
+
+def translate_recommendation(text, language='English'):
+    """One of the risk model's recommendations in ``language``"""
+    return RECOMMENDATION_TRANSLATIONS.get(language, {}).get(text, text)
@@ -0,0 +1,431 @@
+"""Per-student and per-cohort score trends, maintained incrementally
+
+Like the dashboard aggregates, the trend state remembers how many store rows
+it has folded in (the watermark), so an append only touches the new rows.
+Everything per student is a running sum, so the order in which assessments
+arrive does not matter:
+
+* an exponentially weighted moving average of the assessment's mean score,
+  using weights that grow with the assessment date (half-life
+  ``EMA_HALF_LIFE_DAYS``)
+* the least-squares slope of mean score against date, kept as
+  n, sum(t), sum(y), sum(t*t) and sum(t*y)
+* the latest and previous assessment, which give the change in risk level
+
+Cohorts are grades. For each (day, grade) the state keeps the number of
+assessments and the sum of their mean scores. Cohort moving averages are
+taken over that grid when a chart is drawn, and ``lttb`` then downsamples the
+series so a three-year history stays light in the browser.
+
+As with the aggregates, every partition view keeps its own trend state under
+its ``state_root``. When an append moves rows of the view, the latest and
+previous row numbers are shifted and only the new rows are folded in.
+"""
+import json
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from assessment_store import MAX_GRADE, MISSING_SCORE, SUBJECTS, date_to_days, get_store
+from atomic_io import write_json_atomic
+from dataset_cache import cached
+from partitions import VIEW_STATE_CACHE_SIZE, segment_changes, shift_rows
+
+# Dates are measured from here so the EMA weights stay well inside float64
+ANCHOR_DAY = date_to_days('2000-01-01')
+EMA_HALF_LIFE_DAYS = 90
+EMA_RATE = math.log(2) / EMA_HALF_LIFE_DAYS
+
+# Slopes are reported in score points per this many days
+SLOPE_PERIOD_DAYS = 30
+
+# Window of the cohort moving average
+COHORT_WINDOW_DAYS = 30
+
+# Points per series handed to Plotly
+CHART_POINTS = 300
+
+CATCH_UP_CHUNK_ROWS = 1 << 20
+
+PER_STUDENT_ARRAYS = {
+    'count': ('<i4', 0),
+    'sum_t': ('<f8', 0.0),
+    'sum_y': ('<f8', 0.0),
+    'sum_tt': ('<f8', 0.0),
+    'sum_ty': ('<f8', 0.0),
+    'ema_num': ('<f8', 0.0),
+    'ema_den': ('<f8', 0.0),
+    'latest_row': ('<i8', -1),
+    'latest_date': ('<i4', np.iinfo(np.int32).min),
+    'latest_risk': ('<i1', -1),
+    'latest_grade': ('<i1', -1),
+    'previous_row': ('<i8', -1),
+    'previous_date': ('<i4', np.iinfo(np.int32).min),
+    'previous_risk': ('<i1', -1)
+}
+
+
+def _row_means(scores):
+    """Mean of the recorded subject scores per row, NaN when none were recorded"""
+    scores = scores.astype('<f8')
+    scores[scores == MISSING_SCORE] = np.nan
+    counts = np.count_nonzero(~np.isnan(scores), axis=1)
+    totals = np.nansum(scores, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, totals / counts, np.nan)
+
+
+def mean_scores(store, rows):
+    """Mean subject score of the given rows (a slice or an array of row numbers)"""
+    return _row_means(np.column_stack([store.column(subject)[rows] for subject in SUBJECTS]))
+
+
+def lttb(x, y, threshold=CHART_POINTS):
+    """Largest-Triangle-Three-Buckets downsampling of a series to ``threshold`` points
+
+    Keeps the first and last point, and from every bucket in between the
+    point that spans the largest triangle with its neighbours. Peaks and
+    dips therefore survive downsampling.
+    """
+    x = np.asarray(x, dtype='<f8')
+    y = np.asarray(y, dtype='<f8')
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+    edges = np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        next_start, next_stop = stop, edges[i + 2] if i + 2 < len(edges) else length
+        next_x = x[next_start:max(next_stop, next_start + 1)].mean()
+        next_y = y[next_start:max(next_stop, next_start + 1)].mean()
+        bucket_x, bucket_y = x[start:stop], y[start:stop]
+        areas = np.abs(
+            (x[previous] - next_x) * (bucket_y - y[previous]) - (x[previous] - bucket_x) * (next_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return selected
+
+
+class TrendAggregates:
+    """Rolling per-student and per-grade trend state, updated incrementally"""
+
+    def __init__(self, root):
+        self.root = root
+        self.state_path = os.path.join(root, 'state.json')
+        self._lock = threading.Lock()
+        self._load()
+
+    def _empty(self):
+        self.state = {'watermark': 0, 'layout': None, 'segments': [], 'risk_generation': 0}
+        self.arrays = {name: np.empty(0, dtype=dtype) for name, (dtype, _) in PER_STUDENT_ARRAYS.items()}
+        self.cohort_days = np.empty(0, dtype='<i4')
+        # Grades 0..MAX_GRADE get a column in the cohort grid
+        self.cohort_counts = np.zeros((0, MAX_GRADE + 1), dtype='<i4')
+        self.cohort_sums = np.zeros((0, MAX_GRADE + 1), dtype='<f8')
+
+    def _load(self):
+        self._empty()
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            arrays = {name: np.load(os.path.join(self.root, f'{name}.npy')) for name in PER_STUDENT_ARRAYS}
+            cohort = np.load(os.path.join(self.root, 'cohort.npz'))
+            cohort_days, cohort_counts, cohort_sums = cohort['days'], cohort['counts'], cohort['sums']
+        except (OSError, ValueError, KeyError):
+            # Missing or damaged trend state is rebuilt from the store
+            return
+        if cohort_counts.shape[1:] != (MAX_GRADE + 1,):
+            # Saved with another grade range
+            return
+        self.state, self.arrays = state, arrays
+        self.cohort_days, self.cohort_counts, self.cohort_sums = cohort_days, cohort_counts, cohort_sums
+
+    def _save(self):
+        os.makedirs(self.root, exist_ok=True)
+        for name, values in self.arrays.items():
+            path = os.path.join(self.root, f'{name}.npy')
+            tmp_path = f'{path}.tmp.npy'
+            np.save(tmp_path, values)
+            os.replace(tmp_path, path)
+        path = os.path.join(self.root, 'cohort.npz')
+        tmp_path = f'{path}.tmp.npz'
+        np.savez(tmp_path, days=self.cohort_days, counts=self.cohort_counts, sums=self.cohort_sums)
+        os.replace(tmp_path, path)
+        # The state file is written last and references the arrays above
+        write_json_atomic(self.state_path, self.state)
+
+    def _grow(self, students):
+        for name, (dtype, fill) in PER_STUDENT_ARRAYS.items():
+            values = self.arrays[name]
+            if len(values) < students:
+                extra = np.full(students - len(values), fill, dtype=dtype)
+                self.arrays[name] = np.concatenate([values, extra])
+
+    def _fold_sums(self, ids, dates, grades, y):
+        """Add assessments with a mean score to the regression, EMA and cohort sums"""
+        arrays = self.arrays
+        students = len(arrays['count'])
+        t = (dates - ANCHOR_DAY).astype('<f8')
+        weights = np.exp(EMA_RATE * t)
+        arrays['count'] += np.bincount(ids, minlength=students).astype('<i4')
+        arrays['sum_t'] += np.bincount(ids, weights=t, minlength=students)
+        arrays['sum_y'] += np.bincount(ids, weights=y, minlength=students)
+        arrays['sum_tt'] += np.bincount(ids, weights=t * t, minlength=students)
+        arrays['sum_ty'] += np.bincount(ids, weights=t * y, minlength=students)
+        arrays['ema_num'] += np.bincount(ids, weights=weights * y, minlength=students)
+        arrays['ema_den'] += np.bincount(ids, weights=weights, minlength=students)
+
+        grades = np.clip(grades, 0, MAX_GRADE).astype(np.int64)
+        days, day_index = np.unique(dates, return_inverse=True)
+        cells = day_index * (MAX_GRADE + 1) + grades
+        counts = np.bincount(cells, minlength=len(days) * (MAX_GRADE + 1)).reshape(len(days), -1)
+        sums = np.bincount(cells, weights=y, minlength=len(days) * (MAX_GRADE + 1)).reshape(len(days), -1)
+        merged_days = np.union1d(self.cohort_days, days).astype('<i4')
+        if len(merged_days) != len(self.cohort_days):
+            positions = np.searchsorted(merged_days, self.cohort_days)
+            grown_counts = np.zeros((len(merged_days), MAX_GRADE + 1), dtype='<i4')
+            grown_sums = np.zeros((len(merged_days), MAX_GRADE + 1), dtype='<f8')
+            grown_counts[positions] = self.cohort_counts
+            grown_sums[positions] = self.cohort_sums
+            self.cohort_days, self.cohort_counts, self.cohort_sums = merged_days, grown_counts, grown_sums
+        positions = np.searchsorted(self.cohort_days, days)
+        self.cohort_counts[positions] += counts.astype('<i4')
+        self.cohort_sums[positions] += sums
+
+    def _fold_latest(self, ids, rows, dates, grades, risk):
+        """Keep each student's two most recent assessments"""
+        arrays = self.arrays
+        touched = np.unique(ids)
+        candidates = [(ids, rows, dates, risk, grades)]
+        for prefix, grade_name in (('latest', 'latest_grade'), ('previous', None)):
+            known = touched[arrays[f'{prefix}_row'][touched] >= 0]
+            candidates.append((
+                known,
+                arrays[f'{prefix}_row'][known],
+                arrays[f'{prefix}_date'][known],
+                arrays[f'{prefix}_risk'][known],
+                arrays[grade_name][known] if grade_name else np.full(len(known), -1, dtype='<i1')
+            ))
+        ids, rows, dates, risk, grades = (np.concatenate(parts) for parts in zip(*candidates))
+        order = np.lexsort((rows, dates, ids))
+        ids, rows, dates, risk, grades = ids[order], rows[order], dates[order], risk[order], grades[order]
+        last = np.append(ids[1:] != ids[:-1], True)
+        latest = np.flatnonzero(last)
+        arrays['latest_row'][ids[latest]] = rows[latest]
+        arrays['latest_date'][ids[latest]] = dates[latest]
+        arrays['latest_risk'][ids[latest]] = risk[latest]
+        arrays['latest_grade'][ids[latest]] = grades[latest]
+        previous = latest - 1
+        has_previous = previous >= 0
+        has_previous[has_previous] = ids[previous[has_previous]] == ids[latest[has_previous]]
+        previous, owners = previous[has_previous], ids[latest[has_previous]]
+        arrays['previous_row'][owners] = rows[previous]
+        arrays['previous_date'][owners] = dates[previous]
+        arrays['previous_risk'][owners] = risk[previous]
+
+    def _fold_rows(self, store, start, stop):
+        """Fold rows ``[start, stop)`` into the trend state"""
+        ids = np.asarray(store.column('student_id')[start:stop]).astype(np.int64)
+        dates = np.asarray(store.column('assessment_date')[start:stop])
+        grades = np.asarray(store.column('grade')[start:stop])
+        risk = np.asarray(store.column('risk_level')[start:stop])
+        rows = np.arange(start, stop, dtype=np.int64)
+        y = mean_scores(store, slice(start, stop))
+        scored = ~np.isnan(y)
+        self._fold_sums(ids[scored], dates[scored], grades[scored], y[scored])
+        self._fold_latest(ids, rows, dates, grades, risk)
+
+    def _reload_risk(self, store):
+        """Re-read the latest and previous risk after a re-score"""
+        risk_column = store.column('risk_level')
+        for prefix in ('latest', 'previous'):
+            rows = self.arrays[f'{prefix}_row']
+            known = rows >= 0
+            values = np.full(len(rows), -1, dtype='<i1')
+            values[known] = risk_column[rows[known]]
+            self.arrays[f'{prefix}_risk'] = values
+
+    def refresh(self, store=None):
+        """Fold in anything appended or re-scored since the last refresh"""
+        store = store or get_store()
+        segments = store.segments()
+        rows = sum(count for _, count in segments)
+        generation = store.generation('risk_level')
+        with self._lock:
+            state = self.state
+            if state.get('segments') == segments and state['risk_generation'] == generation:
+                return False
+            changes = segment_changes(state['segments'], segments) if 'segments' in state else None
+            if changes is None:
+                # A partition was replaced or shrank underneath us; start again
+                self._empty()
+                state = self.state
+                changes = segment_changes([], segments)
+            old_ends, shifts, ranges = changes
+            self._grow(store.students.count)
+            for name in ('latest_row', 'previous_row'):
+                self.arrays[name] = shift_rows(self.arrays[name], old_ends, shifts)
+            if state['risk_generation'] != generation:
+                self._reload_risk(store)
+                state['risk_generation'] = generation
+            for range_start, range_stop in ranges:
+                for start in range(range_start, range_stop, CATCH_UP_CHUNK_ROWS):
+                    self._fold_rows(store, start, min(start + CATCH_UP_CHUNK_ROWS, range_stop))
+            state['watermark'] = rows
+            state['segments'] = segments
+            state['layout'] = store.layout
+            self._save()
+            return True
+
+    @property
+    def version(self):
+        """Changes whenever anything behind the trends changes"""
+        return self.state['layout'], self.state['watermark'], self.state['risk_generation']
+
+    def student_trends(self, min_assessments=2):
+        """Per-student EMA, slope and risk change for students with enough history
+
+        Returns a dict of equal-length arrays keyed by ``student_id``, ``ema``,
+        ``slope`` (points per ``SLOPE_PERIOD_DAYS``), ``assessments``,
+        ``grade``, ``latest_risk``, ``previous_risk`` and ``risk_change``
+        (positive when the risk level rose).
+        """
+        with self._lock:
+            a = {name: values.copy() for name, values in self.arrays.items()}
+        ids = np.flatnonzero(a['count'] >= min_assessments)
+        n = a['count'][ids].astype('<f8')
+        sum_t, sum_y = a['sum_t'][ids], a['sum_y'][ids]
+        denominator = n * a['sum_tt'][ids] - sum_t * sum_t
+        with np.errstate(invalid='ignore', divide='ignore'):
+            slope = np.where(denominator > 0, (n * a['sum_ty'][ids] - sum_t * sum_y) / denominator, np.nan)
+            ema = a['ema_num'][ids] / a['ema_den'][ids]
+        latest, previous = a['latest_risk'][ids], a['previous_risk'][ids]
+        both = (latest >= 0) & (previous >= 0)
+        return {
+            'student_id': ids,
+            'ema': ema,
+            'slope': slope * SLOPE_PERIOD_DAYS,
+            'assessments': a['count'][ids],
+            'grade': a['latest_grade'][ids],
+            'latest_risk': latest,
+            'previous_risk': previous,
+            'risk_change': np.where(both, latest.astype(np.int64) - previous, 0)
+        }
+
+    def declining_students(self, limit=10, min_assessments=3, store=None):
+        """Students whose scores fall fastest, steepest first, as a shared read-only DataFrame"""
+        store = store or get_store()
+        return cached(
+            ('declining_students', self.root, limit, min_assessments), self.version,
+            lambda: self._declining_students(limit, min_assessments, store)
+        )
+
+    def _declining_students(self, limit, min_assessments, store):
+        import pandas as pd
+
+        from frame_schema import grade_column, risk_column
+
+        trends = self.student_trends(min_assessments)
+        declining = np.flatnonzero(trends['slope'] < 0)
+        chosen = declining[np.argsort(trends['slope'][declining], kind='stable')[:limit]]
+        return pd.DataFrame({
+            'student_id': trends['student_id'][chosen],
+            'student_name': store.students.names(trends['student_id'][chosen]),
+            'grade': grade_column(trends['grade'][chosen]),
+            'assessments': trends['assessments'][chosen],
+            'ema': trends['ema'][chosen].round(1),
+            'slope': trends['slope'][chosen].round(2),
+            'risk_level': risk_column(trends['latest_risk'][chosen]),
+            'risk_change': trends['risk_change'][chosen]
+        })
+
+    def cohort_series(self, grades=None, window_days=COHORT_WINDOW_DAYS):
+        """Daily ``window_days`` moving average of mean scores for the given grades
+
+        Returns ``(day_numbers, values)`` for days with at least one
+        assessment inside the window; ``grades=None`` combines every grade.
+        """
+        with self._lock:
+            days = self.cohort_days.copy()
+            columns = slice(None) if not grades else [int(g) for g in grades]
+            counts = self.cohort_counts[:, columns].sum(axis=1, dtype=np.int64)
+            sums = self.cohort_sums[:, columns].sum(axis=1)
+        if not len(days):
+            return np.empty(0, dtype='<i4'), np.empty(0)
+        # Spread the sparse days onto a dense grid so the window is a cumsum difference
+        grid = np.arange(days[0], days[-1] + 1, dtype='<i4')
+        dense_counts = np.zeros(len(grid), dtype=np.int64)
+        dense_sums = np.zeros(len(grid))
+        dense_counts[days - days[0]] = counts
+        dense_sums[days - days[0]] = sums
+        count_window = np.cumsum(dense_counts)
+        sum_window = np.cumsum(dense_sums)
+        count_window[window_days:] = count_window[window_days:] - count_window[:-window_days]
+        sum_window[window_days:] = sum_window[window_days:] - sum_window[:-window_days]
+        present = count_window > 0
+        return grid[present], sum_window[present] / count_window[present]
+
+    def cohort_summary(self):
+        """Per grade: students tracked, mean slope and how many moved up or down a risk level"""
+        trends = self.student_trends()
+        grades = trends['grade'].astype(np.int64)
+        valid = grades >= 0
+        summary = []
+        for grade in np.unique(grades[valid]):
+            members = grades == grade
+            slopes = trends['slope'][members]
+            summary.append({
+                'grade': int(grade),
+                'students': int(np.count_nonzero(members)),
+                'mean_slope': float(np.nanmean(slopes)) if np.any(~np.isnan(slopes)) else 0.0,
+                'risk_up': int(np.count_nonzero(trends['risk_change'][members] > 0)),
+                'risk_down': int(np.count_nonzero(trends['risk_change'][members] < 0))
+            })
+        return summary
+
+
+def student_series(student_id, store=None):
+    """One student's assessments in date order: ``(day_numbers, mean_scores, ema)``"""
+    store = store or get_store()
+    # Scores are never rewritten, so appends and moved rows are all that change a series
+    return cached(('student_series', store.state_root, int(student_id)), (store.layout, store.rows),
+                  lambda: _student_series(student_id, store))
+
+
+def _student_series(student_id, store):
+    rows = np.flatnonzero(np.asarray(store.column('student_id')) == student_id)
+    dates = np.asarray(store.column('assessment_date'))[rows]
+    order = np.argsort(dates, kind='stable')
+    rows, dates = rows[order], dates[order]
+    y = mean_scores(store, rows)
+    scored = ~np.isnan(y)
+    dates, y = dates[scored], y[scored]
+    weights = np.exp(EMA_RATE * (dates - ANCHOR_DAY).astype('<f8'))
+    ema = np.cumsum(weights * y) / np.cumsum(weights) if len(y) else np.empty(0)
+    return dates, y, ema
+
+
+_trends = OrderedDict()
+_trends_lock = threading.Lock()
+
+
+def get_trends(store=None):
+    """Shared trend state of a store or partition view, caught up with it"""
+    store = store or get_store()
+    with _trends_lock:
+        trends = _trends.get(store.state_root)
+        if trends is None:
+            trends = _trends[store.state_root] = TrendAggregates(os.path.join(store.state_root, 'trends'))
+        _trends.move_to_end(store.state_root)
+        while len(_trends) > VIEW_STATE_CACHE_SIZE:
+            _trends.popitem(last=False)
+    trends.refresh(store)
+    return trends